@@ -0,0 +1,235 @@
+import requests                         # built-in Python REST support
+import shutil                           # to get terminal window properties
+import textwrap                         # to gracefully wrap text in terminal
+import logging                          # built-in Python logging
+from dataclasses import fields
+
+from page import ParsedPage             # for the player's planets
+from planet import Fleet, Resources, parseLocation
+from dispatchQueue import (DispatchQueue, Mission, MISSIONS, STORE_PATH, QUEUED, SENT,
+                           dispatchAll)
+
+logger = logging.getLogger(__name__)    # set module-level logging object
+
+SHIPS = tuple(f.name for f in fields(Fleet))
+CARGO = tuple(f.name for f in fields(Resources))
+
+def dispatch(cmd:dict[str, list[str]], s:requests.Session, page:ParsedPage | None,
+             cfg:dict) -> list[Mission] | None:
+    '''
+    Handles the "dispatch" command from sfc main function. Missions are staged
+    in a persistent queue with "dispatch add", and sent with "dispatch run",
+    as fast as the server's rate limits allow. "dispatch list" shows the
+    queue, "dispatch retry ID" queues a failed job again, and "dispatch
+    clear" removes the jobs that are done.
+
+    :param cmd:     Dictionary of the user-entered command string, as parsed by
+                    the buildCommandDict function in sfc.py.
+    :type cmd:      dict[str, list[str]]
+
+    :param s:       The user's request session object.
+    :type s:        requests.Session
+
+    :param page:    The most recent page, used to find the player's planets
+                    when the origin is given as a location.
+    :type page:     ParsedPage | None
+
+    :param cfg:     The "dispatch" section of the application config. Recognises
+                    "storePath", plus the settings of dispatchQueue.dispatchAll().
+    :type cfg:      dict
+
+    :return:        The jobs added, listed or sent, for callers that want the
+                    data rather than the printout (e.g. script mode), or None
+                    if the command failed (after printing why), including
+                    when a job could not be sent.
+    :rtype:         list[Mission] | None
+    '''
+
+    logger.debug("Entered function dispatch().")
+    args = [a for a in cmd["args"] if a]
+    if not args or args[0] in ("-h", "--help"):
+        optHelp()
+        return []
+
+    with DispatchQueue(cfg.get("storePath", STORE_PATH)) as queue:
+        match args[0]:
+            case "add":
+                m = parseMission(args[1:], page)
+                if m is None:
+                    return None
+                queue.add(m)
+                print(f"Queued job {m.id}: {formatJob(m)}")
+                return [m]
+            case "list":
+                jobs = queue.jobs()
+                print(formatHeader())
+                for m in jobs:
+                    print(formatRow(m))
+                if len(jobs) == 0:
+                    print("    (queue is empty)")
+                return jobs
+            case "run":
+                if page is None:
+                    print("Not logged in. Please log in first.")
+                    return None
+                if not queue.jobs((QUEUED,)):
+                    print("No queued jobs to send.")
+                    return []
+                jobs = dispatchAll(s, queue, cfg)
+                print(formatHeader())
+                for m in jobs:
+                    print(formatRow(m))
+                sent = [m for m in jobs if m.state == SENT]
+                print(f"Sent {len(sent)} of {len(jobs)} jobs.")
+                return jobs if len(sent) == len(jobs) else None
+            case "retry":
+                try:
+                    ids = [int(a) for a in args[1:]]
+                except ValueError:
+                    ids = []
+                if not ids:
+                    print("Give the ids of the jobs to retry. See dispatch --help.")
+                    return None
+                retried = [id for id in ids if queue.retry(id)]
+                for id in ids:
+                    if id in retried:
+                        print(f"Queued job {id} again.")
+                    else:
+                        print(f"Job {id} is not failed or unknown.")
+                return [] if len(retried) == len(ids) else None
+            case "clear":
+                print(f"Removed {queue.clear()} sent and failed jobs.")
+                return []
+            case _:
+                print(f"Unknown action '{args[0]}'. See dispatch --help.")
+                logger.info("User supplied unknown action %s for dispatch.", args[0])
+                return None
+
+def parseMission(args:list[str], page:ParsedPage | None) -> Mission | None:
+    '''
+    Parses the arguments of "dispatch add" into a mission. Options may have
+    their value attached ("-t8:41:3") or following ("-t 8:41:3"). Ships and
+    cargo are given as "name=count", e.g. "atlas=20" or "ore=50000".
+
+    Args:
+        args (list[str]):   Arguments after "add".
+        page (ParsedPage | None): Most recent page, to look up the origin by
+                                  location among the player's planets.
+
+    Returns:
+        Mission | None: The mission, or None if the arguments were malformed
+                        (after printing why).
+    '''
+
+    m = Mission()
+    i = 0
+    try:
+        while i < len(args):
+            a = args[i]
+            if "=" in a:
+                name, _, count = a.partition("=")
+                name = name.lower()
+                if name not in SHIPS and name not in CARGO:
+                    print(f"Unknown ship or resource '{name}'. See dispatch --help.")
+                    return None
+                # At least one of each ship given, and no negative cargo.
+                if int(count) < (1 if name in SHIPS else 0):
+                    raise ValueError(f"Count {count} of {name} out of range.")
+                setattr(m.ships if name in SHIPS else m.cargo, name, int(count))
+                i += 1
+                continue
+            opt, val = a[:2], a[2:]
+            if opt not in ("-o", "-t", "-m", "-p"):
+                print(f"Unknown option '{a}'. See dispatch --help.")
+                return None
+            if not val and i + 1 < len(args):
+                i += 1
+                val = args[i]
+            match opt:
+                case "-o":
+                    m.origin = findOrigin(val, page)
+                case "-t":
+                    m.target = parseLocation(val)
+                case "-m":
+                    m.mission = next((x for x in MISSIONS if x.lower() == val.lower()), "")
+                    if not m.mission:
+                        print(f"Unknown mission '{val}'. Missions are: {', '.join(MISSIONS)}.")
+                        return None
+                case "-p":
+                    m.speed = int(val)
+            i += 1
+    except ValueError:
+        print(f"Malformed value in '{' '.join(args)}'. See dispatch --help.")
+        logger.info("User supplied malformed dispatch arguments %s.", args)
+        return None
+
+    if not m.origin or m.target.galaxy == 0:
+        print("An origin (-o) and a target (-t) are required. See dispatch --help.")
+        return None
+    if not any(getattr(m.ships, name) for name in SHIPS):
+        print("No ships given. See dispatch --help.")
+        return None
+    if not 1 <= m.speed <= 10:
+        print("Speed (-p) is in tenths of full speed, from 1 to 10.")
+        return None
+    return m
+
+def findOrigin(val:str, page:ParsedPage | None) -> str:
+    '''
+    Resolves an origin given as a planet id, or as the location of one of the
+    player's planets.
+
+    Raises:
+        ValueError: if the location is not one of the player's planets.
+    '''
+    if val.isdigit():
+        return val
+    loc = parseLocation(val)
+    for p in page.planets if page is not None else []:
+        if p.location == loc and p.id:
+            return p.id
+    print(f"None of your planets is at {val}. Run 'planets' first, or give a planet id.")
+    raise ValueError(val)
+
+def formatJob(m:Mission) -> str:
+    ships = ", ".join(f"{getattr(m.ships, n):,} {n}" for n in SHIPS if getattr(m.ships, n))
+    return f"{m.mission} from {m.origin} to {m.target} with {ships}"
+
+def formatHeader() -> str:
+    return f"{'Id':>5} {'State':<8} {'Mission':<10} {'From':<14} {'To':<11} {'Tries':>5} {'ms':>8}  Error"
+
+def formatRow(m:Mission) -> str:
+    ms = f"{m.latencyMs:>8.0f}" if m.latencyMs is not None else f"{'-':>8}"
+    return (f"{m.id:>5} {m.state:<8} {m.mission:<10} {m.origin:<14} "
+            f"{str(m.target):<11} {m.attempts:>5} {ms}  {m.error}")
+
+def optHelp():
+    '''
+    Prints help text for dispatch command to the terminal.
+    '''
+    logger.debug("User requested help for command \"dispatch.\"")
+    w = shutil.get_terminal_size().columns
+    print("Usage: dispatch add|list|run|retry|clear [OPTION]")
+    t = "Stage fleet missions in a queue, then send them all at once. Missions " \
+        "from different planets go out in parallel, as fast as the server " \
+        "allows. A mission whose answer is lost is only sent again once its " \
+        "ships are seen to be still at home. The queue is kept between sessions."
+    s = textwrap.wrap(t,w)
+    for l in s: print(l)
+    print("\nActions:")
+    print("    add OPTIONS SHIP=N...  queue a mission")
+    print("    list                   show every job and its state")
+    print("    run                    send the queued jobs")
+    print("    retry ID...            queue failed or unknown jobs again")
+    print("    clear                  remove sent and failed jobs")
+    print("\nOptions of add:")
+    print("    -o ID, -o G:S:P[m]     origin planet, by id or location")
+    print("    -t G:S:P[m]            target location")
+    print(f"    -m MISSION             {', '.join(MISSIONS)} (default Transport)")
+    print("    -p N                   speed in tenths of full speed (default 10)")
+    print("    SHIP=N                 ships to send, e.g. atlas=20")
+    print("    ore=N, crystal=N, hydrogen=N   cargo")
+    print("    -h, --help             display this help and exit")
+    print("\nExamples:")
+    print("    dispatch add -o 25:11:14 -t 8:41:3 -m transport atlas=20 ore=50000")
+    print("    dispatch run")
@@ -0,0 +1,294 @@
+import requests                         # to handle REST exceptions
+import shutil                           # to get terminal window properties
+import textwrap                         # to gracefully wrap text in terminal
+import logging                          # built-in Python logging
+import threading                        # to share the indexes between script threads
+from collections.abc import Iterator, Sequence
+
+from restRequests import fetchConcurrently, RateLimiter   # to send REST requests
+from galaxy import GALAXY_URL, GalaxySlot, buildGalaxyParams, parseGalaxyPage
+from page import pageOf                 # to parse each system page once
+from planet import Location, distances, locationArray   # for store queries
+from galaxyStore import GalaxyStore, STORE_PATH, MAX_AGE
+from galaxyIndex import GalaxyIndex     # for nearest-target queries
+
+logger = logging.getLogger(__name__)    # set module-level logging object
+
+MAX_WORKERS = 4             # default number of systems fetched at once
+REQUESTS_PER_SECOND = 5.0   # default request rate limit per host
+INACTIVE_RADIUS = 20        # default systems searched around a location
+FLAGS = {"-h": "-h", "--help": "-h", "-f": "-f", "--force": "-f",
+         "-i": "-i", "--inactive": "-i"}   # options that take no value
+
+_indexes: dict[str, tuple[tuple, GalaxyIndex]] = {}  # store version and index, by store path
+_indexLock = threading.Lock()                       # guards _indexes
+
+def galaxy(cmd:dict[str, list[str]], s:requests.Session, cfg:dict) -> list[GalaxySlot] | None:
+    '''
+    Handles the "galaxy" command from sfc main function. A single system is
+    shown with "-gN -sM", and a range of systems is swept concurrently with
+    "-gN -sA..B". Every system seen is kept in the galaxy store, and only
+    systems whose stored copy is stale are fetched again, unless "-f" forces
+    a refresh. Fetched systems are printed as soon as they arrive, so a sweep
+    prints them in completion order, not numeric order. With "-i", inactive
+    players near the given system are listed from the store alone, nearest
+    first. "-nK" lists the K planets nearest to the system (only inactive
+    ones with "-i"), from an in-memory index of the store that sweeps keep
+    up to date.
+
+    :param cmd: Dictionary of the user-entered command string, as parsed by the
+                buildCommandDict function in sfc.py.
+    :type cmd:  dict[str, list[str]]
+
+    :param s:   The user's request session object.
+    :type s:    requests.Session
+
+    :param cfg: The "galaxy" section of the application config. Recognises
+                "maxWorkers", "requestsPerSecond", "storePath" and "maxAge".
+    :type cfg:  dict
+
+    :return:    Every slot shown, for callers that want the data rather than
+                the printout (e.g. script mode), or None if the command failed
+                (after printing why), e.g. when a system could not be loaded.
+    :rtype:     list[GalaxySlot] | None
+    '''
+
+    logger.debug("Entered function galaxy().")
+    opts = parseArgs(cmd["args"])
+
+    if "-h" in opts:
+        optHelp()
+        return []
+    if "-x" in opts:
+        return None
+    if not "-g" in opts or not "-s" in opts:
+        print("Both a galaxy and a system are required. See galaxy --help.")
+        return None
+
+    g = opts["-g"][0]
+    systems = range(opts["-s"][0], opts["-s"][1] + 1)
+    with GalaxyStore(cfg.get("storePath", STORE_PATH)) as store:
+        if "-n" in opts:
+            where = GalaxyStore.isInactive if "-i" in opts else None
+            radius = opts["-r"][0] if "-r" in opts else None
+            found = getIndex(store).nearest(Location(g, systems.start), opts["-n"][0],
+                                            where, radius)
+            kind = "inactive planets" if "-i" in opts else "planets"
+            print(f"Nearest {kind} to {g}:{systems.start}:")
+            for slot in found:
+                print(formatSlot(slot))
+            if len(found) == 0:
+                print("    (none stored)")
+            return found
+
+        if "-i" in opts:
+            radius = opts["-r"][0] if "-r" in opts else INACTIVE_RADIUS
+            centre = Location(g, systems.start)
+            found = store.inactiveNear(centre, radius)
+            # Nearest first, as the best raid targets.
+            order = distances(centre, locationArray(x.location for x in found)).argsort(kind="stable")
+            found = [found[i] for i in order]
+            print(f"Inactive players within {radius} systems of {g}:{systems.start}:")
+            for slot in found:
+                print(formatSlot(slot))
+            if len(found) == 0:
+                print("    (none stored)")
+            return found
+
+        shown = []
+        maxAge = 0.0 if "-f" in opts else float(cfg.get("maxAge", MAX_AGE))
+        stale = store.staleSystems(g, systems, maxAge)
+        if len(stale) < len(systems):
+            stored = store.slotsIn(g, systems.start, systems.stop - 1)
+            for system in sorted(set(systems) - set(stale)):
+                slots = [x for x in stored if x.location.system == system]
+                print(formatSystem(g, system, slots))
+                shown.extend(slots)
+
+        found = 0
+        for system, slots in sweepGalaxy(s, g, stale, cfg):
+            saveSystem(store, g, system, slots)
+            print(formatSystem(g, system, slots))
+            shown.extend(slots)
+            found += 1
+        if found < len(stale):
+            print(f"{len(stale) - found} of {len(stale)} systems could not be loaded. "
+                  "See the log for details.")
+            return None
+        return shown
+
+def getIndex(store:GalaxyStore) -> GalaxyIndex:
+    '''
+    Returns the in-memory index of a galaxy store, loading it from the store
+    on first use. It is kept for the rest of the session and updated by
+    every sweep, and loaded again whenever the store has changed in any
+    other way (see GalaxyStore.version()), e.g. by another process, or when
+    a different store has the same path.
+    '''
+    with _indexLock:
+        version = store.version()
+        if store.path not in _indexes or _indexes[store.path][0] != version:
+            _indexes[store.path] = (version, GalaxyIndex(store.allSlots()))
+            logger.info("Indexed %d stored galaxy slots.", len(_indexes[store.path][1]))
+        return _indexes[store.path][1]
+
+def saveSystem(store:GalaxyStore, g:int, system:int, slots:list[GalaxySlot]) -> None:
+    '''
+    Saves a fetched system in the store, and in its index if the index was
+    up to date with the store. An index that was not is dropped, to be
+    loaded again on next use.
+    '''
+    with _indexLock:
+        entry = _indexes.pop(store.path, None)
+        current = entry is not None and entry[0] == store.version()
+        store.saveSystem(g, system, slots)
+        if current:
+            entry[1].update(g, system, slots)
+            _indexes[store.path] = (store.version(), entry[1])
+
+def sweepGalaxy(s:requests.Session, g:int, systems:Sequence[int],
+                cfg:dict) -> Iterator[tuple[int, list[GalaxySlot]]]:
+    '''
+    Fetches and parses a range of solar systems through a bounded pool of
+    worker threads that all share the caller's session (and so its cookies).
+    Requests are spaced out by a per-host rate limiter. Results are yielded as
+    each system finishes. Systems that fail to load are logged and skipped.
+
+    :param s:       The user's request session object.
+    :type s:        requests.Session
+    :param g:       Galaxy number.
+    :type g:        int
+    :param systems: Solar system numbers to fetch.
+    :type systems:  Sequence[int]
+    :param cfg:     The "galaxy" section of the application config.
+    :type cfg:      dict
+    :return:        Iterator of (system number, occupied slots) tuples.
+    :rtype:         Iterator[tuple[int, list[GalaxySlot]]]
+    '''
+
+    workers = max(1, int(cfg.get("maxWorkers", MAX_WORKERS)))
+    limiter = RateLimiter(float(cfg.get("requestsPerSecond", REQUESTS_PER_SECOND)))
+    if len(systems) == 0: return
+    logger.info("Sweeping %d systems of galaxy %d, from %d to %d, with %d workers.",
+                len(systems), g, min(systems), max(systems), workers)
+
+    reqs = {system: {"url": GALAXY_URL, "params": buildGalaxyParams(g, system)}
+            for system in systems}
+    parse = lambda system, r: parseGalaxyPage(pageOf(r), g, system)
+    yield from fetchConcurrently(s, reqs, parse, workers, limiter)     #type: ignore
+
+def formatSystem(g:int, system:int, slots:list[GalaxySlot]) -> str:
+    '''
+    Formats the occupied slots of a system as a small text table.
+
+    :param g:       Galaxy number.
+    :type g:        int
+    :param system:  Solar system number.
+    :type system:   int
+    :param slots:   Occupied slots of the system.
+    :type slots:    list[GalaxySlot]
+    :return:        Multi-line string ready to print.
+    :rtype:         str
+    '''
+    lines = [f"Solar System {g}:{system}"]
+    if len(slots) == 0:
+        lines.append("    (empty)")
+    for slot in slots:
+        lines.append(formatSlot(slot))
+    return "\n".join(lines)
+
+def formatSlot(slot:GalaxySlot) -> str:
+    '''
+    Formats one occupied slot as a line of a system table.
+
+    :param slot:    Occupied slot.
+    :type slot:     GalaxySlot
+    :return:        Single line ready to print.
+    :rtype:         str
+    '''
+    loc = str(slot.location)
+    ally = f"[{slot.alliance}]" if slot.alliance else ""
+    return f"    {loc:<10} {slot.name:<28} {slot.player:<24} {ally:<8} {slot.status}"
+
+def parseArgs(pOpts:list[str]) -> dict[str, list[int]]:
+    '''
+    Parses the arguments from the command dictionary into galaxy options.
+    Values may be attached to the option ("-g8") or follow it ("-g 8"), and
+    the system may be a range ("-s35..40"). "-f" and "-i" take no value.
+
+    Args:
+        pOpts (list[str]):  List containing the strings from the "args" element
+                            in the command dictionary.
+
+    Returns:
+        dict:   Dictionary keyed by option. "-g" maps to [galaxy], "-s" maps to
+                [first system, last system], "-r" to [radius, radius] and
+                "-n" to [count, count]. "-h", "-f" and "-i" are present when
+                given, and "-x" when the options were malformed.
+    '''
+
+    logger.debug("Entered function parseArgs().")
+    opts = {}
+    args = [a for a in pOpts if a]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in FLAGS:
+            opts[FLAGS[a]] = []
+            i += 1
+            continue
+        opt, val = a[:2], a[2:]
+        if opt not in ("-g", "-s", "-r", "-n"):
+            print(f"Unknown option '{a}'. See galaxy --help.")
+            logger.info("User supplied unknown option %s for galaxy.", a)
+            opts["-x"] = []
+            return opts
+        if not val and i + 1 < len(args):
+            i += 1
+            val = args[i]
+        try:
+            first, _, last = val.partition("..")
+            nums = [int(first), int(last) if last else int(first)]
+        except ValueError:
+            print(f"Option '{opt}' needs a number. See galaxy --help.")
+            logger.info("User supplied malformed value '%s' for galaxy option %s.", val, opt)
+            opts["-x"] = []
+            return opts
+        if nums[0] < 1 or nums[1] < nums[0] or (opt != "-s" and nums[0] != nums[1]):
+            print(f"Invalid value '{val}' for option '{opt}'. See galaxy --help.")
+            opts["-x"] = []
+            return opts
+        opts[opt] = nums
+        i += 1
+
+    return opts
+
+def optHelp():
+    '''
+    Prints help text for galaxy command to the terminal.
+    '''
+    logger.debug("User requested help for command \"galaxy.\"")
+    w = shutil.get_terminal_size().columns
+    print("Usage: galaxy -gN -sM[..K] [OPTION]")
+    t = "Show the planets in one solar system, or sweep a range of solar " \
+        "systems. A sweep loads several systems at once and prints each one " \
+        "as soon as it arrives. Systems are remembered between sessions, " \
+        "and only systems not seen recently are loaded again."
+    s = textwrap.wrap(t,w)
+    for l in s: print(l)
+    print("\nMandatory arguments to long options are also mandatory for short options.")
+    print("    -g N                galaxy number")
+    print("    -s M, -s M..K       solar system number, or range of systems")
+    print("    -f, --force         load every system, even if seen recently")
+    print("    -i, --inactive      list remembered inactive players near system M,")
+    print("                        nearest first")
+    print("    -n K                list the K stored planets nearest to system M,")
+    print("                        only inactive ones with -i")
+    print("    -r N                systems to search around M for -i (default 20)")
+    print("                        or -n (default all)")
+    print("    -h, --help          display this help and exit")
+    print("\nExamples:")
+    print("    galaxy -g8 -s35     will show System 35 in Galaxy 8")
+    print("    galaxy -g8 -s1..50  will sweep Systems 1 to 50 in Galaxy 8")
+    print("    galaxy -g8 -s41 -i  will list inactive players near 8:41")
+    print("    galaxy -g8 -s41 -n5 -i  will list the 5 inactive planets nearest 8:41")
@@ -4,10 +4,16 @@ import shutil                           # to get terminal window properties
 import textwrap                         # to gracefully wrap text in terminal
 import logging                          # built-in Python logging
 from restRequests import sendRequest    # to send REST requests
+from page import ParsedPage, pageOf     # to hand the landing page to caller
+from page import getPath                # to build the prompt of a resumed session
+import sessionStore                     # to resume a saved session
+from streamParser import extractFields, HEADER_FIELDS
+
+HOME_URL = "https://playstarfleet.com/"
 
 logger = logging.getLogger(__name__)    # set module-level logging object
 
-def login(cmd:dict[str, list[str]], s:requests.Session) -> str:
+def login(cmd:dict[str, list[str]], s:requests.Session) -> ParsedPage | None:
     '''
     Handles the "login" command from sfc main function.
 
@@ -20,11 +26,11 @@ def login(cmd:dict[str, list[str]], s:requests.Session) -> str:
     :param s:   The user's request session object.
     :type s:    requests.Session
 
-    :return:    If the login was successful, the function will return a string
-                containing the HTML text of the returned page.
-                If the login was unsuccessful, the function will return an empty
-                string, and an error message may be printed to the console.
-    :rtype:     str
+    :return:    If the login was successful, the function will return the
+                returned page, ready to be shared by every extractor.
+                If the login was unsuccessful, the function will return None,
+                and an error message may be printed to the console.
+    :rtype:     ParsedPage | None
     '''
 
     logger.debug("Entered function login().")
@@ -39,7 +45,7 @@ def login(cmd:dict[str, list[str]], s:requests.Session) -> str:
         match opts[0]["opt"]:
             case "-h":
                 optHelp()
-                return ""
+                return None
             case "-u":
                 if len(opts[0]["args"]) > 0:
                     uname = opts[0]["args"][0]
@@ -47,11 +53,11 @@ def login(cmd:dict[str, list[str]], s:requests.Session) -> str:
                     uname = getUsername()
                 pw = getPassword()
             case "-x":
-                return ""
+                return None
             case _:
                 logger.info("Unknown option supplied for login: %s.", opts[0]['opt'])
                 print(f"Unknown option '{opts[0]['opt']}'. Aborting login.")
-                return ""
+                return None
     
     headers = buildRequestHeaders()
     body = buildRequestBody(uname, pw)
@@ -64,19 +70,83 @@ def login(cmd:dict[str, list[str]], s:requests.Session) -> str:
     except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
         print("There was a problem logging in. Login failed.")
         logger.exception("Error encountered while attempting to log in.")
-        return ""
+        return None
     
     # If it gets to this point, then a response should have been received.
     # Check for successful login.
     if response.text.find("Invalid login or password") != -1:
-        # Login was unsuccessful. Tell user and return empty string.
+        # Login was unsuccessful. Tell user and return nothing.
         logger.info("User supplied an invalid username or password for login.")
         print("Login failed. Invalid username or password.")
-        return ""
+        return None
     else:
-        # Login was successful. Return repsonse HTML.
+        # Login was successful. Return repsonse page.
         logger.info("Login successful.")
-        return response.text
+        return ParsedPage(response.text)
+
+def resume(s:requests.Session, path:str = sessionStore.SESSION_PATH) -> tuple[str, str] | None:
+    '''
+    Tries to resume a session saved by an earlier run, so that the user does
+    not have to log in again. The saved cookies are checked with one request
+    for the home page that does not follow redirects: a live session gets the
+    page, an expired one is redirected to the login page. Of a live page,
+    only the part up to the player name is read and parsed, for the prompt.
+    An expired session is deleted.
+
+    :param s:   The user's request session object.
+    :type s:    requests.Session
+
+    :param path: File the session was saved in.
+    :type path: str
+
+    :return:    Name of the logged-in player and prompt path if the session
+                is still valid, otherwise None.
+    :rtype:     tuple[str, str] | None
+    '''
+
+    logger.debug("Entered function resume().")
+    username = sessionStore.loadSession(s, path)
+    if username is None:
+        return None
+
+    try:
+        logger.info("Checking saved session...")
+        r = sendRequest({"url": HOME_URL, "sess": s, "hdr": buildRequestHeaders(),
+                         "stream": True, "redirects": False})
+        fields = extractFields(r, HEADER_FIELDS) if r.status_code == 200 else {}
+        r.close()
+    except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+        # The session may still be good; keep it for next time.
+        logger.exception("Error encountered while checking saved session.")
+        s.cookies.clear()
+        return None
+
+    if r.status_code != 200:
+        logger.info("Saved session has expired (%s to %s).", r.status_code,
+                    r.headers.get("Location", "?"))
+        s.cookies.clear()
+        sessionStore.removeSession(path)
+        return None
+    username = fields.get("username") or username
+    logger.info("Resumed saved session of %s.", username)
+    return username, getPath(fields.get("title", ""))
+
+def loadHome(s:requests.Session) -> ParsedPage | None:
+    '''
+    Fetches the home page of a logged-in session, e.g. after resuming one.
+
+    :param s:   The user's request session object.
+    :type s:    requests.Session
+
+    :return:    The home page, or None if it could not be loaded.
+    :rtype:     ParsedPage | None
+    '''
+
+    try:
+        return pageOf(sendRequest({"url": HOME_URL, "sess": s}))
+    except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+        logger.exception("Error encountered while loading the home page.")
+        return None
 
 def parseArgs(pOpts:list[str]) -> list:
     '''
@@ -1,31 +1,322 @@
 import requests                         # built-in Python REST support
+import shutil                           # to get terminal window properties
+import textwrap                         # to gracefully wrap text in terminal
 import logging                          # built-in Python logging
+import copy                             # for projected copies of planets
+import time                             # to time resource snapshots
+from dataclasses import fields
+from page import ParsedPage, pageOf     # for the most recent page
+from planet import Planet, Resources    # for refreshed planet data
+from production import Projection, hasRates   # to estimate resources without loading pages
+from restRequests import fetchConcurrently, RateLimiter
 
 logger = logging.getLogger(__name__)    # set module-level logging object
 
-def planet(cmd:dict[str, list[str]], s:requests.Session) -> str:
+HOME_URL = "https://playstarfleet.com/"
+MAX_WORKERS = 4             # default number of planets fetched at once
+REQUESTS_PER_SECOND = 5.0   # default request rate limit per host
+PROJECT_FOR = 0.0           # default seconds a refresh is projected instead of fetched again
+
+_known: dict[str, Planet] = {}  # last refresh of each planet, by id, for projections
+_knownState = 0                 # session's count of state changes when _known was valid
+
+def planet(cmd:dict[str, list[str]], s:requests.Session, page:ParsedPage | None,
+           cfg:dict) -> list[Planet] | None:
     '''
-    Entry point for the planet command. Accepts a command dict and returns
-    something...I'm not sure what yet.
-    
+    Entry point for the planet command. Refreshes every planet in the player's
+    planet list at once, one "activate_planet" fetch per planet, and prints a
+    summary row for each planet as soon as it arrives. Planets whose page is
+    still fresh in the session's page cache are not fetched again, nor are
+    planets refreshed less than "projectFor" seconds ago (none by default):
+    their resources are projected from that refresh instead. With "-e", every
+    planet is projected from its last refresh without loading anything, and
+    with "-a" the time each planet can afford a cost is estimated the same
+    way. Only planets whose page showed their production rates are
+    projected. Refreshes are forgotten once a state-changing request (e.g.
+    sending a fleet) has been sent, since it may have moved resources.
+
     :param cmd: Command string generated by sfc module.
     :type cmd: dict[str, list[str]]
     :param s: Current REST session object
     :type s: requests.Session
-    :return: Unsure about what the return type or description will be yet.
-    :rtype: str
+    :param page: Most recent in-game page, or None before login
+    :type page: ParsedPage | None
+    :param cfg: The "planets" section of the application config. Recognises
+                "maxWorkers", "requestsPerSecond" and "projectFor".
+    :type cfg: dict
+    :return: The refreshed planets, in the order they arrived, or None if the
+             command failed (after printing why), e.g. before login or when
+             a planet could not be loaded.
+    :rtype: list[Planet] | None
     '''
 
     logger.debug("Entered function planet().")
 
     opts = parseArgs(cmd["args"])
+    if "-h" in opts:
+        displayHelp()
+        return []
+    if "-x" in opts:
+        return None
+    if "-a" in opts or "-e" in opts:
+        refreshed = knownPlanets(s)
+        known = [refreshed[p.id] for p in page.planets if p.id in refreshed] if page is not None else []
+        if len(known) == 0:
+            print("No planets refreshed yet. Run \"planets\" first.")
+            return None
+        unknown = [p.name for p in known if not hasRates(p)]
+        if unknown:
+            print(f"No production rates known for {', '.join(unknown)}; not estimated.")
+            known = [p for p in known if hasRates(p)]
+            if len(known) == 0:
+                return None
+        if "-a" in opts:
+            return afford(known, parseCost(cmd["args"]))
+        projected = projectPlanets(known)
+        print("Estimated from the last refresh of each planet:")
+        print(formatHeader())
+        for p in projected:
+            print(formatRow(p))
+        print(formatTotals(projected))
+        return projected
+
+    if page is None or len(page.planets) == 0:
+        print("No planets known yet. Please log in first.")
+        return None
+
+    print(formatHeader())
+    planets = []
+    for p in refreshPlanets(s, page.planets, cfg):
+        planets.append(p)
+        print(formatRow(p))
+    if len(planets) < len(page.planets):
+        print(f"{len(page.planets) - len(planets)} of {len(page.planets)} planets could not "
+              "be loaded. See the log for details.")
+    print(formatTotals(planets))
+    return planets if len(planets) == len(page.planets) else None
+
+def refreshPlanets(s:requests.Session, known:list[Planet], cfg:dict):
+    '''
+    Fetches the home page of every known planet through a bounded worker pool
+    and parses each into a fresh Planet. Results are yielded as they finish.
+
+    :param s:       Current REST session object.
+    :type s:        requests.Session
+    :param known:   Planets from the planet list, with id, name and location.
+    :type known:    list[Planet]
+    :param cfg:     The "planets" section of the application config.
+    :type cfg:      dict
+    :return:        Iterator of refreshed planets.
+    :rtype:         Iterator[Planet]
+    '''
+    byId = {p.id: p for p in known if p.id}
+    refreshed = knownPlanets(s)
+    recent = time.time() - float(cfg.get("projectFor", PROJECT_FOR))
+    skipped = {pid: refreshed[pid] for pid in byId if pid in refreshed
+               and refreshed[pid].seen > recent and hasRates(refreshed[pid])}
+    if skipped:
+        logger.info("Projecting %d recently refreshed planets instead of loading them.", len(skipped))
+        yield from projectPlanets(list(skipped.values()))
+
+    reqs = {pid: {"url": HOME_URL, "params": {"activate_planet": pid}}
+            for pid in byId if pid not in skipped}
+    workers = int(cfg.get("maxWorkers", MAX_WORKERS))
+    limiter = RateLimiter(float(cfg.get("requestsPerSecond", REQUESTS_PER_SECOND)))
+    logger.info("Refreshing %d planets with %d workers.", len(reqs), workers)
+
+    parse = lambda pid, r: parsePlanet(byId[pid], pageOf(r))
+    for _, p in fetchConcurrently(s, reqs, parse, workers, limiter):
+        refreshed[p.id] = p
+        yield p
+
+def knownPlanets(s:requests.Session | None) -> dict[str, Planet]:
+    '''
+    Returns the last refresh of each planet, by id. The refreshes are dropped
+    first if the session has sent a state-changing request since they were
+    made (see restRequests.sendRequest()), so that projections never start
+    from resources that may already be gone.
+
+    :param s:   The user's request session object.
+    :type s:    requests.Session | None
+    :return:    The planets of the last refreshes that are still valid.
+    :rtype:     dict[str, Planet]
+    '''
+    global _knownState
+    changes = getattr(s, "stateChanges", 0)
+    if changes != _knownState:
+        if _known:
+            logger.info("Forgetting %d planet refreshes after a state change.", len(_known))
+        _known.clear()
+        _knownState = changes
+    return _known
+
+def projectPlanets(planets:list[Planet], when:float | None = None) -> list[Planet]:
+    '''
+    Estimates the resources of refreshed planets at a given time, from their
+    last refresh. See production.Projection.
+
+    :param planets: Planets returned by refreshPlanets(), with known
+                    production rates.
+    :type planets:  list[Planet]
+    :param when:    Seconds since the epoch. None for now.
+    :type when:     float | None
+    :return:        Copies of the planets with the projected resources. Their
+                    "seen" time is still the time of the refresh.
+    :rtype:         list[Planet]
+    '''
+    projection = Projection(planets)
+    projected = []
+    for p, res in zip(planets, projection.resourcesAt(when)):
+        p = copy.copy(p)
+        p.resources = res
+        projected.append(p)
+    return projected
+
+def afford(planets:list[Planet], cost:Resources | None) -> list[Planet] | None:
+    '''
+    Prints when each planet will have enough resources on hand for a cost,
+    projected from its last refresh.
+
+    :return:    The planets, soonest first, or None if there is no cost.
+    :rtype:     list[Planet] | None
+    '''
+    if cost is None:
+        return None
+    projection = Projection(planets)
+    ready = projection.affordableAt(cost)
+    order = ready.argsort(kind="stable")
+    now = time.time()
+    print(f"{'Planet':<28} {'Location':<11} Affordable")
+    for i in order:
+        print(f"{planets[i].name[:28]:<28} {formatLocation(planets[i]):<11} {formatWait(ready[i] - now)}")
+    return [planets[i] for i in order]
+
+def parsePlanet(known:Planet, page:ParsedPage) -> Planet:
+    '''
+    Builds a Planet from the home page fetched with the planet activated.
+    The home page shows the planet's resources and running tasks. Its mines,
+    ships and defences are on other pages (buildings, fleet and defence), so
+    they are left empty here rather than loading three more pages per planet.
+
+    :param known:   Entry of the planet list, for the id, name and location.
+    :type known:    Planet
+    :param page:    Home page of the planet.
+    :type page:     ParsedPage
+    :return:        New planet with its resources and tasks filled in.
+    :rtype:         Planet
+    '''
+    p = Planet()
+    p.id = known.id
+    p.name = known.name
+    p.location = known.location
+    p.resources = page.resources
+    p.production = page.production
+    p.storage = page.storage
+    p.tasks = {t.id: t for t in page.tasks}
+    p.seen = time.time()
+    return p
+
+def formatLocation(p:Planet) -> str:
+    loc = p.location
+    if loc.galaxy == 0: return "moving"     # roaming planets have no location
+    return str(loc)
+
+def formatHeader() -> str:
+    return f"{'Planet':<28} {'Location':<11} {'Ore':>18} {'Crystal':>18} {'Hydrogen':>22}"
+
+def formatRow(p:Planet) -> str:
+    r = p.resources
+    return (f"{p.name[:28]:<28} {formatLocation(p):<11} {r.ore:>18,} "
+            f"{r.crystal:>18,} {r.hydrogen:>22,}")
 
-    return ""
+def formatWait(seconds:float) -> str:
+    if seconds == float("inf"): return "never"
+    if seconds <= 0: return "now"
+    m = int(seconds + 59) // 60
+    return f"in {m // 1440}d {m // 60 % 24}h {m % 60:02}m" if m >= 1440 else f"in {m // 60}h {m % 60:02}m"
+
+def formatTotals(planets:list[Planet]) -> str:
+    total = Resources()
+    for p in planets:
+        total.ore += p.resources.ore
+        total.crystal += p.resources.crystal
+        total.hydrogen += p.resources.hydrogen
+    return (f"{'Total':<28} {'':<11} {total.ore:>18,} "
+            f"{total.crystal:>18,} {total.hydrogen:>22,}")
 
 def parseArgs(opts:list[str]) -> list[str]:
+    '''
+    Parses the arguments from the command dictionary into planet options.
+
+    Args:
+        opts (list[str]):   List containing the strings from the "args" element
+                            in the command dictionary.
+
+    Returns:
+        list[str]:  The options given. "-x" is added when an option is unknown.
+    '''
     logger.debug("Entered function parseArgs().")
-    return []
+    parsed = []
+    for o in opts:
+        match o:
+            case "":
+                pass
+            case "-h" | "--help":
+                parsed.append("-h")
+            case "-e" | "--estimate":
+                parsed.append("-e")
+            case "-a" | "--afford":
+                parsed.append("-a")
+            case _ if "=" in o:
+                pass                    # cost of -a, see parseCost()
+            case _:
+                print(f"Unknown option '{o}'. See planets --help.")
+                logger.info("User supplied unknown option %s for planets.", o)
+                parsed.append("-x")
+    return parsed
+
+def parseCost(opts:list[str]) -> Resources | None:
+    '''
+    Parses the cost given to "-a", as "name=amount" arguments, e.g.
+    "ore=50000 crystal=20000".
+
+    Args:
+        opts (list[str]):   List containing the strings from the "args" element
+                            in the command dictionary.
+
+    Returns:
+        Resources | None:   The cost, or None if it was malformed or missing
+                            (after printing why).
+    '''
+    cost = Resources()
+    names = [f.name for f in fields(Resources)]
+    for o in opts:
+        name, _, amount = o.partition("=")
+        if not amount:
+            continue
+        if name.lower() not in names or not amount.replace(",", "").isdigit():
+            print(f"Invalid cost '{o}'. See planets --help.")
+            logger.info("User supplied invalid cost %s for planets.", o)
+            return None
+        setattr(cost, name.lower(), int(amount.replace(",", "")))
+    if cost == Resources():
+        print("Give a cost to afford, e.g. \"ore=50000\". See planets --help.")
+        return None
+    return cost
 
 def displayHelp():
     logger.debug("Entered function displayHelp().")
-    pass
\ No newline at end of file
+    w = shutil.get_terminal_size().columns
+    print("Usage: planets [OPTION]")
+    t = "Refresh all of your planets at once and show the resources on each. " \
+        "Planets are loaded in parallel and shown as soon as they arrive, so " \
+        "the order can change from one run to the next. Planets loaded " \
+        "within the last few seconds are not loaded again. Resources can also " \
+        "be estimated from the last refresh, without loading anything."
+    for l in textwrap.wrap(t, w): print(l)
+    print("\n    -e, --estimate      show the resources each planet should have now")
+    print("    -a, --afford COST   show when each planet can afford COST, given as")
+    print("                        ore=N crystal=N hydrogen=N")
+    print("    -h, --help          display this help and exit")
+    print("\nExamples:")
+    print("    planets -a ore=50000 crystal=20000  will show which planet can build first")
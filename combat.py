@@ -0,0 +1,306 @@
+import logging                          # built-in Python logging
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np                      # for vectorized battles
+
+from units import SHIPS, DEFENCES, FleetVector, DefenceVector
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+ROUNDS = 6                  # default most rounds a battle lasts
+RUNS = 1000                 # default battles simulated
+TECH_BONUS = 0.1            # per level of weapons, shielding or armour research
+EXPLODE_BELOW = 0.7         # hull fraction under which a damaged unit may explode
+
+# Columns of the combat stat tables. The game shows none of these on the
+# pages the client loads (the fleet page only has cargo, speed and fuel), so
+# callers of simulate() must supply them.
+COMBAT_STATS = ("hull", "shield", "attack")
+
+# The defender's units: ships, then defences, in index order.
+DEFENDER_UNITS = SHIPS + DEFENCES
+# Missiles stored in the silo are not combat units: they neither fire nor
+# are fired on, and are never lost in a battle.
+SILO_MISSILES = ("abm", "ibm")
+FIGHTS = np.array([u not in SILO_MISSILES for u in DEFENDER_UNITS])
+
+@dataclass(eq=False)
+class BattleResult:
+    '''
+    Outcome of a number of simulated battles. Counts are totals over all
+    runs, so that results of separate batches (e.g. from worker processes)
+    add up; the properties give probabilities and expected values per
+    battle.
+    '''
+    runs: int = 0
+    attackerWins: int = 0
+    defenderWins: int = 0
+    draws: int = 0
+    rounds: int = 0             # rounds fought, over all runs
+    # Attacking ships, in SHIPS order.
+    attacker: np.ndarray = field(default_factory=lambda: np.zeros(len(SHIPS), dtype=np.int64))
+    # Units lost over all runs, in SHIPS and DEFENDER_UNITS order.
+    attackerLost: np.ndarray = field(default_factory=lambda: np.zeros(len(SHIPS), dtype=np.int64))
+    defenderLost: np.ndarray = field(default_factory=lambda: np.zeros(len(DEFENDER_UNITS), dtype=np.int64))
+
+    def __add__(self, other:"BattleResult") -> "BattleResult":
+        return BattleResult(self.runs + other.runs, self.attackerWins + other.attackerWins,
+                            self.defenderWins + other.defenderWins, self.draws + other.draws,
+                            self.rounds + other.rounds, np.maximum(self.attacker, other.attacker),
+                            self.attackerLost + other.attackerLost,
+                            self.defenderLost + other.defenderLost)
+
+    @property
+    def winProbability(self) -> float:
+        '''Share of the battles the attacker won.'''
+        return self.attackerWins / self.runs if self.runs else 0.0
+
+    @property
+    def lossProbability(self) -> float:
+        '''Share of the battles the defender won.'''
+        return self.defenderWins / self.runs if self.runs else 0.0
+
+    @property
+    def drawProbability(self) -> float:
+        '''Share of the battles with both sides left standing, or both destroyed.'''
+        return self.draws / self.runs if self.runs else 0.0
+
+    @property
+    def meanRounds(self) -> float:
+        return self.rounds / self.runs if self.runs else 0.0
+
+    @property
+    def attackerLosses(self) -> np.ndarray:
+        '''Expected ships lost by the attacker, in SHIPS order.'''
+        return self.attackerLost / max(self.runs, 1)
+
+    @property
+    def defenderShipLosses(self) -> np.ndarray:
+        '''Expected ships lost by the defender, in SHIPS order.'''
+        return self.defenderLost[:len(SHIPS)] / max(self.runs, 1)
+
+    @property
+    def defenceLosses(self) -> np.ndarray:
+        '''Expected defences lost, in DEFENCES order, before any repairs.'''
+        return self.defenderLost[len(SHIPS):] / max(self.runs, 1)
+
+    def fleetLosses(self, fleet:FleetVector) -> np.ndarray:
+        '''
+        Expected ships lost by one of several attacking fleets. Each fleet
+        loses its share of the losses of each ship class.
+
+        :param fleet:   One of the fleets given to simulate().
+        :type fleet:    FleetVector
+        :return:        Expected ships lost, in SHIPS order.
+        :rtype:         np.ndarray
+        '''
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(self.attacker > 0, fleet.counts / self.attacker, 0.0)
+        return self.attackerLosses * share
+
+def unitStats(table:np.ndarray, present:np.ndarray, tech:tuple[int, int, int]) -> tuple[np.ndarray, ...]:
+    '''
+    Returns the attack, shield and hull of the units present in a battle,
+    with the research bonuses of their owner.
+
+    :param table:   Combat stats of every unit, in COMBAT_STATS columns.
+    :type table:    np.ndarray
+    :param present: Indices of the units in the battle.
+    :type present:  np.ndarray
+    :param tech:    Weapons, shielding and armour research levels.
+    :type tech:     tuple[int, int, int]
+    :return:        Attack, shield and hull arrays, one entry per unit present.
+    :rtype:         tuple[np.ndarray, ...]
+    '''
+    rows = table[present].astype(np.float64)
+    return tuple(rows[:, COMBAT_STATS.index(name)] * (1.0 + TECH_BONUS * level)
+                 for name, level in zip(("attack", "shield", "hull"), tech))
+
+def volley(shooters:np.ndarray, targets:np.ndarray, attack:np.ndarray, shield:np.ndarray,
+           rng:np.random.Generator) -> np.ndarray:
+    '''
+    Fires one round of shots from one side at the other, in every battle at
+    once. Each unit fires one shot at a random enemy unit, so the shots of a
+    unit class spread over the enemy classes in proportion to their counts.
+    A shot's damage is reduced by the target's shield, which is whole again
+    every round.
+
+    :param shooters:    Units of the firing side, shape (runs, classes).
+    :type shooters:     np.ndarray
+    :param targets:     Units of the other side, shape (runs, classes).
+    :type targets:      np.ndarray
+    :param attack:      Attack of each firing class.
+    :type attack:       np.ndarray
+    :param shield:      Shield of each target class.
+    :type shield:       np.ndarray
+    :param rng:         Random number generator.
+    :type rng:          np.random.Generator
+    :return:            Hull damage dealt to each target class, shape (runs, classes).
+    :rtype:             np.ndarray
+    '''
+    total = targets.sum(axis=1, keepdims=True)
+    odds = np.divide(targets, total, out=np.zeros(targets.shape), where=total > 0)
+    odds[total[:, 0] == 0, 0] = 1.0         # no targets: no shots either, see below
+    damage = np.maximum(attack[:, None] - shield[None, :], 0.0)
+    dealt = np.zeros(targets.shape)
+    for j in range(shooters.shape[1]):
+        if damage[j].any():
+            shots = rng.multinomial(np.where(total[:, 0] > 0, shooters[:, j], 0), odds)
+            dealt += shots * damage[j]
+    return dealt
+
+def takeDamage(counts:np.ndarray, hull:np.ndarray, dealt:np.ndarray, unitHull:np.ndarray,
+               rng:np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Applies a round's damage to one side. The hull of each class is pooled:
+    damage destroys whole units first, and the one damaged unit left may
+    explode, the more likely the less hull it has left.
+
+    :return:    Surviving counts and remaining hull of each class.
+    :rtype:     tuple[np.ndarray, np.ndarray]
+    '''
+    hull = np.maximum(hull - dealt, 0.0)
+    units = hull / unitHull
+    whole = np.floor(units + 1e-9)
+    left = units - whole
+    keep = (left > 1e-9) & ((left >= EXPLODE_BELOW) | (rng.random(left.shape) < left))
+    return (np.minimum(whole + keep, counts).astype(np.int64),
+            np.where(keep, hull, whole * unitHull))
+
+def runBattles(attacker:np.ndarray, defender:np.ndarray, shipStats:np.ndarray,
+               defenderStats:np.ndarray, runs:int,
+               seed:np.random.SeedSequence | int | None = None,
+               attackerTech:tuple[int, int, int] = (0, 0, 0),
+               defenderTech:tuple[int, int, int] = (0, 0, 0),
+               rounds:int = ROUNDS) -> BattleResult:
+    '''
+    Simulates a number of battles between one attacking fleet and one
+    defender, all at once: each side is an array of unit counts and an
+    array of remaining hull, with one row per battle and one column per
+    unit class present. This is the worker of simulate(), which takes unit
+    vectors instead.
+
+    :param attacker:        Attacking ships, in SHIPS order.
+    :type attacker:         np.ndarray
+    :param defender:        Defending ships and defences, in DEFENDER_UNITS
+                            order. Silo missiles are left out of the battle.
+    :type defender:         np.ndarray
+    :param shipStats:       Combat stats of the attacker's ships, one row per
+                            ship class.
+    :type shipStats:        np.ndarray
+    :param defenderStats:   Combat stats of the defender's units, one row per
+                            unit in DEFENDER_UNITS order.
+    :type defenderStats:    np.ndarray
+    :param runs:            Number of battles.
+    :type runs:             int
+    :param seed:            Seed of the random numbers, for repeatable results.
+    :type seed:             np.random.SeedSequence | int | None
+    :param attackerTech:    Attacker's weapons, shielding and armour levels.
+    :type attackerTech:     tuple[int, int, int]
+    :param defenderTech:    Defender's weapons, shielding and armour levels.
+    :type defenderTech:     tuple[int, int, int]
+    :param rounds:          Most rounds a battle lasts before it is a draw.
+    :type rounds:           int
+    :return:                Totals over the battles.
+    :rtype:                 BattleResult
+    '''
+    rng = np.random.default_rng(seed)
+    attacker = np.asarray(attacker, dtype=np.int64)
+    defender = np.where(FIGHTS, np.asarray(defender, dtype=np.int64), 0)
+    ia, idf = np.flatnonzero(attacker), np.flatnonzero(defender)
+    attA, shieldA, hullA = unitStats(shipStats, ia, attackerTech)
+    attD, shieldD, hullD = unitStats(defenderStats, idf, defenderTech)
+
+    countA = np.tile(attacker[ia], (runs, 1))
+    countD = np.tile(defender[idf], (runs, 1))
+    poolA, poolD = countA * hullA, countD * hullD
+    fought = np.zeros(runs, dtype=np.int64)
+    for _ in range(rounds):
+        going = (countA.sum(axis=1) > 0) & (countD.sum(axis=1) > 0)
+        if not going.any():
+            break
+        fought += going
+        # Both sides fire at the units standing at the start of the round.
+        toD = volley(countA * going[:, None], countD, attA, shieldD, rng)
+        toA = volley(countD * going[:, None], countA, attD, shieldA, rng)
+        countD, poolD = takeDamage(countD, poolD, toD, hullD, rng)
+        countA, poolA = takeDamage(countA, poolA, toA, hullA, rng)
+
+    leftA, leftD = countA.sum(axis=1) > 0, countD.sum(axis=1) > 0
+    result = BattleResult(runs=runs, attacker=attacker.copy())
+    result.attackerWins = int((leftA & ~leftD).sum())
+    result.defenderWins = int((~leftA & leftD).sum())
+    result.draws = runs - result.attackerWins - result.defenderWins
+    result.rounds = int(fought.sum())
+    result.attackerLost[ia] = (attacker[ia] * runs - countA.sum(axis=0))
+    result.defenderLost[idf] = (defender[idf] * runs - countD.sum(axis=0))
+    return result
+
+def simulate(attackers:Iterable[FleetVector], ships:FleetVector, defences:DefenceVector,
+             shipStats:np.ndarray, defenceStats:np.ndarray, runs:int = RUNS, seed:int | None = None, workers:int = 1,
+             attackerTech:tuple[int, int, int] = (0, 0, 0),
+             defenderTech:tuple[int, int, int] = (0, 0, 0),
+             rounds:int = ROUNDS) -> BattleResult:
+    '''
+    Simulates an attack many times over (Monte Carlo), to estimate the odds
+    of winning and the losses to expect before the fleets are sent. Several
+    attacking fleets (e.g. an alliance attack) fight as one. The combat stats
+    of the units are not built in and must be given; units in the battle
+    without a hull in them are refused rather than guessed.
+
+    :param attackers:       Attacking fleets.
+    :type attackers:        Iterable[FleetVector]
+    :param ships:           Defender's ships.
+    :type ships:            FleetVector
+    :param defences:        Defender's defences.
+    :type defences:         DefenceVector
+    :param shipStats:       Combat stats of every ship class, one row per ship
+                            in SHIPS order and one column per COMBAT_STATS.
+    :type shipStats:        np.ndarray
+    :param defenceStats:    Combat stats of every defence, in DEFENCES order.
+    :type defenceStats:     np.ndarray
+    :param runs:            Number of battles to simulate.
+    :type runs:             int
+    :param seed:            Seed of the random numbers, for repeatable results
+                            with the same number of workers.
+    :type seed:             int | None
+    :param workers:         Processes to spread the battles over. 1 simulates
+                            them in this process.
+    :type workers:          int
+    :param attackerTech:    Attacker's weapons, shielding and armour levels.
+    :type attackerTech:     tuple[int, int, int]
+    :param defenderTech:    Defender's weapons, shielding and armour levels.
+    :type defenderTech:     tuple[int, int, int]
+    :param rounds:          Most rounds a battle lasts before it is a draw.
+    :type rounds:           int
+    :return:                Outcome of the battles.
+    :rtype:                 BattleResult
+    :raises ValueError:     When the stats are missing for a unit in the battle.
+    '''
+    attacker = sum((f.counts for f in attackers), np.zeros(len(SHIPS), dtype=np.int64))
+    defender = np.concatenate((ships.counts, defences.counts))
+    shipStats = np.asarray(shipStats, dtype=np.float64)
+    defenderStats = np.vstack((shipStats, np.asarray(defenceStats, dtype=np.float64)))
+    if defenderStats.shape != (len(DEFENDER_UNITS), len(COMBAT_STATS)):
+        raise ValueError(f"Expected {len(COMBAT_STATS)} combat stats for {len(SHIPS)} ships "
+                         f"and {len(DEFENCES)} defences.")
+    # Units that fight, on either side, must have a hull.
+    fighting = (defender > 0) & FIGHTS
+    fighting[:len(SHIPS)] |= attacker > 0
+    unknown = [u for u, i in zip(DEFENDER_UNITS, fighting & (defenderStats[:, COMBAT_STATS.index("hull")] <= 0)) if i]
+    if unknown:
+        raise ValueError(f"No combat stats for {', '.join(unknown)}.")
+    seeds = np.random.SeedSequence(seed).spawn(max(1, min(workers, runs)))
+    if len(seeds) == 1:
+        return runBattles(attacker, defender, shipStats, defenderStats, runs, seeds[0],
+                          attackerTech, defenderTech, rounds)
+
+    batches = [runs // len(seeds) + (i < runs % len(seeds)) for i in range(len(seeds))]
+    logger.info("Simulating %d battles in %d processes.", runs, len(seeds))
+    with ProcessPoolExecutor(max_workers=len(seeds)) as pool:
+        results = pool.map(runBattles, [attacker] * len(seeds), [defender] * len(seeds),
+                           [shipStats] * len(seeds), [defenderStats] * len(seeds), batches, seeds,
+                           [attackerTech] * len(seeds), [defenderTech] * len(seeds),
+                           [rounds] * len(seeds))
+        return sum(results, BattleResult())
@@ -0,0 +1,391 @@
+import sqlite3                          # for the on-disk queue
+import json                             # for ship and cargo columns
+import logging                          # built-in Python logging
+import threading                        # to share the queue between threads
+import time                             # for timestamps, latency and backoff
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+
+import requests                         # to handle REST exceptions
+from restRequests import sendRequest, RateLimiter   # to send REST requests
+from page import ParsedPage, pageOf     # for the fleet page of the origin
+from planet import Location, Fleet, Resources
+from cmdLogin import buildRequestHeaders
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+STORE_PATH = "dispatch.db"  # default location of the dispatch queue
+MAX_WORKERS = 4             # default number of origin planets sending at once
+REQUESTS_PER_SECOND = 2.0   # default request rate limit per host
+RETRIES = 3                 # default retries of a mission that failed to go out
+BACKOFF = 1.0               # default base of the exponential backoff, seconds
+
+FLEET_URL = "https://playstarfleet.com/fleet"
+SEND_URL = "https://playstarfleet.com/fleet/send_task"
+FLEET_FORM = "#assign_fleet_form"   # form of the fleet page that sends missions
+MISSIONS = ("Deploy", "Attack", "Transport", "Harvest", "Colonize", "Espionage", "Warp")
+
+# Job states. A job is "sending" while its request is out; a job found in
+# that state on start was interrupted, and is marked "unknown" rather than
+# sent again, since it may have gone out.
+QUEUED, SENDING, SENT, FAILED, UNKNOWN = "queued", "sending", "sent", "failed", "unknown"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin      TEXT NOT NULL,
+    galaxy      INTEGER NOT NULL,
+    system      INTEGER NOT NULL,
+    slot        INTEGER NOT NULL,
+    moon        INTEGER NOT NULL,
+    mission     TEXT NOT NULL,
+    ships       TEXT NOT NULL,
+    cargo       TEXT NOT NULL,
+    speed       INTEGER NOT NULL,
+    state       TEXT NOT NULL,
+    attempts    INTEGER NOT NULL,
+    error       TEXT NOT NULL,
+    created     REAL NOT NULL,
+    sent        REAL,
+    latency_ms  REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+'''
+
+JOB_COLUMNS = ("id, origin, galaxy, system, slot, moon, mission, ships, cargo, speed, "
+               "state, attempts, error, created, sent, latency_ms")
+
+@dataclass
+class Mission:
+    origin: str = ""                    # id of the planet the fleet leaves from
+    target: Location = field(default_factory=Location)
+    mission: str = "Transport"          # one of MISSIONS
+    ships: Fleet = field(default_factory=Fleet)
+    cargo: Resources = field(default_factory=Resources)
+    speed: int = 10                     # tenths of full speed
+    id: int = 0                         # queue id, set when queued
+    state: str = QUEUED
+    attempts: int = 0                   # requests sent for this job
+    error: str = ""                     # why the job failed, if it did
+    created: float = 0.0                # when the job was queued, as a Unix time
+    sent: float | None = None           # when the job went out, as a Unix time
+    latencyMs: float | None = None      # time taken by the request that sent it
+
+class DispatchQueue:
+    '''
+    A persistent queue of fleet missions in a local SQLite file, so that
+    missions can be staged ahead of time and survive a restart. Every state
+    change of a job is written before the next step, so an interrupted run
+    never loses track of a mission that might have gone out. Safe to share
+    between threads.
+    '''
+
+    def __init__(self, path:str = STORE_PATH) -> None:
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        logger.debug("Opened dispatch queue '%s'.", path)
+
+    def __enter__(self) -> "DispatchQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def add(self, m:Mission) -> int:
+        '''
+        Queues a mission.
+
+        :param m:   Mission to send. Its id, state and timestamps are set.
+        :type m:    Mission
+        :return:    Queue id of the job.
+        :rtype:     int
+        '''
+        m.state, m.attempts, m.error, m.created = QUEUED, 0, "", time.time()
+        ships = {k: v for k, v in asdict(m.ships).items() if v}
+        with self.lock, self.db:
+            cur = self.db.execute(
+                f"INSERT INTO jobs ({JOB_COLUMNS}) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (m.origin, m.target.galaxy, m.target.system, m.target.slot, int(m.target.moon),
+                 m.mission, json.dumps(ships), json.dumps(asdict(m.cargo)), m.speed,
+                 m.state, m.attempts, m.error, m.created, None, None))
+        m.id = cur.lastrowid or 0
+        logger.info("Queued job %d: %s from %s.", m.id, m.mission, m.origin)
+        return m.id
+
+    def update(self, m:Mission) -> None:
+        '''
+        Writes the state, attempts, error and timing of a job.
+        '''
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET state = ?, attempts = ?, error = ?, sent = ?, "
+                            "latency_ms = ? WHERE id = ?",
+                            (m.state, m.attempts, m.error, m.sent, m.latencyMs, m.id))
+
+    def jobs(self, states:tuple[str, ...] | None = None) -> list[Mission]:
+        '''
+        Returns the jobs in the given states (all jobs if None), oldest first.
+        '''
+        where, args = "", ()
+        if states:
+            where, args = f"WHERE state IN ({', '.join('?' for _ in states)})", tuple(states)
+        with self.lock:
+            rows = self.db.execute(f"SELECT {JOB_COLUMNS} FROM jobs {where} ORDER BY id",
+                                   args).fetchall()
+        return [Mission(origin=r[1], target=Location(r[2], r[3], r[4], bool(r[5])),
+                        mission=r[6], ships=Fleet(**json.loads(r[7])),
+                        cargo=Resources(**json.loads(r[8])), speed=r[9], id=r[0], state=r[10],
+                        attempts=r[11], error=r[12], created=r[13], sent=r[14], latencyMs=r[15])
+                for r in rows]
+
+    def recover(self) -> int:
+        '''
+        Marks jobs left "sending" by an interrupted run as "unknown".
+
+        :return:    Number of jobs marked.
+        :rtype:     int
+        '''
+        with self.lock, self.db:
+            n = self.db.execute("UPDATE jobs SET state = ?, error = ? WHERE state = ?",
+                                (UNKNOWN, "interrupted while sending", SENDING)).rowcount
+        if n:
+            logger.warning("%d jobs were interrupted while sending. Check them in game, and "
+                           "retry the ones that did not go out.", n)
+        return n
+
+    def retry(self, id:int) -> bool:
+        '''
+        Queues a failed or unknown job again.
+
+        :return:    Whether the job was found in one of those states.
+        :rtype:     bool
+        '''
+        with self.lock, self.db:
+            n = self.db.execute("UPDATE jobs SET state = ?, attempts = 0, error = '' "
+                                "WHERE id = ? AND state IN (?, ?)",
+                                (QUEUED, id, FAILED, UNKNOWN)).rowcount
+        return n > 0
+
+    def clear(self, states:tuple[str, ...] = (SENT, FAILED)) -> int:
+        '''
+        Deletes the jobs in the given states.
+
+        :return:    Number of jobs deleted.
+        :rtype:     int
+        '''
+        with self.lock, self.db:
+            return self.db.execute(f"DELETE FROM jobs WHERE state IN "
+                                   f"({', '.join('?' for _ in states)})", states).rowcount
+
+def buildMissionBody(m:Mission, shipIds:dict[str, str]) -> dict[str, str]:
+    '''
+    Builds the fleet form fields that send a mission.
+
+    :param m:       Mission to send.
+    :type m:        Mission
+    :param shipIds: Form id of each ship class at the origin, from the
+                    origin's fleet page (see page.getShipIds()).
+    :type shipIds:  dict[str, str]
+    :return:        Form fields for fleet/send_task.
+    :rtype:         dict[str, str]
+    '''
+    body = {"galaxy": str(m.target.galaxy), "solar_system": str(m.target.system),
+            "planet": str(m.target.slot), "planet_type": "moon" if m.target.moon else "planet"}
+    for name, count in asdict(m.ships).items():
+        if count: body[f"ship_quantities[{shipIds[name]}]"] = str(count)
+    body.update({"send_ore": str(m.cargo.ore), "send_crystal": str(m.cargo.crystal),
+                 "send_hydrogen": str(m.cargo.hydrogen), "speed": str(m.speed),
+                 "mission_option": m.mission, "confirmed": "true", "no_harvest": "false"})
+    return body
+
+def missingShips(m:Mission, page:ParsedPage) -> list[str]:
+    '''
+    Lists the ship classes of a mission that the origin does not have enough of.
+    '''
+    return [name for name, count in asdict(m.ships).items()
+            if count and (name not in page.shipIds or getattr(page.fleet, name) < count)]
+
+def wentOut(m:Mission, before:Fleet, after:Fleet) -> bool:
+    '''
+    Checks whether the ships of a mission left the origin between two looks
+    at its fleet page, i.e. whether a send whose answer was lost went through.
+    '''
+    return all(getattr(after, name) <= getattr(before, name) - count
+               for name, count in asdict(m.ships).items() if count)
+
+def loadFleet(s:requests.Session, origin:str, limiter:RateLimiter) -> ParsedPage:
+    '''
+    Fetches the fleet page of an origin planet.
+
+    :raises ValueError: If the page has no fleet form, e.g. because the
+                        session is not logged in and the login page came
+                        back instead.
+    '''
+    limiter.wait(FLEET_URL)
+    page = pageOf(sendRequest({"url": FLEET_URL, "params": {"activate_planet": origin},
+                               "sess": s}))
+    if page.tree.selectOne(FLEET_FORM) is None:
+        raise ValueError(f"no fleet form on the fleet page of {origin} (not logged in?)")
+    return page
+
+def retryAfter(e:Exception) -> float | None:
+    '''
+    Returns the seconds a server asked to wait with a 429 or 503 answer, or
+    None if it did not.
+    '''
+    r = getattr(e, "response", None)
+    if r is None or r.status_code not in (429, 503):
+        return None
+    try:
+        return float(r.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+def sendMission(s:requests.Session, queue:DispatchQueue, m:Mission, page:ParsedPage | None,
+                limiter:RateLimiter, retries:int, backoff:float) -> ParsedPage | None:
+    '''
+    Sends one queued mission, retrying failures without ever sending it twice:
+    when the answer to a send is lost (a timeout, a dropped connection or a
+    server error), the origin's fleet page is checked before trying again,
+    and if the ships have left, the mission counts as sent. If even that
+    check fails, the job is marked "unknown" and left for the user.
+
+    :param s:       Logged-in session.
+    :type s:        requests.Session
+    :param queue:   Queue the job belongs to. Every state change is saved.
+    :type queue:    DispatchQueue
+    :param m:       The job.
+    :type m:        Mission
+    :param page:    Fresh fleet page of the origin, or None to load it.
+    :type page:     ParsedPage | None
+    :param limiter: Rate limiter shared by all senders.
+    :type limiter:  RateLimiter
+    :param retries: Most retries after the first attempt.
+    :type retries:  int
+    :param backoff: Base of the exponential backoff between attempts, seconds.
+    :type backoff:  float
+    :return:        The origin's fleet page after the job, if one is known to
+                    be fresh, for the next job from the same origin.
+    :rtype:         ParsedPage | None
+    '''
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            if page is None:
+                page = loadFleet(s, m.origin, limiter)
+        except (requests.exceptions.HTTPError, requests.RequestException, ValueError) as e:
+            logger.warning("Could not load the fleet page of %s: %s", m.origin, e)
+            m.error = f"fleet page: {e}"
+            continue
+
+        missing = missingShips(m, page)
+        if missing:
+            m.state, m.error = FAILED, f"not enough ships: {', '.join(missing)}"
+            queue.update(m)
+            return page
+
+        before = page.fleet
+        m.state, m.attempts = SENDING, m.attempts + 1
+        queue.update(m)
+        limiter.wait(SEND_URL)
+        start = time.perf_counter()
+        try:
+            r = sendRequest({"url": f"{SEND_URL}?current_planet={m.origin}", "sess": s,
+                             "body": buildMissionBody(m, page.shipIds),
+                             "hdr": buildRequestHeaders()})
+        except (requests.exceptions.HTTPError, requests.RequestException, ValueError) as e:
+            m.latencyMs = (time.perf_counter() - start) * 1000.0
+            m.error = str(e)
+            status = e.response.status_code if getattr(e, "response", None) is not None else None
+            wait = retryAfter(e)
+            if wait is not None:
+                limiter.backOff(SEND_URL, wait)
+            if status == 429:
+                # Turned away by the server's rate limit: safe to send again.
+                m.state = QUEUED
+                queue.update(m)
+                continue
+            if status is not None and 400 <= status < 500:
+                # Refused outright: sending it again would not help.
+                m.state = FAILED
+                queue.update(m)
+                return page
+            # The mission may have gone out; look before sending it again.
+            try:
+                page = loadFleet(s, m.origin, limiter)
+            except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+                logger.exception("Could not check whether job %d went out.", m.id)
+                m.state = UNKNOWN
+                queue.update(m)
+                return None
+            if wentOut(m, before, page.fleet):
+                logger.info("Job %d went out, although its answer was lost.", m.id)
+                m.state, m.error, m.sent = SENT, "", time.time()
+                queue.update(m)
+                return page
+            m.state = QUEUED
+            queue.update(m)
+            continue
+
+        m.latencyMs = (time.perf_counter() - start) * 1000.0
+        m.state, m.error, m.sent = SENT, "", time.time()
+        queue.update(m)
+        logger.info("Sent job %d (%s to %s) in %.0f ms.", m.id, m.mission,
+                    m.target, m.latencyMs)
+        # The answer is usually the origin's fleet page, ready for the next job.
+        after = pageOf(r)
+        return after if after.shipIds else None
+
+    m.state = FAILED
+    queue.update(m)
+    logger.warning("Job %d failed after %d attempts: %s", m.id, m.attempts, m.error)
+    return None
+
+def dispatchAll(s:requests.Session, queue:DispatchQueue, cfg:dict) -> list[Mission]:
+    '''
+    Sends every queued mission. Missions from the same origin planet go out
+    one after the other, in queue order, each checked against a fresh fleet
+    page; different origins send concurrently through a bounded pool of
+    worker threads. All requests share the caller's (pooled) session and
+    one per-host rate limiter, which also honours the server's Retry-After.
+
+    :param s:       Logged-in session.
+    :type s:        requests.Session
+    :param queue:   Queue of missions.
+    :type queue:    DispatchQueue
+    :param cfg:     The "dispatch" section of the application config.
+                    Recognises "maxWorkers", "requestsPerSecond", "retries"
+                    and "backoff".
+    :type cfg:      dict
+    :return:        The jobs that were queued, in their final state.
+    :rtype:         list[Mission]
+    '''
+    queue.recover()
+    byOrigin: dict[str, list[Mission]] = {}
+    for m in queue.jobs((QUEUED,)):
+        byOrigin.setdefault(m.origin, []).append(m)
+    if not byOrigin:
+        return []
+
+    limiter = RateLimiter(float(cfg.get("requestsPerSecond", REQUESTS_PER_SECOND)))
+    retries = int(cfg.get("retries", RETRIES))
+    backoff = float(cfg.get("backoff", BACKOFF))
+    workers = max(1, min(int(cfg.get("maxWorkers", MAX_WORKERS)), len(byOrigin)))
+    logger.info("Dispatching %d jobs from %d planets with %d workers.",
+                sum(len(j) for j in byOrigin.values()), len(byOrigin), workers)
+
+    def sendAll(jobs:list[Mission]) -> None:
+        page = None
+        for m in jobs:
+            page = sendMission(s, queue, m, page, limiter, retries, backoff)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(sendAll, jobs) for jobs in byOrigin.values()]
+        for f in as_completed(futures):
+            f.result()
+    return sorted((m for jobs in byOrigin.values() for m in jobs), key=lambda m: m.id)
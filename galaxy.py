@@ -0,0 +1,115 @@
+import re                               # for regular expression processing
+import logging                          # built-in Python logging
+from dataclasses import dataclass, field
+
+from planet import Location             # for slot coordinates
+from page import ParsedPage             # for the parsed galaxy page
+from parsers import Node                # backend-neutral parsed element
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+GALAXY_URL = "https://playstarfleet.com/galaxy/show"
+ROW_ID = re.compile(r"^planet_\d+m?$")  # ids of the slot rows in the table
+
+@dataclass
+class GalaxySlot:
+    location: Location = field(default_factory=Location)
+    name: str = ""
+    player: str = ""
+    playerId: int = 0
+    rank: int = 0
+    status: str = ""
+    alliance: str = ""
+    active: bool = False
+
+def buildGalaxyParams(galaxy:int, system:int) -> dict[str, str]:
+    '''
+    Builds the query parameters for a galaxy view request.
+
+    :param galaxy:  Galaxy number.
+    :type galaxy:   int
+    :param system:  Solar system number within the galaxy.
+    :type system:   int
+    :return:        Dictionary of query parameters for the galaxy/show page.
+    :rtype:         dict[str, str]
+    '''
+    return {"galaxy": str(galaxy), "solar_system": str(system)}
+
+def parseGalaxyPage(page:ParsedPage, galaxy:int, system:int) -> list[GalaxySlot]:
+    '''
+    Parses the occupied slots out of a galaxy/show page. Empty slots (those
+    without a planet name) are skipped.
+
+    :param page:    Galaxy/show page.
+    :type page:     ParsedPage
+    :param galaxy:  Galaxy number the page was requested for.
+    :type galaxy:   int
+    :param system:  Solar system number the page was requested for.
+    :type system:   int
+    :return:        List of occupied slots, planets and moons, in page order.
+    :rtype:         list[GalaxySlot]
+    '''
+
+    slots = []
+    table = page.tree.selectOne("table#planets")
+    if table is None:
+        logger.warning("No planet table found in galaxy page for %d:%d.", galaxy, system)
+        return slots
+
+    for row in table.select("tr[id^=planet_]"):
+        if not ROW_ID.match(row.attr("id")):
+            continue
+        slot = parseGalaxyRow(row, galaxy, system)
+        if slot is not None:
+            slots.append(slot)
+
+    logger.debug("Parsed %d occupied slots from galaxy page %d:%d.", len(slots), galaxy, system)
+    return slots
+
+def parseGalaxyRow(row:Node, galaxy:int, system:int) -> GalaxySlot | None:
+    '''
+    Parses a single "planet_N" or "planet_Nm" row of the galaxy table.
+
+    :param row:     Parsed table row.
+    :type row:      Node
+    :param galaxy:  Galaxy number of the row.
+    :type galaxy:   int
+    :param system:  Solar system number of the row.
+    :type system:   int
+    :return:        The parsed slot, or None if the slot is empty.
+    :rtype:         GalaxySlot | None
+    '''
+
+    rowId = row.attr("id").removeprefix("planet_")
+    moon = rowId.endswith("m")
+    slot = GalaxySlot(Location(galaxy, system, int(rowId.rstrip("m")), moon))
+
+    nameSpan = row.selectOne("td.name span[class*=attackable]")
+    if nameSpan is None:
+        return None     # Nothing lives here.
+    slot.name = nameSpan.text().strip()
+    slot.active = row.selectOne("td.name span.activity") is not None
+
+    playerCell = row.selectOne("td.player")
+    if playerCell:
+        cellText = playerCell.text()
+        rank = re.search(r"#(\d+)", cellText)
+        if rank:
+            slot.rank = int(rank.group(1))
+        profile = playerCell.selectOne("a[href*='/user_profile/show/']")
+        if profile:
+            slot.player = profile.text()
+            slot.playerId = int(re.search(r"/show/(\d+)", profile.attr("href")).group(1)) #type: ignore
+        else:
+            # The logged-in player's own name is plain text next to the rank.
+            slot.player = cellText[:rank.start()] if rank else cellText
+        slot.player = slot.player.replace("\u200e", "").strip()
+
+    status = row.select("td.status span.symbols")
+    slot.status = "".join(s.text().strip() for s in status)
+
+    allianceCell = row.selectOne("td.alliance")
+    if allianceCell:
+        slot.alliance = allianceCell.text().strip()
+
+    return slot
@@ -0,0 +1,143 @@
+import bisect                           # for sorted key lookups
+import logging                          # built-in Python logging
+import threading                        # to share the index between threads
+from collections.abc import Callable, Iterable
+
+from planet import Location, distance, SYSTEM_DISTANCE, SYSTEM_BITS
+from galaxy import GalaxySlot           # for indexed galaxy slots
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+class GalaxyIndex:
+    '''
+    An in-memory index of galaxy slots for range and nearest-target queries.
+    Each galaxy keeps the packed keys of its slots (see planet.Location) in a
+    sorted list, so the slots of any range of systems are found with two
+    binary searches, whatever the number of slots loaded. The index is
+    updated one system at a time, as sweep results arrive. Safe to share
+    between threads.
+    '''
+
+    def __init__(self, slots:Iterable[GalaxySlot] = ()) -> None:
+        # Sorted location keys of the occupied slots, per galaxy.
+        self.keys: dict[int, list[int]] = {}
+        # Slot of each location key.
+        self.slots: dict[int, GalaxySlot] = {}
+        self.lock = threading.Lock()
+        for slot in slots:
+            self.slots[slot.location.key] = slot
+        for key in sorted(self.slots):
+            self.keys.setdefault(Location.fromKey(key).galaxy, []).append(key)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def update(self, g:int, system:int, slots:Iterable[GalaxySlot]) -> None:
+        '''
+        Replaces the indexed contents of a system with a fresh view of it, as
+        GalaxyStore.saveSystem() does for the store.
+
+        :param g:       Galaxy number.
+        :type g:        int
+        :param system:  Solar system number.
+        :type system:   int
+        :param slots:   Occupied slots of the system.
+        :type slots:    Iterable[GalaxySlot]
+        '''
+        fresh = {s.location.key: s for s in slots
+                 if s.location.galaxy == g and s.location.system == system}
+        span = Location.keyRange(g, system, system)
+        with self.lock:
+            keys = self.keys.setdefault(g, [])
+            lo = bisect.bisect_left(keys, span.start)
+            hi = bisect.bisect_left(keys, span.stop, lo)
+            for key in keys[lo:hi]:
+                del self.slots[key]
+            keys[lo:hi] = sorted(fresh)
+            self.slots.update(fresh)
+
+    def inSystems(self, g:int, first:int, last:int,
+                  where:Callable[[GalaxySlot], bool] | None = None) -> list[GalaxySlot]:
+        '''
+        Returns the slots of a range of systems, in coordinate order.
+
+        :param g:       Galaxy number.
+        :type g:        int
+        :param first:   First system of the range.
+        :type first:    int
+        :param last:    Last system of the range.
+        :type last:     int
+        :param where:   Only slots for which this returns True, if given.
+        :type where:    Callable[[GalaxySlot], bool] | None
+        :return:        Matching slots.
+        :rtype:         list[GalaxySlot]
+        '''
+        span = Location.keyRange(g, max(0, first), max(0, last))
+        with self.lock:
+            keys = self.keys.get(g, [])
+            lo = bisect.bisect_left(keys, span.start)
+            hi = bisect.bisect_left(keys, span.stop, lo)
+            found = [self.slots[key] for key in keys[lo:hi]]
+        return found if where is None else [s for s in found if where(s)]
+
+    def within(self, centre:Location, radius:int,
+               where:Callable[[GalaxySlot], bool] | None = None) -> list[GalaxySlot]:
+        '''
+        Returns the slots within a number of systems of a location, in the
+        same galaxy, in coordinate order.
+        '''
+        return self.inSystems(centre.galaxy, centre.system - radius, centre.system + radius, where)
+
+    def nearest(self, origin:Location, k:int, where:Callable[[GalaxySlot], bool] | None = None,
+                radius:int | None = None) -> list[GalaxySlot]:
+        '''
+        Finds the k slots with the shortest travel distance from a location
+        (see planet.distance()). Systems are searched outwards from the
+        origin, one ring at a time, and the search stops as soon as no slot
+        further out can be closer than the k-th found. Other galaxies are
+        only searched when the origin's galaxy cannot fill k.
+
+        :param origin:  Where the fleet would leave from.
+        :type origin:   Location
+        :param k:       Number of slots to find.
+        :type k:        int
+        :param where:   Only slots for which this returns True, if given.
+        :type where:    Callable[[GalaxySlot], bool] | None
+        :param radius:  Only search this many systems around the origin, in
+                        its own galaxy, if given.
+        :type radius:   int | None
+        :return:        Up to k slots, nearest first. Slots at the same
+                        distance are in coordinate order.
+        :rtype:         list[GalaxySlot]
+        '''
+        if k <= 0:
+            return []
+        g, s = origin.galaxy, origin.system
+        with self.lock:
+            keys = self.keys.get(g, [])
+            lastSystem = Location.fromKey(keys[-1]).system if keys else s
+        found: list[tuple[int, int, GalaxySlot]] = []
+        limit = max(s, lastSystem) if radius is None else radius
+        for r in range(0, limit + 1):
+            if len(found) >= k:
+                found.sort(key=lambda f: f[:2])
+                if found[k - 1][0] < SYSTEM_DISTANCE[0] + SYSTEM_DISTANCE[1] * r:
+                    break
+            for system in {s - r, s + r}:
+                if system >= 0:
+                    found.extend((distance(origin, x.location), x.location.key, x)
+                                 for x in self.inSystems(g, system, system, where))
+        found.sort(key=lambda f: f[:2])
+
+        if len(found) < k and radius is None:
+            # Every slot of another galaxy is as far as the galaxy itself.
+            with self.lock:
+                others = sorted((gg for gg in self.keys if gg != g), key=lambda gg: (abs(gg - g), gg))
+            for gg in others:
+                for x in self.inSystems(gg, 0, (1 << SYSTEM_BITS) - 1, where):
+                    found.append((distance(origin, x.location), x.location.key, x))
+                    if len(found) >= k:
+                        break
+                if len(found) >= k:
+                    break
+        return [x for _, _, x in found[:k]]
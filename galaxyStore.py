@@ -0,0 +1,176 @@
+import sqlite3                          # for the on-disk store
+import logging                          # built-in Python logging
+import threading                        # to share the store between threads
+import time                             # for last-seen timestamps
+
+from planet import Location             # for slot coordinates
+from galaxy import GalaxySlot           # for parsed galaxy slots
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+STORE_PATH = "galaxy.db"    # default location of the galaxy store
+MAX_AGE = 3600.0            # default seconds before a stored system is stale
+INACTIVE = ("i", "I")       # status symbols of inactive players
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS systems (
+    galaxy      INTEGER NOT NULL,
+    system      INTEGER NOT NULL,
+    last_seen   REAL NOT NULL,
+    PRIMARY KEY (galaxy, system)
+);
+CREATE TABLE IF NOT EXISTS slots (
+    galaxy      INTEGER NOT NULL,
+    system      INTEGER NOT NULL,
+    slot        INTEGER NOT NULL,
+    moon        INTEGER NOT NULL,
+    name        TEXT NOT NULL,
+    player      TEXT NOT NULL,
+    player_id   INTEGER NOT NULL,
+    rank        INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    alliance    TEXT NOT NULL,
+    active      INTEGER NOT NULL,
+    PRIMARY KEY (galaxy, system, slot, moon)
+);
+CREATE INDEX IF NOT EXISTS slots_player ON slots (player);
+CREATE INDEX IF NOT EXISTS slots_alliance ON slots (alliance);
+'''
+
+SLOT_COLUMNS = "galaxy, system, slot, moon, name, player, player_id, rank, status, alliance, active"
+
+class GalaxyStore:
+    '''
+    A local SQLite store of galaxy data. Holds every occupied slot seen by a
+    galaxy view or sweep, keyed by galaxy:system:slot, and the time each
+    system was last seen, so that sweeps only refetch stale systems and
+    queries need no requests at all. Safe to share between threads.
+    '''
+
+    def __init__(self, path:str = STORE_PATH) -> None:
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        logger.debug("Opened galaxy store '%s'.", path)
+
+    def __enter__(self) -> "GalaxyStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def saveSystem(self, g:int, system:int, slots:list[GalaxySlot],
+                   seen:float | None = None) -> None:
+        '''
+        Replaces the stored contents of a system with a fresh view of it.
+
+        :param g:       Galaxy number.
+        :type g:        int
+        :param system:  Solar system number.
+        :type system:   int
+        :param slots:   Occupied slots of the system.
+        :type slots:    list[GalaxySlot]
+        :param seen:    When the system was seen, as a Unix time. Now if None.
+        :type seen:     float | None
+        '''
+        if seen is None: seen = time.time()
+        rows = [(s.location.galaxy, s.location.system, s.location.slot, int(s.location.moon),
+                 s.name, s.player, s.playerId, s.rank, s.status, s.alliance, int(s.active))
+                for s in slots]
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM slots WHERE galaxy = ? AND system = ?", (g, system))
+            self.db.executemany(f"INSERT INTO slots ({SLOT_COLUMNS}) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO systems (galaxy, system, last_seen) "
+                            "VALUES (?, ?, ?)", (g, system, seen))
+
+    def version(self) -> tuple:
+        '''
+        Returns a summary of the stored contents that changes whenever a
+        system is saved, by this or any other connection, so that copies of
+        the store (e.g. a galaxyIndex.GalaxyIndex) can tell they are stale.
+        '''
+        with self.lock:
+            return self.db.execute("SELECT count(*), total(last_seen), "
+                                   "(SELECT count(*) FROM slots) FROM systems").fetchone()
+
+    def lastSeen(self, g:int, system:int) -> float | None:
+        '''
+        Returns when a system was last seen, as a Unix time, or None if never.
+        '''
+        with self.lock:
+            row = self.db.execute("SELECT last_seen FROM systems WHERE galaxy = ? AND system = ?",
+                                  (g, system)).fetchone()
+        return row[0] if row else None
+
+    def staleSystems(self, g:int, systems:range, maxAge:float = MAX_AGE) -> list[int]:
+        '''
+        Picks the systems of a range that were never seen, or not seen within
+        maxAge seconds.
+
+        :param g:       Galaxy number.
+        :type g:        int
+        :param systems: Solar system numbers to check.
+        :type systems:  range
+        :param maxAge:  Age in seconds after which a system is stale.
+        :type maxAge:   float
+        :return:        Stale system numbers, in ascending order.
+        :rtype:         list[int]
+        '''
+        cutoff = time.time() - maxAge
+        with self.lock:
+            fresh = {row[0] for row in self.db.execute(
+                "SELECT system FROM systems WHERE galaxy = ? AND system BETWEEN ? AND ? "
+                "AND last_seen >= ?", (g, systems.start, systems.stop - 1, cutoff))}
+        return [s for s in systems if s not in fresh]
+
+    def slotsIn(self, g:int, first:int, last:int) -> list[GalaxySlot]:
+        '''
+        Returns the stored slots of a range of systems, in coordinate order.
+        '''
+        return self.query("galaxy = ? AND system BETWEEN ? AND ?", (g, first, last))
+
+    def allSlots(self) -> list[GalaxySlot]:
+        '''
+        Returns every stored slot, in coordinate order, e.g. to build a
+        galaxyIndex.GalaxyIndex.
+        '''
+        return self.query("1 = 1", ())
+
+    def inactiveNear(self, loc:Location, radius:int) -> list[GalaxySlot]:
+        '''
+        Finds planets of inactive players within a number of systems of a
+        location, in the same galaxy.
+
+        :param loc:     Centre of the search.
+        :type loc:      Location
+        :param radius:  Maximum distance in systems.
+        :type radius:   int
+        :return:        Matching slots, in coordinate order.
+        :rtype:         list[GalaxySlot]
+        '''
+        where = ("galaxy = ? AND system BETWEEN ? AND ? AND moon = 0 AND ("
+                 + " OR ".join("instr(status, ?) > 0" for _ in INACTIVE) + ")")
+        return self.query(where, (loc.galaxy, loc.system - radius, loc.system + radius, *INACTIVE))
+
+    @staticmethod
+    def isInactive(slot:GalaxySlot) -> bool:
+        '''
+        Checks whether a slot is a planet of an inactive player, as
+        inactiveNear() selects them.
+        '''
+        return not slot.location.moon and any(c in slot.status for c in INACTIVE)
+
+    def query(self, where:str, args:tuple) -> list[GalaxySlot]:
+        '''
+        Returns the stored slots matching an SQL condition on the slots table.
+        '''
+        with self.lock:
+            rows = self.db.execute(f"SELECT {SLOT_COLUMNS} FROM slots WHERE {where} "
+                                   "ORDER BY galaxy, system, slot, moon", args).fetchall()
+        return [GalaxySlot(Location(r[0], r[1], r[2], bool(r[3])), r[4], r[5], r[6], r[7],
+                           r[8], r[9], bool(r[10])) for r in rows]
@@ -0,0 +1,178 @@
+import requests                         # for the response and adapter types
+import base64                           # for binary HAR response bodies
+import glob                             # to expand HAR file patterns
+import io                               # to give responses a readable body
+import json                             # for HAR file parsing
+import logging                          # built-in Python logging
+import threading                        # to share replay state between threads
+import time                             # for simulated latency
+from urllib.parse import urlsplit, parse_qsl
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+# Response headers that describe the wire format. HAR bodies are stored
+# already decoded, so these no longer apply to the replayed body.
+WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+def requestKey(method:str, url:str) -> tuple:
+    '''
+    Builds the key a request is matched on: method, path and query string.
+    Query parameters are compared as a sorted list, so their order does not
+    matter.
+
+    :param method:  HTTP method, e.g. "GET".
+    :type method:   str
+    :param url:     Full request URL.
+    :type url:      str
+    :return:        Matching key.
+    :rtype:         tuple
+    '''
+    parts = urlsplit(url)
+    query = tuple(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return (method.upper(), parts.path or "/", query)
+
+class HarReplayAdapter(BaseAdapter):
+    '''
+    A transport adapter that answers requests from recorded HAR files instead
+    of the network. Requests are matched on method, path and query string. If
+    no entry matches exactly, the first entry with the same method and path is
+    used. Requests that still do not match get a 404 response.
+
+    When the same request was recorded more than once, the recordings are
+    served in turn. Optionally, each response is delayed by the time the
+    server took to answer in the recording.
+    '''
+
+    def __init__(self, paths:list[str], latency:bool = False, latencyScale:float = 1.0) -> None:
+        super().__init__()
+        # Recorded entries, keyed by full request key and by (method, path).
+        self.entries: dict[tuple, list[dict]] = {}
+        self.byPath: dict[tuple, list[dict]] = {}
+        # Next recording to serve for each key.
+        self.turn: dict[tuple, int] = {}
+        # Whether to sleep for the recorded timings, and by what factor.
+        self.latency = latency
+        self.latencyScale = latencyScale
+        self.lock = threading.Lock()
+        for path in paths:
+            self.load(path)
+
+    def load(self, path:str) -> None:
+        '''
+        Adds the entries of one HAR file.
+
+        :param path:    Path of the HAR file.
+        :type path:     str
+        '''
+        with open(path, 'r') as f:
+            har = json.load(f)
+        n = 0
+        for entry in har["log"]["entries"]:
+            key = requestKey(entry["request"]["method"], entry["request"]["url"])
+            self.entries.setdefault(key, []).append(entry)
+            self.byPath.setdefault(key[:2], []).append(entry)
+            n += 1
+        logger.debug("Loaded %d HAR entries from '%s'.", n, path)
+
+    def match(self, method:str, url:str) -> dict | None:
+        '''
+        Finds the recorded entry for a request.
+
+        :param method:  HTTP method.
+        :type method:   str
+        :param url:     Full request URL.
+        :type url:      str
+        :return:        The HAR entry, or None if nothing matches.
+        :rtype:         dict | None
+        '''
+        key = requestKey(method, url)
+        candidates = self.entries.get(key)
+        if not candidates:
+            key = key[:2]
+            candidates = self.byPath.get(key)
+            if not candidates:
+                return None
+            logger.debug("No exact HAR match for %s %s. Matched on path only.", method, url)
+        with self.lock:
+            i = self.turn.get(key, 0)
+            self.turn[key] = i + 1
+        return candidates[i % len(candidates)]
+
+    def send(self, request:requests.PreparedRequest, stream:bool = False,
+             timeout=None, verify=True, cert=None, proxies=None) -> requests.Response:
+        entry = self.match(request.method or "GET", request.url or "")
+        if entry is None:
+            logger.warning("No HAR entry for %s %s.", request.method, request.url)
+            return self.buildResponse(request, 404, "Not Found in HAR", [], b"")
+
+        if self.latency:
+            time.sleep(recordedSeconds(entry["timings"]) * self.latencyScale)
+
+        rec = entry["response"]
+        content = rec.get("content", {})
+        body = content.get("text", "") or ""
+        if content.get("encoding") == "base64":
+            data = base64.b64decode(body)
+        else:
+            data = body.encode("utf-8")
+        headers = [h for h in rec.get("headers", []) if h["name"].lower() not in WIRE_HEADERS]
+        r = self.buildResponse(request, rec["status"], rec.get("statusText", ""), headers, data)
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers) or "utf-8"
+        return r
+
+    def buildResponse(self, request:requests.PreparedRequest, status:int, reason:str,
+                      headers:list[dict], data:bytes) -> requests.Response:
+        '''
+        Builds a complete, already-read response object.
+        '''
+        r = requests.Response()
+        r.status_code = status
+        r.reason = reason
+        r.headers = CaseInsensitiveDict({h["name"]: h["value"] for h in headers})
+        r.raw = io.BytesIO(data)
+        r._content = data
+        r._content_consumed = True
+        r.url = request.url or ""
+        r.request = request
+        r.connection = self
+        return r
+
+    def close(self) -> None:
+        pass
+
+def recordedSeconds(timings:dict) -> float:
+    '''
+    Adds up the recorded phases of a HAR entry. Phases that were not
+    measured are recorded as -1 and are skipped.
+
+    :param timings: The "timings" object of a HAR entry, in milliseconds.
+    :type timings:  dict
+    :return:        Total time in seconds.
+    :rtype:         float
+    '''
+    return sum(v for k, v in timings.items() if k != "blocked" and v > 0) / 1000.0
+
+def mountReplay(s:requests.Session, cfg:dict) -> HarReplayAdapter:
+    '''
+    Replaces the network transport of a session with HAR replay.
+
+    :param s:   Session to serve from recordings.
+    :type s:    requests.Session
+    :param cfg: The "replay" section of the "rest" config. Recognises "files"
+                (list of HAR paths or glob patterns), "latency" and
+                "latencyScale".
+    :type cfg:  dict
+    :return:    The mounted adapter.
+    :rtype:     HarReplayAdapter
+    '''
+    paths = []
+    for pattern in cfg.get("files", []):
+        paths.extend(sorted(glob.glob(pattern)))
+    adapter = HarReplayAdapter(paths, bool(cfg.get("latency", False)),
+                               float(cfg.get("latencyScale", 1.0)))
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    logger.info("Replaying requests from %d HAR files.", len(paths))
+    return adapter
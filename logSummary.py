@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import argparse                         # for command line options
+import datetime                         # for record timestamps
+import json                             # for structured log lines
+import math                             # for percentile ranks
+import sys                              # for output
+
+PERCENTILES = (50, 95, 99)
+
+def readRecords(path:str) -> list[dict]:
+    '''
+    Reads the request timing records from a log file written with the plogger
+    "json" format. Lines that are not JSON, or are not request records, are
+    skipped, so a log that switched format part way through still works.
+
+    :param path:    Path of the log file.
+    :type path:     str
+    :return:        Request records, in file order.
+    :rtype:         list[dict]
+    '''
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and "elapsed_ms" in rec:
+                records.append(rec)
+    return records
+
+def percentile(values:list[float], p:float) -> float:
+    '''
+    Returns the p-th percentile of a list, by the nearest-rank method.
+
+    :param values:  Sorted values.
+    :type values:   list[float]
+    :param p:       Percentile, from 0 to 100.
+    :type p:        float
+    :return:        The percentile, or 0.0 for an empty list.
+    :rtype:         float
+    '''
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(values)))
+    return values[rank - 1]
+
+def summarize(records:list[dict]) -> dict:
+    '''
+    Summarizes request records per endpoint: latency percentiles, throughput
+    over the whole logged period, bytes, errors and cache hits.
+
+    :param records: Output of readRecords().
+    :type records:  list[dict]
+    :return:        Summary with "window_s" and one entry per "METHOD /path"
+                    under "endpoints", busiest first.
+    :rtype:         dict
+    '''
+    times = [datetime.datetime.fromisoformat(r["time"]) for r in records if "time" in r]
+    window = (max(times) - min(times)).total_seconds() if len(times) > 1 else 0.0
+
+    groups: dict[str, list[dict]] = {}
+    for r in records:
+        key = f"{r.get('method', '?')} {r.get('endpoint', r.get('url', '?'))}"
+        groups.setdefault(key, []).append(r)
+
+    endpoints = {}
+    for key, recs in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        elapsed = sorted(float(r["elapsed_ms"]) for r in recs)
+        size = sum(int(r.get("bytes") or 0) for r in recs)
+        entry = {"count": len(recs),
+                 "errors": sum(1 for r in recs if not r.get("status") or r["status"] >= 400),
+                 "cache_hits": sum(1 for r in recs if r.get("cache_hit")),
+                 "bytes": size,
+                 "mean_ms": round(sum(elapsed) / len(elapsed), 3)}
+        for p in PERCENTILES:
+            entry[f"p{p}_ms"] = round(percentile(elapsed, p), 3)
+        entry["per_s"] = round(len(recs) / window, 3) if window > 0 else None
+        entry["kib_per_s"] = round(size / 1024.0 / window, 3) if window > 0 else None
+        endpoints[key] = entry
+    return {"requests": len(records), "window_s": round(window, 3), "endpoints": endpoints}
+
+def formatSummary(summary:dict) -> str:
+    '''
+    Renders a summary as a plain text table.
+    '''
+    lines = [f"{summary['requests']} requests over {summary['window_s']:.1f} s",
+             f"{'Endpoint':<32} {'Count':>6} {'Err':>4} {'Hit':>4} "
+             + " ".join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f" {'Req/s':>7} {'KiB/s':>8}"]
+    for key, e in summary["endpoints"].items():
+        rate = f"{e['per_s']:>7.2f}" if e["per_s"] is not None else f"{'-':>7}"
+        kib = f"{e['kib_per_s']:>8.1f}" if e["kib_per_s"] is not None else f"{'-':>8}"
+        lines.append(f"{key[:32]:<32} {e['count']:>6} {e['errors']:>4} {e['cache_hits']:>4} "
+                     + " ".join(f"{e[f'p{p}_ms']:>9.1f}" for p in PERCENTILES) + f" {rate} {kib}")
+    return "\n".join(lines)
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarize request latency and throughput per "
+                                 "endpoint from a JSON-lines sfc log.")
+    ap.add_argument("log", help="log file written with \"format\": \"json\"")
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args()
+
+    try:
+        records = readRecords(args.log)
+    except OSError as e:
+        print(f"Error while reading log file: {e}", file=sys.stderr)
+        sys.exit(1)
+    summary = summarize(records)
+    print(json.dumps(summary, indent=2) if args.json else formatSummary(summary))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import re                               # for regular expression processing
+import logging                          # built-in Python logging
+from functools import cached_property   # to extract each field only once
+
+import parsers                          # for the configured HTML parser backend
+from parsers import Node                # backend-neutral parsed element
+from planet import Planet, Resources, Production, Fleet, Task, parseLocation
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+LOCATION_PATTERN = re.compile(r"\d+:\d+:\d+m?")
+# Production rate and storage capacity set by the resource bar's script, e.g.
+# "ore_rate = 0.0013;" and "ore_max =  str2bigInt('4792889709',10,64,3);".
+RATE_PATTERN = re.compile(r"\b(ore|crystal|hydrogen)_(rate|max)\s*=\s*"
+                          r"(?:str2bigInt\('(\d+)'|([-+.\deE]+);)")
+
+class ParsedPage:
+    '''
+    A page returned by the SFC server. The HTML is parsed at most once, on the
+    first access to any field, and every extracted field is cached, so any
+    number of extractors can share one page for the cost of a single parse.
+    '''
+
+    def __init__(self, htm:str, backend:str | None = None) -> None:
+        # Raw HTML of the page.
+        self.html = htm
+        # HTML parser backend, or None for the configured one.
+        self.backend = backend
+
+    @cached_property
+    def tree(self) -> Node:
+        '''The parsed document tree. Built on first use.'''
+        logger.debug("Parsing page of %d characters.", len(self.html))
+        return parsers.parse(self.html, self.backend)
+
+    @cached_property
+    def title(self) -> str:
+        '''Text of the page title, or an empty string if there is none.'''
+        return getTitle(self.tree)
+
+    @cached_property
+    def path(self) -> str:
+        '''Prompt path built from the page title. See getPath().'''
+        return getPath(self.title)
+
+    @cached_property
+    def username(self) -> str:
+        '''Name of the logged-in player. See getUsername().'''
+        return getUsername(self.tree)
+
+    @cached_property
+    def welcome(self) -> str:
+        '''Formatted welcome message of the login page. See getWelcomeMessage().'''
+        return getWelcomeMessage(self.tree)
+
+    @cached_property
+    def planets(self) -> list[Planet]:
+        '''The player's planets and moons. See getPlanets().'''
+        return getPlanets(self.tree)
+
+    @cached_property
+    def resources(self) -> Resources:
+        '''Resources on the active planet. See getResources().'''
+        return getResources(self.tree)
+
+    @cached_property
+    def production(self) -> Production:
+        '''Production per second of the active planet. See getProduction().'''
+        return getProduction(self.html)
+
+    @cached_property
+    def storage(self) -> Resources:
+        '''Storage capacity of the active planet. See getStorage().'''
+        return getStorage(self.html)
+
+    @cached_property
+    def fleet(self) -> Fleet:
+        '''Ships at the active planet, from the fleet page. See getFleet().'''
+        return getFleet(self.tree)
+
+    @cached_property
+    def shipIds(self) -> dict[str, str]:
+        '''Form ids of the ships on the fleet page, by class. See getShipIds().'''
+        return getShipIds(self.tree)
+
+    @cached_property
+    def shipStats(self) -> dict[str, dict[str, float]]:
+        '''Cargo, speed and fuel of the ships on the fleet page. See getShipStats().'''
+        return getShipStats(self.tree)
+
+    @cached_property
+    def tasks(self) -> list[Task]:
+        '''Running tasks shown on the home page. See getTasks().'''
+        return getTasks(self.tree)
+
+def pageOf(r) -> ParsedPage:
+    '''
+    Returns the parsed page of a response, parsing it on first use and keeping
+    it on the response. Responses served again from the page cache or after
+    a 304 Not Modified are the same objects, so their pages are not parsed
+    again.
+
+    :param r:   Response of an in-game page.
+    :type r:    requests.Response
+    :return:    Parsed page of the response.
+    :rtype:     ParsedPage
+    '''
+    page = getattr(r, "parsedPage", None)
+    if page is None:
+        page = ParsedPage(r.text)
+        r.parsedPage = page
+    return page
+
+def getTitle(tree:Node) -> str:
+    '''
+    Returns the text of the page title.
+
+    :param tree:    Parsed page.
+    :type tree:     Node
+    :return:        Title text, or an empty string if the page has no title or
+                    the title is empty.
+    :rtype:         str
+    '''
+    titleElem = tree.selectOne("title")
+    if not titleElem:       # Check that the title element exists.
+        logger.warning("No title in the HTML receeived from server.")
+        return ""
+    titleStr = titleElem.text()
+    if not titleStr:        # Check that the title actually contains text.
+        logger.warning("Title received from server contains no text.")
+        return ""
+    return titleStr
+
+def getWelcomeMessage(tree:Node) -> str:
+    '''
+    Extracts the welcome message from the login page and returns a formatted
+    string.
+
+    Args:
+        tree (Node): the parsed login page
+
+    Returns:
+        str: string containing a formatted version of the welcome message
+    '''
+    lc = tree.selectOne("#leftColumn")
+    s = lc.selectOne("h1").text().strip() + "\n"                   #type: ignore
+    s = s + lc.selectOne("p").text().strip() + "\n"                #type: ignore
+    for item in lc.select("li"):                                   #type: ignore
+        s = s + "• " + re.sub(r"\s{2,}", "", item.text().strip()) + "\n"
+    return s
+
+def getUsername(tree:Node) -> str:
+    '''
+    Finds and returns the username from the passed page. This function
+    expects the page to be the REST response containing the "home" page of a
+    planet.
+
+    Args:
+        tree (Node): parsed planet "home" page. Passing a different page
+                     will cause an error or undefined behaviour.
+
+    Returns:
+        str: The username string. If the username isn't found, an empty string
+             is returned.
+    '''
+    uname = ""
+    # Find the div elements with class "right_column". There should be only one.
+    div = tree.select('div.right_column')
+    if div: # Check that the div was found.
+        a = div[0].select('a') # We want the first (and only) div.
+        if a: # Again, check that an anchor was found.
+            uname = a[0].text() # We're looking for the first anchor.
+    return uname
+
+def getPath(titleStr:str) -> str:
+    '''
+    Builds the prompt path from a page title. This can be the title of any
+    HTML page from SFC, except the site homepage.
+
+    Args:
+        titleStr (str): Text of the page title.
+
+    Returns:
+        str: The path string. If the path isn't found, an empty string is
+             returned.
+    '''
+    path = ""
+    if not titleStr:
+        return path
+
+    logger.debug("Title received from server: \"%s\"", titleStr.replace("\n", "\\n"))
+    titles = titleStr.strip().split(" - ")
+    match titles[0]:
+        case ("Home" | "Fleets" | "Missions" | "Leaderboards"
+              | "Tech Tree" | "Messages" | "Buildings" | "Shipyard"
+              | "Defense" | "Research Lab" | "Factory" | "Workers"):
+            if len(titles) > 1:
+                path = f"[{titles[1]}]/{titles[0]}"
+            else:
+                logger.warning("Received good area \"%s,\" but no planet string! "
+                               "Something is wrong with the server response.", titles[0])
+        case s if "Solar System" in s:
+            _, sep, system = titles[0].rpartition(" ")
+            if sep and len(titles) > 1: # Check that the separating space was found.
+                path = f"{titles[1]}/Galaxy/[{system}]"
+            else:
+                logger.warning("Received Galaxy screen title, but no system "
+                               "locator or planet name! Something is wrong "
+                               "with the server response.")
+        case "Starfleet Commander":
+            pass
+        case _:
+            pass
+    logger.debug("Path constructed from HTML title: \"%s\"", path)
+
+    return path
+
+def getPlanets(tree:Node) -> list[Planet]:
+    '''
+    Extracts the player's planets and moons from the planet selector that is
+    shown at the top of every in-game page. Only the id, name and location of
+    each planet are filled in. Planets that are moving (roaming planets) keep
+    the default location.
+
+    :param tree:    Parsed in-game page.
+    :type tree:     Node
+    :return:        List of planets, in the order shown on the page.
+    :rtype:         list[Planet]
+    '''
+    planets = []
+    selector = tree.selectOne("div#user_planets")
+    if selector is None:
+        logger.warning("No planet selector found in page.")
+        return planets
+
+    for nc in selector.select("div.name_and_coords"):
+        p = Planet()
+        link = nc.ancestor("a")
+        if link:
+            m = re.search(r"activate_planet=(\d+)", link.attr("href"))
+            if m: p.id = m.group(1)
+        name = nc.selectOne("div.planet_name")
+        if name: p.name = name.text().strip()
+        coords = nc.selectOne("div.planet_coordinates")
+        m = LOCATION_PATTERN.search(coords.text()) if coords else None
+        if m: p.location = parseLocation(m.group(0))
+        planets.append(p)
+
+    logger.debug("Found %d planets in page.", len(planets))
+    return planets
+
+def getResources(tree:Node) -> Resources:
+    '''
+    Extracts the resources on hand at the active planet from the resource bar.
+
+    :param tree:    Parsed in-game page.
+    :type tree:     Node
+    :return:        Resources on the active planet. Resources that are not
+                    found are left at zero.
+    :rtype:         Resources
+    '''
+    res = Resources()
+    for name in ("ore", "crystal", "hydrogen"):
+        elem = tree.selectOne(f"#resource_{name}")
+        if elem:
+            amount = re.sub(r"[^\d]", "", elem.text())
+            if amount: setattr(res, name, int(amount))
+    return res
+
+def getProduction(htm:str) -> Production:
+    '''
+    Extracts the production rates of the active planet from the script of
+    the resource bar. The script is read from the raw HTML, so the page does
+    not need to be parsed.
+
+    :param htm:     HTML of an in-game page.
+    :type htm:      str
+    :return:        Production per second. Rates that are not found are left
+                    at zero.
+    :rtype:         Production
+    '''
+    prod = Production()
+    for m in RATE_PATTERN.finditer(htm):
+        if m.group(2) == "rate" and m.group(4):
+            setattr(prod, m.group(1), float(m.group(4)))
+    return prod
+
+def getStorage(htm:str) -> Resources:
+    '''
+    Extracts the storage capacity of the active planet from the script of the
+    resource bar, like getProduction().
+
+    :param htm:     HTML of an in-game page.
+    :type htm:      str
+    :return:        Capacity of each resource. Capacities that are not found
+                    are left at zero.
+    :rtype:         Resources
+    '''
+    res = Resources()
+    for m in RATE_PATTERN.finditer(htm):
+        if m.group(2) == "max" and m.group(3):
+            setattr(res, m.group(1), int(m.group(3)))
+    return res
+
+def getFleet(tree:Node) -> Fleet:
+    '''
+    Extracts the ships at the active planet from the ship list of the fleet
+    page. Each ship row names its class in a hidden "..._key" element (e.g.
+    "atlas_class") and shows the number available after an "x".
+
+    :param tree:    Parsed fleet page.
+    :type tree:     Node
+    :return:        Ship counts. Ships that are not listed are left at zero.
+    :rtype:         Fleet
+    '''
+    fleet = Fleet()
+    for ship in tree.select("div.fleet_table div.ship"):
+        key = ship.selectOne("div[id$='_key']")
+        count = ship.selectOne("span.quantity span")
+        if not key or not count:
+            continue
+        name = key.text().strip().removesuffix("_class")
+        amount = re.sub(r"[^\d]", "", count.text())
+        if hasattr(fleet, name) and amount:
+            setattr(fleet, name, int(amount))
+        elif not hasattr(fleet, name):
+            logger.warning("Unknown ship class '%s' in fleet page.", name)
+    return fleet
+
+def getShipIds(tree:Node) -> dict[str, str]:
+    '''
+    Extracts the id the fleet form uses for each ship class at the active
+    planet. A mission is sent with one "ship_quantities[<id>]" field per ship
+    class.
+
+    :param tree:    Parsed fleet page.
+    :type tree:     Node
+    :return:        Form id of each ship class (e.g. "atlas"), for the ship
+                    classes listed on the page.
+    :rtype:         dict[str, str]
+    '''
+    ids = {}
+    for ship in tree.select("div.fleet_table div.ship"):
+        key = ship.selectOne("div[id$='_key']")
+        field = ship.selectOne("input.ship_quantity")
+        m = re.search(r"\[(\d+)\]", field.attr("name")) if field else None
+        if key and m:
+            ids[key.text().strip().removesuffix("_class")] = m.group(1)
+    return ids
+
+def getShipStats(tree:Node) -> dict[str, dict[str, float]]:
+    '''
+    Extracts the stats of each ship class at the active planet from the ship
+    list of the fleet page. Each ship row keeps its cargo capacity, speed and
+    fuel consumption, with the player's research applied, in hidden elements
+    ("..._cargo_capacity", "..._speed" and "..._fuel_consumption").
+
+    :param tree:    Parsed fleet page.
+    :type tree:     Node
+    :return:        "cargo", "speed" and "fuel" of each ship class (e.g.
+                    "atlas") listed on the page. Stats that are not found
+                    are left out.
+    :rtype:         dict[str, dict[str, float]]
+    '''
+    stats = {}
+    for ship in tree.select("div.fleet_table div.ship"):
+        key = ship.selectOne("div[id$='_key']")
+        if not key:
+            continue
+        row = {}
+        for name, suffix in (("cargo", "cargo_capacity"), ("speed", "speed"),
+                             ("fuel", "fuel_consumption")):
+            elem = ship.selectOne(f"div[id$='_{suffix}']")
+            try:
+                if elem: row[name] = float(elem.text().strip())
+            except ValueError:
+                logger.warning("Malformed %s '%s' in fleet page.", suffix, elem.text().strip())
+        stats[key.text().strip().removesuffix("_class")] = row
+    return stats
+
+def getTasks(tree:Node) -> list[Task]:
+    '''
+    Extracts the running tasks (research, construction, fleet missions) from
+    the task timers of the home page. The time left is not kept, since it
+    changes with every request.
+
+    :param tree:    Parsed home page.
+    :type tree:     Node
+    :return:        Tasks, in the order shown on the page.
+    :rtype:         list[Task]
+    '''
+    tasks = []
+    for row in tree.select("table.task_timer_table tr"):
+        timer = row.selectOne("div.js_timer")
+        if not timer:
+            continue
+        task = Task(id=timer.attr("id"), stance=row.attr("class").strip())
+        kind = row.selectOne("div.label span.text")
+        if kind: task.kind = kind.text().strip().rstrip(":")
+        name = row.selectOne("div.label span.name")
+        if name: task.name = re.sub(r"\s+", " ", name.text().strip())
+        tasks.append(task)
+    return tasks
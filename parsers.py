@@ -0,0 +1,168 @@
+import logging                          # built-in Python logging
+import warnings                         # to silence a misleading bs4 warning
+from abc import ABC, abstractmethod     # for the backend-neutral node interface
+from bs4 import BeautifulSoup           # HTML parser, always available
+from bs4 import XMLParsedAsHTMLWarning
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+DEFAULT_BACKEND = "html.parser"         # pure-Python parser, always available
+BACKENDS = ("html.parser", "lxml", "selectolax")
+
+_backend = DEFAULT_BACKEND              # backend used when none is requested
+
+class Node(ABC):
+    '''
+    A backend-neutral element of a parsed HTML page. Extractors only use this
+    interface, so they give the same results whichever backend built the tree.
+    A backend node that lacks one of the methods cannot be created.
+    '''
+
+    @abstractmethod
+    def select(self, css:str) -> list["Node"]:
+        '''Returns all descendants matching a CSS selector.'''
+
+    @abstractmethod
+    def selectOne(self, css:str) -> "Node | None":
+        '''Returns the first descendant matching a CSS selector, or None.'''
+
+    @abstractmethod
+    def text(self) -> str:
+        '''Returns the text of the element and all of its descendants.'''
+
+    @abstractmethod
+    def attr(self, name:str) -> str:
+        '''Returns an attribute value, or an empty string if it is missing.'''
+
+    @abstractmethod
+    def ancestor(self, tag:str) -> "Node | None":
+        '''Returns the closest enclosing element with the given tag, or None.'''
+
+class SoupNode(Node):
+    '''Node backed by BeautifulSoup, with either html.parser or lxml.'''
+
+    def __init__(self, tag) -> None:
+        self.tag = tag
+
+    def select(self, css:str) -> list[Node]:
+        return [SoupNode(t) for t in self.tag.select(css)]
+
+    def selectOne(self, css:str) -> Node | None:
+        t = self.tag.select_one(css)
+        return SoupNode(t) if t is not None else None
+
+    def text(self) -> str:
+        return self.tag.get_text()
+
+    def attr(self, name:str) -> str:
+        value = self.tag.get(name, "")
+        # BeautifulSoup splits multi-valued attributes such as "class".
+        return " ".join(value) if isinstance(value, list) else value
+
+    def ancestor(self, tag:str) -> Node | None:
+        t = self.tag.find_parent(tag)
+        return SoupNode(t) if t is not None else None
+
+class LexborNode(Node):
+    '''Node backed by selectolax's lexbor parser.'''
+
+    def __init__(self, node) -> None:
+        self.node = node
+
+    def select(self, css:str) -> list[Node]:
+        return [LexborNode(n) for n in self.node.css(css)]
+
+    def selectOne(self, css:str) -> Node | None:
+        n = self.node.css_first(css)
+        return LexborNode(n) if n is not None else None
+
+    def text(self) -> str:
+        return self.node.text(deep=True)
+
+    def attr(self, name:str) -> str:
+        return self.node.attributes.get(name) or ""
+
+    def ancestor(self, tag:str) -> Node | None:
+        n = self.node.parent
+        while n is not None and n.tag != tag:
+            n = n.parent
+        return LexborNode(n) if n is not None else None
+
+def isAvailable(backend:str) -> bool:
+    '''
+    Checks whether a backend can be used, i.e. whether its package is
+    installed.
+
+    :param backend: One of the names in BACKENDS.
+    :type backend:  str
+    :return:        True if the backend can parse pages.
+    :rtype:         bool
+    '''
+    try:
+        match backend:
+            case "html.parser":
+                return True
+            case "lxml":
+                import lxml             # optional, only needed for this backend
+                return True
+            case "selectolax":
+                import selectolax.lexbor    # optional, only needed for this backend
+                return True
+            case _:
+                return False
+    except ImportError:
+        return False
+
+def setBackend(backend:str | None) -> str:
+    '''
+    Selects the backend used by parse() when none is given. Unknown or
+    uninstalled backends fall back to html.parser.
+
+    :param backend: One of the names in BACKENDS, or None for the default.
+    :type backend:  str | None
+    :return:        Name of the backend actually selected.
+    :rtype:         str
+    '''
+    global _backend
+    if not backend:
+        backend = DEFAULT_BACKEND
+    if not isAvailable(backend):
+        logger.warning("HTML parser backend \"%s\" is not available. Falling back to %s.",
+                       backend, DEFAULT_BACKEND)
+        backend = DEFAULT_BACKEND
+    _backend = backend
+    logger.info("HTML parser backend set to %s.", _backend)
+    return _backend
+
+def getBackend() -> str:
+    '''
+    Returns the name of the backend used by parse() when none is given.
+
+    :return:    Name of the selected backend.
+    :rtype:     str
+    '''
+    return _backend
+
+def parse(htm:str, backend:str | None = None) -> Node:
+    '''
+    Parses an HTML string into a tree of backend-neutral nodes.
+
+    :param htm:     HTML string.
+    :type htm:      str
+    :param backend: Backend to use. If None, the one chosen by setBackend().
+    :type backend:  str | None
+    :return:        Root node of the document.
+    :rtype:         Node
+    '''
+    if backend is None: backend = _backend
+    match backend:
+        case "selectolax":
+            from selectolax.lexbor import LexborHTMLParser
+            return LexborNode(LexborHTMLParser(htm).root)
+        case "lxml" | "html.parser":
+            # SFC serves XHTML as text/html, which is meant to be parsed as HTML.
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", XMLParsedAsHTMLWarning)
+                return SoupNode(BeautifulSoup(htm, backend))
+        case _:
+            raise ValueError(f"Unknown HTML parser backend \"{backend}\".")
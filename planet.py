@@ -1,14 +1,142 @@
 import logging      # built-in Python logging
+import re           # for batch location parsing
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)    # set module-level logger object
 
-@dataclass
+LOCATION_FIELDS = ("galaxy", "system", "slot", "moon")  # columns of location arrays
+LOCATIONS = re.compile(r"(?:\d+:\d+:\d+m?\n)*")   # stripped locations, one per line
+
+# Travel distance between two locations, by the largest coordinate that
+# differs: a base plus a step per galaxy, system or slot.
+GALAXY_DISTANCE = (0, 20000)        # (base, per galaxy)
+SYSTEM_DISTANCE = (2700, 95)        # (base, per system)
+SLOT_DISTANCE = (1000, 5)           # (base, per slot)
+MOON_DISTANCE = 5                   # between a planet and its own moon
+
+# Bits of each coordinate in a packed location key, lowest first: moon flag,
+# slot, system, galaxy. Keys sort like (galaxy, system, slot, moon).
+SLOT_BITS = 8
+SYSTEM_BITS = 16
+GALAXY_BITS = 16
+
+_interned: dict[int, "Location"] = {}  # every Location made, by key
+
 class Location:
-    galaxy: int = 0
-    system: int = 0
-    slot: int = 0
-    moon: bool = False
+    '''
+    Coordinates of a planet or moon. Locations are immutable and interned:
+    the same coordinates always give the same object, so they are cheap to
+    keep in large numbers and to use as dict or set keys. Each one carries a
+    packed integer key that hashes, compares and sorts in one operation, and
+    converts to and from the "G:S:P[m]" string format.
+
+    The intern table only grows, but is bounded by the size of the universe.
+    '''
+
+    __slots__ = ("galaxy", "system", "slot", "moon", "key")
+
+    galaxy: int
+    system: int
+    slot: int
+    moon: bool
+    key: int
+
+    def __new__(cls, galaxy:int = 0, system:int = 0, slot:int = 0, moon:bool = False) -> "Location":
+        key = packLocation(galaxy, system, slot, moon)
+        loc = _interned.get(key)
+        if loc is None:
+            loc = object.__new__(cls)
+            for name, value in zip(LOCATION_FIELDS + ("key",),
+                                   (int(galaxy), int(system), int(slot), bool(moon), key)):
+                object.__setattr__(loc, name, value)
+            # Another thread may have made the same location meanwhile.
+            loc = _interned.setdefault(key, loc)
+        return loc
+
+    @classmethod
+    def fromKey(cls, key:int) -> "Location":
+        '''
+        Returns the location of a packed key.
+        '''
+        loc = _interned.get(key)
+        if loc is not None:
+            return loc
+        return cls(key >> (1 + SLOT_BITS + SYSTEM_BITS),
+                   (key >> (1 + SLOT_BITS)) & ((1 << SYSTEM_BITS) - 1),
+                   (key >> 1) & ((1 << SLOT_BITS) - 1),
+                   bool(key & 1))
+
+    @staticmethod
+    def keyRange(galaxy:int, firstSystem:int = 0, lastSystem:int = (1 << SYSTEM_BITS) - 1) -> range:
+        '''
+        Returns the range of keys of every location in a range of systems of a
+        galaxy, e.g. to select them from sorted keys with bisect, or to check
+        "loc.key in range".
+        '''
+        return range(packLocation(galaxy, firstSystem, 0, False),
+                     packLocation(galaxy, lastSystem, (1 << SLOT_BITS) - 1, True) + 1)
+
+    def __setattr__(self, name:str, value) -> None:
+        raise AttributeError("Location is immutable.")
+
+    def __delattr__(self, name:str) -> None:
+        raise AttributeError("Location is immutable.")
+
+    def __reduce__(self):
+        return (Location, (self.galaxy, self.system, self.slot, self.moon))
+
+    def __copy__(self) -> "Location":
+        return self
+
+    def __deepcopy__(self, memo:dict) -> "Location":
+        return self
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other:object) -> bool:
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.key == other.key
+
+    def __lt__(self, other:"Location") -> bool:
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.key < other.key
+
+    def __le__(self, other:"Location") -> bool:
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.key <= other.key
+
+    def __gt__(self, other:"Location") -> bool:
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.key > other.key
+
+    def __ge__(self, other:"Location") -> bool:
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.key >= other.key
+
+    def __repr__(self) -> str:
+        return (f"Location(galaxy={self.galaxy}, system={self.system}, slot={self.slot}, "
+                f"moon={self.moon})")
+
+    def __str__(self) -> str:
+        return f"{self.galaxy}:{self.system}:{self.slot}" + ("m" if self.moon else "")
+
+def packLocation(galaxy:int, system:int, slot:int, moon:bool) -> int:
+    '''
+    Packs coordinates into one integer key. See Location.
+
+    :raises ValueError: If a coordinate is negative or too large to pack.
+    '''
+    if not (0 <= galaxy < 1 << GALAXY_BITS and 0 <= system < 1 << SYSTEM_BITS
+            and 0 <= slot < 1 << SLOT_BITS):
+        raise ValueError(f"Location {galaxy}:{system}:{slot} is out of range.")
+    return (((int(galaxy) << SYSTEM_BITS | int(system)) << SLOT_BITS | int(slot)) << 1) | bool(moon)
 
 @dataclass
 class Resources:
@@ -22,6 +150,12 @@ class Mines:
     crystal: int = 0
     hydrogen: int = 0
 
+@dataclass
+class Production:
+    ore: float = 0.0        # per second
+    crystal: float = 0.0
+    hydrogen: float = 0.0
+
 @dataclass
 class Fleet:
     shadow: int = 0
@@ -58,6 +192,13 @@ class Defences:
     large_decoy: int = 0
     plasma: int = 0
 
+@dataclass
+class Task:
+    id: str = ""            # timer id on the page
+    kind: str = ""          # e.g. "Researching"
+    name: str = ""          # e.g. "Energy Tech (Level 21)"
+    stance: str = ""        # row class, e.g. "friendly" or "hostile"
+
 class Planet:
     def __init__(self):
         # data members (instance variables)
@@ -66,6 +207,9 @@ class Planet:
         self.location = Location()
         self.resources = Resources()
         self.mines = Mines()
+        self.production = Production()
+        self.storage = Resources()      # capacity of each resource
+        self.seen = 0.0                 # time.time() the resources were read
         self.ships = Fleet()
         self.defences = Defences()
         self.tasks = {}
@@ -73,40 +217,126 @@ class Planet:
 
 def parseLocation(loc:str) -> Location:
     '''
-    Parses a location string like "15:450:5m" into a dict with galaxy, system,
-    slot, and moon.
+    Parses a location string like "15:450:5m" into its galaxy, system, slot,
+    and moon. The reverse of str(location).
 
     :param loc: Location string in format "G:S:P" or "G:S:Pm" (m = moon)
     :type loc:  str
-    :return:    Location data class object
+    :return:    The (interned) location
     :rtype:     Location
     '''
 
-    logger.debug("Planet location passed: %s", loc)
-    location = Location()
-
     try:
         elems = loc.strip().split(":")  # This will return a list of strings.
         if len(elems) != 3:             # Check that the list has exectly 3 elements.
             raise ValueError(f"Invalid location format \"{loc}\". Expected \"G:S:P\" or \"G:S:Pm\"")
 
-        location.galaxy = int(elems[0])
-        location.system = int(elems[1])
-
         if elems[2].endswith("m"):      # Detect if the location designates a moon.
-            location.slot = int(elems[2][:-1])
-            location.moon = True
-        else:
-            location.slot = int(elems[2])
-            location.moon = False
-        
-        # Log successful parse.
-        locStr = f"{location.galaxy}:{location.system}:{location.slot}"
-        if location.moon: locStr += "m"
-        logger.debug("Parsed planet location: %s", locStr)
-
-        return location
+            return Location(int(elems[0]), int(elems[1]), int(elems[2][:-1]), True)
+        return Location(int(elems[0]), int(elems[1]), int(elems[2]), False)
 
     except (ValueError, TypeError) as e:
         logger.exception("Could not parse planet location %s", loc)
-        raise
\ No newline at end of file
+        raise
+
+def parseLocations(locs:Iterable[str]):
+    '''
+    Parses many location strings at once, e.g. every slot of a galaxy sweep,
+    into one packed integer array. The strings are matched in a single pass
+    of a regular expression and read by numpy in one call, instead of one
+    call of parseLocation() each.
+
+    :param locs:    Location strings in format "G:S:P" or "G:S:Pm". Any
+                    iterable, e.g. a generator reading them from a file.
+    :type locs:     Iterable[str]
+    :return:        Array of shape (n, 4) with one row per location and the
+                    columns of LOCATION_FIELDS (moon is 0 or 1).
+    :rtype:         numpy.ndarray
+    :raises ValueError: If any string is not a valid location.
+    '''
+    import numpy as np                  # only needed for batch work
+    locs = [loc.strip() for loc in locs]
+    if not locs:
+        return np.empty((0, len(LOCATION_FIELDS)), dtype=np.int32)
+    text = "\n".join(locs) + "\n"
+    if not LOCATIONS.fullmatch(text):
+        for loc in locs:    # Name the first bad string.
+            if not LOCATIONS.fullmatch(loc + "\n"):
+                raise ValueError(f"Invalid location format \"{loc}\". Expected \"G:S:P\" or \"G:S:Pm\"")
+    # "8:41:3m" becomes "8 41 3 1", and "8:41:3" becomes "8 41 3 0", so that
+    # numpy can read every number in one call.
+    text = text.replace("\n", ":0\n").replace("m:0", ":1").replace(":", " ")
+    return np.fromstring(text, dtype=np.int64, sep=" ").astype(np.int32).reshape(
+        len(locs), len(LOCATION_FIELDS))
+
+def locationArray(locations:Iterable[Location]):
+    '''
+    Packs Location objects (e.g. the slots of the galaxy store) into the same
+    array layout as parseLocations().
+    '''
+    import numpy as np                  # only needed for batch work
+    rows = [(l.galaxy, l.system, l.slot, int(l.moon)) for l in locations]
+    return np.array(rows, dtype=np.int32).reshape(len(rows), len(LOCATION_FIELDS))
+
+def distance(origin:Location, target:Location) -> int:
+    '''
+    Computes the travel distance between two locations. See distances() for
+    many targets at once.
+    '''
+    if origin.galaxy != target.galaxy:
+        return GALAXY_DISTANCE[0] + GALAXY_DISTANCE[1] * abs(origin.galaxy - target.galaxy)
+    if origin.system != target.system:
+        return SYSTEM_DISTANCE[0] + SYSTEM_DISTANCE[1] * abs(origin.system - target.system)
+    if origin.slot != target.slot:
+        return SLOT_DISTANCE[0] + SLOT_DISTANCE[1] * abs(origin.slot - target.slot)
+    return MOON_DISTANCE
+
+def distances(origin:Location, targets):
+    '''
+    Computes the travel distance from one location to many at once.
+
+    :param origin:  Where the fleet leaves from.
+    :type origin:   Location
+    :param targets: Output of parseLocations() or locationArray().
+    :type targets:  numpy.ndarray
+    :return:        One distance per target.
+    :rtype:         numpy.ndarray
+    '''
+    import numpy as np                  # only needed for batch work
+    t = np.asarray(targets, dtype=np.int64)
+    dg = np.abs(t[:, 0] - origin.galaxy)
+    ds = np.abs(t[:, 1] - origin.system)
+    dp = np.abs(t[:, 2] - origin.slot)
+    return np.select([dg > 0, ds > 0, dp > 0],
+                     [GALAXY_DISTANCE[0] + GALAXY_DISTANCE[1] * dg,
+                      SYSTEM_DISTANCE[0] + SYSTEM_DISTANCE[1] * ds,
+                      SLOT_DISTANCE[0] + SLOT_DISTANCE[1] * dp],
+                     default=MOON_DISTANCE)
+
+def flightTimes(origin:Location, targets, speed:float, speedTenths:int = 10,
+                universeSpeed:float = 1.0):
+    '''
+    Computes the one-way flight time from one location to many at once, with
+    the usual formula: 10 + 3500 / (speed setting) * sqrt(10 * distance /
+    fleet speed) seconds, divided by the universe speed.
+
+    :param origin:          Where the fleet leaves from.
+    :type origin:           Location
+    :param targets:         Output of parseLocations() or locationArray().
+    :type targets:          numpy.ndarray
+    :param speed:           Speed of the slowest ship in the fleet, e.g. from
+                            the "speed" column of units.shipTable().
+    :type speed:            float
+    :param speedTenths:     Speed setting in tenths of full speed, 1 to 10,
+                            as on the fleet form.
+    :type speedTenths:      int
+    :param universeSpeed:   Fleet speed factor of the universe.
+    :type universeSpeed:    float
+    :return:                One flight time in seconds per target.
+    :rtype:                 numpy.ndarray
+    '''
+    import numpy as np                  # only needed for batch work
+    if speed <= 0:
+        raise ValueError("Fleet speed must be positive.")
+    d = distances(origin, targets)
+    return (10.0 + 3500.0 / speedTenths * np.sqrt(10.0 * d / speed)) / universeSpeed
@@ -1,32 +1,77 @@
 #!/usr/bin/env python3
 
+import atexit               # to flush queued records on exit
+import datetime             # for record timestamps
+import json                 # for structured log lines
 import logging              # for built-in logging functionality
+import logging.handlers     # for the queue handler and listener
+import gzip                 # to compress rotated log segments
+import os                   # for log file sizes and renames
+import queue                # for the queue between loggers and listener
+import re                   # to recognise rotated log segments
+import shutil               # to copy log segments into gzip files
 import sys                  # for standard I/O
+import threading            # to compress rotated segments in the background
+import time                 # for segment ages and names
 
 LOG_FILE = "sfc.txt"        # default log file path
 LOG_LEVEL = logging.DEBUG   # default log level
+MAX_BYTES = 0               # default log file size before rotation (0 = never)
+MAX_AGE = 0                 # default log file age in seconds before rotation (0 = never)
+BACKUP_COUNT = 5            # default number of rotated segments to keep
+
+# Suffix of a rotated segment: its rotation time, a counter if two segments
+# were rotated in the same second, and ".gz" once compressed.
+SEGMENT_SUFFIX = re.compile(r"\.(\d{8}T\d{6})(?:-(\d+))?(\.gz)?$")
+
+# Background listener of the queue-based mode, if it is running.
+_listener: logging.handlers.QueueListener | None = None
+# Whether stop_listener() is registered to run at exit.
+_stop_at_exit = False
 
 class LoggingFileHandler(logging.FileHandler):
     '''
     A file handler that falls back to a default logging handler (e.g., console),
     if an OSError occurrs while trying to write to the log file.
+
+    The log file can also be rotated when it grows past a size or an age. The
+    current file is renamed with its rotation time (e.g. sfc.log.20240131T120000),
+    the rotated segment is gzip-compressed on a background thread, and only
+    the newest backup_count segments are kept.
     '''
 
     def __init__(self, filename: str, mode: str = "a",
                  encoding: str | None = None, delay: bool = False,
                  errors: str | None = None,
-                 fallback_handler:logging.Handler | None = None) -> None:
+                 fallback_handler:logging.Handler | None = None,
+                 max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE,
+                 backup_count: int = BACKUP_COUNT, compress: bool = True) -> None:
         super().__init__(filename, mode, encoding, delay, errors)
         # The handler to use if writing to the log file fails.
         self.fallback_handler = fallback_handler
         # Flag to signal that fallback has already occurred.
         self.is_fallback_active = False
+        # Rotation limits. A limit of 0 turns that kind of rotation off.
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.compress = compress
+        # When the current segment was started. A file left over from an
+        # earlier run counts from when it was last written.
+        self.opened_at = time.time()
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            self.opened_at = os.path.getmtime(self.baseFilename)
+        # Rotated segments waiting to be compressed, and the thread doing it.
+        self.pending: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self.compressor: threading.Thread | None = None
 
     def emit(self, record:logging.LogRecord):
         '''
-        Emits the log record. Tries to write to the log file. If an OSError
-        occurs (e.g., permissions issue or disk full), it switches to the
-        fallback handler and logs a CRITICAL message about the failure.
+        Emits the log record. Tries to write to the log file, rotating it first
+        if it is due. The record is formatted once, both to decide on the
+        rotation and to be written. If an OSError occurs (e.g., permissions issue or disk
+        full), it switches to the fallback handler and logs a CRITICAL message
+        about the failure.
         
         :param record: LogRecord object containing the log record to emit.
         :type record: logging.LogRecord
@@ -39,8 +84,14 @@ class LoggingFileHandler(logging.FileHandler):
             return
         
         try:
-            # Try to emit to the primary log handler.
-            super().emit(record)
+            # Try to write to the log file.
+            msg = self.format(record)
+            if self.should_rollover(record, len(msg)):
+                self.do_rollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg + self.terminator)
+            self.flush()
         except OSError as e:
             # An I/O error occurred (e.g. permissions, disk full, etc.).
             self.is_fallback_active = True # Activate fallback mode.
@@ -68,6 +119,148 @@ class LoggingFileHandler(logging.FileHandler):
 
                 # Now, emit the original message using the fallback handler.
                 self.fallback_handler.emit(record)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def should_rollover(self, record:logging.LogRecord, length:int) -> bool:
+        '''
+        Decides whether the log file must be rotated before writing a record.
+
+        :param record: LogRecord object about to be written.
+        :type record: logging.LogRecord
+        :param length: Length of the formatted record.
+        :type length: int
+
+        :return: True if the file is too old, or too big to take the record.
+        :rtype: bool
+        '''
+
+        if self.max_age > 0 and record.created - self.opened_at >= self.max_age:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            size = self.stream.tell()
+            if size > 0 and size + length + len(self.terminator) >= self.max_bytes:
+                return True
+        return False
+
+    def do_rollover(self):
+        '''
+        Closes the log file, renames it with its rotation time and starts a new
+        one. The renamed segment is compressed, and old segments removed, on a
+        background thread, so the logging thread never waits on them.
+        '''
+
+        if self.stream:
+            self.stream.close()
+            self.stream = None   #type: ignore
+
+        if os.path.exists(self.baseFilename):
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            segment = f"{self.baseFilename}.{stamp}"
+            n = 0
+            while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+                n += 1
+                segment = f"{self.baseFilename}.{stamp}-{n}"
+            os.rename(self.baseFilename, segment)
+            self.pending.put(segment)
+            if self.compressor is None or not self.compressor.is_alive():
+                self.compressor = threading.Thread(target=self.compress_segments,
+                                                   name="log-compressor", daemon=True)
+                self.compressor.start()
+
+        self.opened_at = time.time()
+        if not self.delay:
+            self.stream = self._open()
+
+    def compress_segments(self):
+        '''
+        Runs on the background thread. Compresses each rotated segment, then
+        removes the oldest segments beyond backup_count. Stops when None is
+        queued.
+        '''
+
+        while True:
+            segment = self.pending.get()
+            if segment is None:
+                return
+            try:
+                if self.compress:
+                    with open(segment, 'rb') as src, gzip.open(segment + ".gz.tmp", 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(segment + ".gz.tmp", segment + ".gz")
+                    os.remove(segment)
+                for old in self.segments()[:-self.backup_count or None]:
+                    os.remove(old)
+            except OSError as e:
+                # Logging from here could rotate again, so report it directly.
+                print(f"Failed to compress or remove log segment '{segment}': {e}",
+                      file=sys.stderr)
+
+    def segments(self) -> list[str]:
+        '''
+        Lists the rotated segments of the log file, oldest first.
+
+        :return: Paths of the rotated segments.
+        :rtype: list[str]
+        '''
+
+        folder = os.path.dirname(self.baseFilename)
+        base = os.path.basename(self.baseFilename)
+        found = []
+        for name in os.listdir(folder):
+            if not name.startswith(base):
+                continue
+            m = SEGMENT_SUFFIX.fullmatch(name[len(base):])
+            if m:
+                found.append(((m.group(1), int(m.group(2) or 0)), os.path.join(folder, name)))
+        return [path for _, path in sorted(found)]
+
+    def close(self):
+        '''
+        Closes the log file, after any pending segments have been compressed.
+        '''
+
+        if self.compressor is not None and self.compressor.is_alive():
+            self.pending.put(None)
+            self.compressor.join()
+        self.compressor = None
+        super().close()
+
+class JsonFormatter(logging.Formatter):
+    '''
+    A formatter that writes each record as one line of JSON, with the time,
+    logger name, level and message. If the record has a "fields" attribute
+    (passed as extra={"fields": {...}}), its keys are added to the line as
+    well, e.g. the url, status and elapsed_ms of a request.
+    '''
+
+    def format(self, record:logging.LogRecord) -> str:
+        '''
+        Formats the log record as a JSON object on a single line.
+
+        :param record: LogRecord object to format.
+        :type record: logging.LogRecord
+
+        :return: JSON text of the record, without a trailing newline.
+        :rtype: str
+        '''
+
+        line = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            line.update(fields)
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
 
 def config_root_logger(cfg:dict[str, str]) -> logging.Logger:
     '''
@@ -76,7 +269,13 @@ def config_root_logger(cfg:dict[str, str]) -> logging.Logger:
     further logs to the console.
     
     :param cfg: Plogger configs. If "output", "level", or "filePath" are missing
-                or malformed, then defaults will be used.
+                or malformed, then defaults will be used. If "async" is true,
+                records are put on a queue and written by a background
+                thread, so that logging calls never wait on disk I/O. If
+                "format" is "json", each record is written as one line of
+                JSON (see JsonFormatter) instead of plain text. "maxBytes",
+                "maxAge" (seconds), "backupCount" and "compress" control
+                rotation of the log file; see LoggingFileHandler.
     :type cfg: dict
 
     :return: Configured root logger. DO NOT USE. Always create module-level
@@ -104,10 +303,16 @@ def config_root_logger(cfg:dict[str, str]) -> logging.Logger:
             log_level = LOG_LEVEL
 
     # Create the logging formatter.
-    formatter = logging.Formatter(
-        "%(asctime)s.%(msecs)03d | %(name)s | %(levelname)s | %(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S"
-    )
+    if (cfg.get("format", "text").lower() == "json"):
+        formatter = JsonFormatter()
+    else:
+        if (cfg.get("format", "text").lower() != "text"):
+            print(f"Invalid log format specified in config: {cfg['format']}. "
+                  "Defaulting to text.")
+        formatter = logging.Formatter(
+            "%(asctime)s.%(msecs)03d | %(name)s | %(levelname)s | %(message)s",
+            datefmt="%Y-%m-%dT%H:%M:%S"
+        )
 
     # Get the root logger and apply handlers
     root_logger = logging.getLogger()
@@ -118,29 +323,86 @@ def config_root_logger(cfg:dict[str, str]) -> logging.Logger:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
 
+    handlers = []
     if (cfg["output"].lower() == "file"):
         # Create the primary file handler with fallback.
         f = LOG_FILE
         if ("filePath" in cfg): f = cfg["filePath"]
         file_handler = LoggingFileHandler(
-            filename=f, fallback_handler=console_handler
+            filename=f, fallback_handler=console_handler,
+            max_bytes=int(cfg.get("maxBytes", MAX_BYTES)),
+            max_age=float(cfg.get("maxAge", MAX_AGE)),
+            backup_count=int(cfg.get("backupCount", BACKUP_COUNT)),
+            compress=bool(cfg.get("compress", True))
         )
         file_handler.setFormatter(formatter)
 
         # NOTE: DO NOT add console handler! LoggingFileHandler takes care of this.
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    elif (cfg["output"].lower() == "console"):
+        handlers.append(console_handler)
+
+    if (cfg.get("async", False) and handlers):
+        # Loggers only queue records; a background thread writes them.
+        start_listener(root_logger, handlers)
+    else:
+        for h in handlers:
+            root_logger.addHandler(h)
 
-        # Test that the log file can be written.
+    if (cfg["output"].lower() == "file"):
+        # Test that the log file can be written. Earlier sessions are kept;
+        # rotation bounds the size of the file instead.
         try:
-            with open(f, 'w') as fi:
+            with open(f, 'a') as fi:
                 fi.write("")
                 fi.close()
             root_logger.debug("Testing write to log file '%s'...", f)
         except OSError as e:
             root_logger.warning("Log file write failed! Subsequent log messages "
                                 "will be printed to the console.")
-    elif (cfg["output"].lower() == "console"):
-        root_logger.addHandler(console_handler)
 
     root_logger.info("Logging level set to %s.", logging.getLevelName(root_logger.getEffectiveLevel()))
     return root_logger
+
+def start_listener(root_logger:logging.Logger,
+                   handlers:list[logging.Handler]) -> logging.handlers.QueueListener:
+    '''
+    Switches the root logger to the queue-based mode. The root logger gets a
+    QueueHandler, which only puts records on a queue, and a background
+    listener thread passes them on to the given handlers. The listener is
+    stopped, and the queue flushed, when the program exits.
+
+    :param root_logger: The root logger.
+    :type root_logger: logging.Logger
+    :param handlers: Handlers that do the actual writing, e.g. a
+                     LoggingFileHandler with its console fallback.
+    :type handlers: list[logging.Handler]
+
+    :return: The running listener.
+    :rtype: logging.handlers.QueueListener
+    '''
+
+    global _listener, _stop_at_exit
+    stop_listener()
+
+    q = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(q))
+    _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+    if not _stop_at_exit:
+        atexit.register(stop_listener)
+        _stop_at_exit = True
+    return _listener
+
+def stop_listener() -> None:
+    '''
+    Stops the background listener, if one is running. All queued records are
+    written before this returns.
+    '''
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.flush()
+        _listener = None
@@ -0,0 +1,186 @@
+import datetime                         # for change timestamps
+import hashlib                          # to spot unchanged pages without parsing
+import heapq                            # for the poll schedule
+import json                             # for machine-readable changes
+import logging                          # built-in Python logging
+import random                           # for poll interval jitter
+import threading                        # to stop the poller from another thread
+import time                             # for poll timing
+from collections.abc import Callable
+from dataclasses import asdict, is_dataclass
+from typing import Any
+
+import requests                         # to handle REST exceptions
+from restRequests import sendRequest    # to send REST requests
+from page import pageOf                 # to parse changed pages
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+INTERVAL = 60.0             # default seconds between polls of a view
+JITTER = 0.1                # default random spread of the interval, as a fraction
+
+# Views that can be polled: the page to fetch, and the parts of the parsed
+# page that are compared from one poll to the next.
+VIEWS = {
+    "home": {"url": "https://playstarfleet.com/",
+             "snapshot": lambda page: {"resources": page.resources, "tasks": page.tasks}},
+    "fleet": {"url": "https://playstarfleet.com/fleet",
+              "snapshot": lambda page: {"fleet": page.fleet}},
+}
+
+def flatten(snapshot:dict[str, Any]) -> dict[str, Any]:
+    '''
+    Flattens a snapshot into dotted field names, so that two snapshots can be
+    compared field by field: dataclasses become one entry per field (e.g.
+    "resources.ore"), and lists of items with an id (e.g. tasks) one entry
+    per item, keyed by its id.
+
+    :param snapshot:    Snapshot built by a view.
+    :type snapshot:     dict[str, Any]
+    :return:            Flat dictionary of field name to value.
+    :rtype:             dict[str, Any]
+    '''
+    flat = {}
+    for name, value in snapshot.items():
+        if is_dataclass(value) and not isinstance(value, type):
+            for field, v in asdict(value).items():
+                flat[f"{name}.{field}"] = v
+        elif isinstance(value, list):
+            for item in value:
+                flat[f"{name}.{getattr(item, 'id', '')}"] = asdict(item) if is_dataclass(item) else item
+        else:
+            flat[name] = value
+    return flat
+
+def diffSnapshots(old:dict[str, Any], new:dict[str, Any]) -> list[dict]:
+    '''
+    Compares two flattened snapshots.
+
+    :param old: Earlier output of flatten().
+    :type old:  dict[str, Any]
+    :param new: Later output of flatten().
+    :type new:  dict[str, Any]
+    :return:    One {"field", "old", "new"} entry per field that changed,
+                appeared (old is None) or disappeared (new is None).
+    :rtype:     list[dict]
+    '''
+    changes = []
+    for field in list(old) + [f for f in new if f not in old]:
+        if old.get(field) != new.get(field):
+            changes.append({"field": field, "old": old.get(field), "new": new.get(field)})
+    return changes
+
+def printChange(change:dict) -> None:
+    '''
+    Default output of the poller: one JSON object per line.
+    '''
+    print(json.dumps(change), flush=True)
+
+class Poller:
+    '''
+    Polls a set of views on a schedule and reports what changed. Each view has
+    its own interval, spread out by a random jitter so that polls do not fall
+    into a fixed pattern. A page whose body is byte-for-byte the same as last
+    time (e.g. a cached or unmodified page) is recognised by its hash and not
+    parsed at all. Otherwise its snapshot (resources, fleet, tasks...) is
+    compared with the previous one, and only the fields that changed are
+    reported. The first poll of a view only records its snapshot.
+    '''
+
+    def __init__(self, s:requests.Session, views:list[dict],
+                 emit:Callable[[dict], None] = printChange) -> None:
+        '''
+        :param s:       Logged-in session to poll with.
+        :type s:        requests.Session
+        :param views:   What to poll. Each entry has "view" (a key of VIEWS),
+                        and optionally "planet" (planet id to activate),
+                        "interval" and "jitter".
+        :type views:    list[dict]
+        :param emit:    Called with each change.
+        :type emit:     Callable[[dict], None]
+        '''
+        self.s = s
+        self.emit = emit
+        self.jobs = []
+        for v in views:
+            if v.get("view") not in VIEWS:
+                logger.warning("Unknown view '%s' in poller config. Skipping it.", v.get("view"))
+                continue
+            self.jobs.append({"view": v["view"], "planet": str(v.get("planet", "")),
+                              "interval": float(v.get("interval", INTERVAL)),
+                              "jitter": float(v.get("jitter", JITTER)),
+                              "hash": None, "snapshot": None})
+
+    def poll(self, job:dict) -> list[dict]:
+        '''
+        Polls one view once and emits its changes.
+
+        :param job:     Entry of self.jobs.
+        :type job:      dict
+        :return:        The changes emitted. Empty on the first poll, and when
+                        the page is unchanged.
+        :rtype:         list[dict]
+        '''
+        view = VIEWS[job["view"]]
+        req = {"url": view["url"], "sess": self.s}
+        if job["planet"]: req["params"] = {"activate_planet": job["planet"]}
+        r = sendRequest(req)
+
+        digest = hashlib.blake2b(r.content, digest_size=16).digest()
+        if digest == job["hash"]:
+            logger.debug("View %s unchanged (same body hash).", job["view"])
+            return []
+        job["hash"] = digest
+
+        snapshot = flatten(view["snapshot"](pageOf(r)))
+        previous, job["snapshot"] = job["snapshot"], snapshot
+        if previous is None:
+            logger.info("Recorded first snapshot of view %s.", job["view"])
+            return []
+
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        changes = [dict(time=now, view=job["view"], planet=job["planet"], **c)
+                   for c in diffSnapshots(previous, snapshot)]
+        for c in changes:
+            self.emit(c)
+        logger.info("View %s: %d changes.", job["view"], len(changes))
+        return changes
+
+    def nextDelay(self, job:dict) -> float:
+        '''
+        Returns the seconds until the next poll of a view: its interval, give
+        or take up to jitter times the interval.
+        '''
+        return max(0.0, job["interval"] * (1.0 + random.uniform(-job["jitter"], job["jitter"])))
+
+    def run(self, stop:threading.Event | None = None, polls:int | None = None) -> None:
+        '''
+        Polls the views until stopped. Views are polled one at a time, in the
+        order they fall due. Failed polls are logged and retried at the next
+        interval.
+
+        :param stop:    Set from another thread (or a signal handler) to stop.
+        :type stop:     threading.Event | None
+        :param polls:   Stop after this many polls. None to poll forever.
+        :type polls:    int | None
+        '''
+        stop = stop or threading.Event()
+        start = time.monotonic()
+        # Spread the first polls over the jitter window too.
+        due = [(start + random.uniform(0.0, j["jitter"] * j["interval"]), i)
+               for i, j in enumerate(self.jobs)]
+        heapq.heapify(due)
+        n = 0
+        while due and not stop.is_set():
+            when, i = heapq.heappop(due)
+            if stop.wait(max(0.0, when - time.monotonic())):
+                break
+            job = self.jobs[i]
+            try:
+                self.poll(job)
+            except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+                logger.exception("Error encountered while polling view %s.", job["view"])
+            n += 1
+            if polls is not None and n >= polls:
+                break
+            heapq.heappush(due, (time.monotonic() + self.nextDelay(job), i))
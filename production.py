@@ -0,0 +1,93 @@
+import logging                          # built-in Python logging
+import time                             # for the current time of projections
+from collections.abc import Iterable
+from dataclasses import astuple
+import numpy as np                      # for vectorized projections
+
+from planet import Planet, Resources    # for planet snapshots
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+def hasRates(p:Planet) -> bool:
+    '''
+    Checks whether the production rates of a planet are known, i.e. were
+    read from its page (see page.getProduction()).
+    '''
+    return any(astuple(p.production))
+
+class Projection:
+    '''
+    Projects the resources of many planets forward in time from their last
+    snapshot, without loading any page. Each planet produces at a constant
+    rate until its storage is full; stock above the storage capacity (e.g.
+    from a delivery) is kept but does not grow. All planets are projected
+    with one array operation.
+    '''
+
+    def __init__(self, planets:Iterable[Planet]) -> None:
+        '''
+        :param planets:     Planets with a resource snapshot and the production
+                            rates read from the same page, i.e. with "seen" set
+                            (see cmdPlanet.parsePlanet()).
+        :type planets:      Iterable[Planet]
+        :raises ValueError: When the rates of a planet are not known (see
+                            hasRates()).
+        '''
+        self.planets = list(planets)
+        unknown = [p.name or p.id for p in self.planets if not hasRates(p)]
+        if unknown:
+            raise ValueError(f"No production rates for {', '.join(unknown)}.")
+        n = len(self.planets)
+        # Stock at the time of the snapshot, one row per planet.
+        self.stock = np.array([astuple(p.resources) for p in self.planets], dtype=np.float64).reshape(n, 3)
+        # Production per second.
+        self.rates = np.array([astuple(p.production) for p in self.planets], dtype=np.float64).reshape(n, 3)
+        # Storage capacity. Unknown capacities (zero) do not limit production.
+        capacity = np.array([astuple(p.storage) for p in self.planets], dtype=np.float64).reshape(n, 3)
+        self.capacity = np.where(capacity > 0, capacity, np.inf)
+        # Time of the snapshot, in seconds since the epoch.
+        self.seen = np.array([p.seen for p in self.planets], dtype=np.float64)
+        logger.debug("Projecting %d planets.", n)
+
+    def __len__(self) -> int:
+        return len(self.planets)
+
+    def at(self, when:float | None = None) -> np.ndarray:
+        '''
+        Estimates the stock of every planet at a given time.
+
+        :param when:    Seconds since the epoch. None for now.
+        :type when:     float | None
+        :return:        Stock, one row per planet and one column per resource.
+        :rtype:         np.ndarray
+        '''
+        when = time.time() if when is None else when
+        elapsed = np.maximum(when - self.seen, 0.0)[:, None]
+        grown = np.minimum(self.stock + self.rates * elapsed, np.maximum(self.capacity, self.stock))
+        return np.floor(grown).astype(np.int64)
+
+    def resourcesAt(self, when:float | None = None) -> list[Resources]:
+        '''
+        Same as at(), as one Resources per planet.
+        '''
+        return [Resources(*(int(x) for x in row)) for row in self.at(when)]
+
+    def affordableAt(self, cost:Resources | np.ndarray) -> np.ndarray:
+        '''
+        Finds when each planet will have enough resources on hand for a cost,
+        e.g. the price of a building or a fleet.
+
+        :param cost:    The same cost for every planet, or one row per planet.
+        :type cost:     Resources | np.ndarray
+        :return:        Seconds since the epoch, one per planet. Planets that
+                        could already afford it at their snapshot give the
+                        time of the snapshot; planets that never will (no
+                        production, or not enough storage) give infinity.
+        :rtype:         np.ndarray
+        '''
+        cost = np.asarray(astuple(cost) if isinstance(cost, Resources) else cost, dtype=np.float64)
+        missing = np.maximum(cost - self.stock, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wait = np.where(missing > 0, missing / self.rates, 0.0)
+        wait = np.where(cost > np.maximum(self.capacity, self.stock), np.inf, wait)
+        return self.seen + wait.max(axis=1)
@@ -1,27 +1,324 @@
 import requests     # built-in REST request handling
 import logging      # built-in Python logging
+import threading    # to share rate limits between worker threads
+import time         # for rate limit timing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Callable, Iterator, Hashable
+from typing import Any
+from collections import OrderedDict # for least-recently-used cache order
+from urllib.parse import urlparse, urlencode, parse_qsl
+from requests.adapters import HTTPAdapter   # for connection pooling
+from urllib3.util import Retry, make_headers # for retries and encodings
+import harReplay    # for offline replay of recorded sessions
 
 logger = logging.getLogger(__name__)    # set module-level logger object
 
-def sendGetRequest(url:str, params:dict, s:requests.Session) -> requests.Response:
+POOL_SIZE = 10              # default connections kept alive per host
+CONNECT_TIMEOUT = 5.0       # default seconds to wait for a connection
+READ_TIMEOUT = 30.0         # default seconds to wait for a response
+RETRIES = 3                 # default retries for transient failures
+BACKOFF = 0.5               # default base of the exponential backoff, seconds
+RETRY_STATUS = (502, 503, 504)  # status codes worth retrying
+CACHE_ENTRIES = 64          # default number of pages kept in the page cache
+CACHE_TTL = {               # default seconds a page stays fresh, per view
+    "home": 30,
+    "fleet": 15,
+    "galaxy": 600,
+}
+VALIDATOR_ENTRIES = 256     # default number of pages kept for conditional GETs
+# GET requests that change server state, and so invalidate the page cache.
+INVALIDATING_PATHS = ("/login/logout",)
+
+_defaultSession: requests.Session | None = None  # used when no session is passed
+
+class PageCache:
+    '''
+    An in-memory cache of GET responses, keyed by URL and query string (and
+    so by activate_planet). Each view (home, fleet, galaxy, ...) has its own
+    time-to-live. Views without one are never cached. The cache holds a
+    bounded number of pages and drops the least recently used first. Any
+    state-changing request clears it. Safe to share between threads.
+    '''
+
+    def __init__(self, maxEntries:int = CACHE_ENTRIES, ttl:dict[str, float] | None = None) -> None:
+        self.maxEntries = maxEntries
+        # Seconds each view stays fresh.
+        self.ttl = dict(CACHE_TTL if ttl is None else ttl)
+        # Cached (expiry time, response) pairs, oldest use first.
+        self.entries: OrderedDict[str, tuple[float, requests.Response]] = OrderedDict()
+        # Bumped on every invalidation, so that a fetch that started before a
+        # state change cannot store its now-stale result afterwards.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def viewOf(url:str) -> str:
+        '''
+        Names the view of a URL after the first segment of its path, e.g.
+        "galaxy" for /galaxy/show. The site root is the "home" view.
+        '''
+        first = urlparse(url).path.strip("/").split("/")[0]
+        return first if first else "home"
+
+    @staticmethod
+    def keyOf(url:str, params:dict) -> str:
+        '''
+        Builds the cache key of a request: the URL without its query string,
+        plus all query parameters in sorted order.
+        '''
+        parts = urlparse(url)
+        query = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items())
+        return parts._replace(query=urlencode(sorted((str(k), str(v)) for k, v in query))).geturl()
+
+    def get(self, url:str, params:dict) -> requests.Response | None:
+        '''
+        Returns the cached response for a request, or None if it is missing
+        or stale.
+        '''
+        key = self.keyOf(url, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, url:str, params:dict, r:requests.Response, generation:int) -> None:
+        '''
+        Stores a response, unless its view is not cached or the cache was
+        invalidated since the request was sent.
+
+        :param generation:  Value of self.generation when the request was sent.
+        :type generation:   int
+        '''
+        ttl = self.ttl.get(self.viewOf(url), 0)
+        if ttl <= 0:
+            return
+        key = self.keyOf(url, params)
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + ttl, r)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        '''
+        Drops every cached page.
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+        logger.debug("Page cache invalidated.")
+
+class ValidatorStore:
+    '''
+    Remembers the last response of each GET request that came with an ETag
+    or Last-Modified validator, keyed like the page cache. Repeat requests
+    are sent with If-None-Match / If-Modified-Since, and when the server
+    answers 304 Not Modified, the stored response (and so the page already
+    parsed from it, see page.pageOf) is used instead of a new download. Holds
+    a bounded number of responses and drops the least recently used first.
+    Safe to share between threads.
+    '''
+
+    def __init__(self, maxEntries:int = VALIDATOR_ENTRIES) -> None:
+        self.maxEntries = maxEntries
+        # Last validated response of each request, oldest use first.
+        self.entries: OrderedDict[str, requests.Response] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, url:str, params:dict) -> requests.Response | None:
+        '''
+        Returns the stored response for a request, or None if there is none.
+        '''
+        key = PageCache.keyOf(url, params)
+        with self.lock:
+            r = self.entries.get(key)
+            if r is not None:
+                self.entries.move_to_end(key)
+            return r
+
+    @staticmethod
+    def headersFor(r:requests.Response) -> dict[str, str]:
+        '''
+        Builds the conditional request headers for a stored response.
+        '''
+        hdrs = {}
+        if "ETag" in r.headers:
+            hdrs["If-None-Match"] = r.headers["ETag"]
+        if "Last-Modified" in r.headers:
+            hdrs["If-Modified-Since"] = r.headers["Last-Modified"]
+        return hdrs
+
+    def put(self, url:str, params:dict, r:requests.Response) -> None:
+        '''
+        Stores a complete (200) response, if it carries a validator.
+        '''
+        if r.status_code != 200 or not self.headersFor(r):
+            return
+        key = PageCache.keyOf(url, params)
+        with self.lock:
+            self.entries[key] = r
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+class TransportAdapter(HTTPAdapter):
+    '''
+    An HTTPAdapter that applies a default timeout to every request sent
+    through it, since requests itself never times out by default.
+    '''
+
+    def __init__(self, timeout:tuple[float, float], **kwargs) -> None:
+        # (connect, read) timeout used when the caller does not give one.
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs) -> requests.Response:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+def newSession(cfg:dict | None = None) -> requests.Session:
+    '''
+    Creates a session with a pooled, keep-alive transport. Transient failures
+    (connection errors, timeouts and 502/503/504 responses) are retried with
+    jittered exponential backoff. Only GET and HEAD are retried after the
+    request reached the server, so a POST is never sent twice.
+
+    :param cfg: The "rest" section of the application config. Recognises
+                "poolSize", "connectTimeout", "readTimeout", "retries" and
+                "backoff". Missing values fall back to module defaults. If
+                "replay" is enabled, requests are answered from HAR files
+                instead of the network (see harReplay.mountReplay). If
+                "cache" is enabled, GET responses are kept in a PageCache
+                with its "maxEntries" and per-view "ttl" settings. If
+                "conditional" is enabled, GET validators are kept in a
+                ValidatorStore with its "maxEntries" setting.
+    :type cfg:  dict | None
+    :return:    New session object.
+    :rtype:     requests.Session
+    '''
+
+    if cfg is None: cfg = {}
+    poolSize = int(cfg.get("poolSize", POOL_SIZE))
+    timeout = (float(cfg.get("connectTimeout", CONNECT_TIMEOUT)),
+               float(cfg.get("readTimeout", READ_TIMEOUT)))
+    retries = Retry(
+        total=int(cfg.get("retries", RETRIES)),
+        backoff_factor=float(cfg.get("backoff", BACKOFF)),
+        backoff_jitter=float(cfg.get("backoff", BACKOFF)),
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,  # Hand the last response to raise_for_status().
+    )
+    adapter = TransportAdapter(timeout, pool_connections=poolSize,
+                               pool_maxsize=poolSize, max_retries=retries)
+
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    # Only advertise the encodings urllib3 can actually decode here (brotli
+    # is optional), so a "br" response is never handed back undecoded.
+    s.headers.update(make_headers(keep_alive=True, accept_encoding=True))
+    replay = cfg.get("replay", {})
+    if replay.get("enabled", False):
+        harReplay.mountReplay(s, replay)
+    cache = cfg.get("cache", {})
+    if cache.get("enabled", False):
+        s.pageCache = PageCache(int(cache.get("maxEntries", CACHE_ENTRIES)),    #type: ignore
+                                cache.get("ttl"))
+    conditional = cfg.get("conditional", {})
+    if conditional.get("enabled", False):
+        s.validators = ValidatorStore(int(conditional.get("maxEntries", VALIDATOR_ENTRIES)))   #type: ignore
+    logger.debug("Created session with pool size %d, timeout %s and %d retries.",
+                 poolSize, timeout, retries.total)
+    return s
+
+def defaultSession() -> requests.Session:
+    '''
+    Returns the shared session used for requests made without one, creating
+    it with default transport settings on first use.
+
+    :return:    The module's default session object.
+    :rtype:     requests.Session
+    '''
+    global _defaultSession
+    if _defaultSession is None:
+        _defaultSession = newSession()
+    return _defaultSession
+
+class RateLimiter:
+    '''
+    Spaces out requests so that no more than a set number per second are sent
+    to any one host. Safe to share between threads.
+    '''
+
+    def __init__(self, perSecond:float) -> None:
+        # Minimum number of seconds between two requests to the same host.
+        self.interval = 1.0 / perSecond if perSecond > 0 else 0.0
+        # Earliest time the next request to each host may be sent.
+        self.nextSlot: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url:str) -> None:
+        '''
+        Blocks until a request to the host of the given URL is allowed.
+
+        :param url: URL of the request about to be sent.
+        :type url:  str
+        '''
+        if self.interval == 0.0 and not self.nextSlot: return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.nextSlot.get(host, now))
+            self.nextSlot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def backOff(self, url:str, seconds:float) -> None:
+        '''
+        Holds back every request to the host of the given URL for a number of
+        seconds, e.g. as asked by a server's Retry-After header.
+
+        :param url:     URL of the request that was turned away.
+        :type url:      str
+        :param seconds: Seconds to wait before the next request to the host.
+        :type seconds:  float
+        '''
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            self.nextSlot[host] = max(self.nextSlot.get(host, now), now + seconds)
+
+def sendGetRequest(url:str, params:dict, hdrs:dict, s:requests.Session,
+                   stream:bool = False, redirects:bool = True) -> requests.Response:
     '''
     Sends a GET request to the specified URL and returns response object.
     If URL is invalid, or request is unsuccessful, an an error is raised.
 
     Args:
         url (str): location to send the GET request
-        params (dict, optional): headers to send with the request
+        params (dict): query string parameters to send with the request
+        hdrs (dict): header information to include in the request
         s (requests.Session, optional): Session object to manage headers
+        stream (bool, optional): if True, the body is not read until asked for
+        redirects (bool, optional): if False, redirects are returned as they
+                                    are instead of being followed
 
     Returns:
         requests.response: HTML response object
     '''
     if not url: raise ValueError("URL cannot be empty.")
     try:
-        if not s:
-            r = requests.get(url, params=params)
-        else:
-            r = s.get(url, params=params)
+        if not s: s = defaultSession()
+        r = s.get(url, params=params, headers=hdrs, stream=stream, allow_redirects=redirects)
         r.raise_for_status() # Raise exception for 4xx and 5xx status codes.
         return r
     except:
@@ -43,10 +340,8 @@ def sendPostRequest(url:str, body:dict, hdrs:dict, s:requests.Session) -> reques
     '''
     if not url: raise ValueError("URL cannot by empty.")
     try:
-        if not s:
-            r = requests.post(url, data=body, headers=hdrs)
-        else:
-            r = s.post(url, data=body, headers=hdrs)
+        if not s: s = defaultSession()
+        r = s.post(url, data=body, headers=hdrs)
         r.raise_for_status() # Raise exception for 4xx and 5xx status codes.
         return r
     except:
@@ -58,14 +353,28 @@ def sendRequest(req:dict) -> requests.Response:
     function should be called. Checks first that request dictionary is properly
     formed. Any errors raised by REST functions are passed to caller.
 
+    If the session has a page cache, fresh cached pages are returned without a
+    request, and POST requests (or state-changing GETs, like logout) clear it.
+    If the session has a validator store, GET requests for pages seen before
+    are sent as conditional requests, and a 304 answer returns the stored
+    response.
+
     Args:
         req (dict): dictionary containing the following keys:
             url (str): the URL of the request target
             sess (requests.Session): the current requests session object
             hdr (dict): dictionary containing the request headers. If missing,
                         an empty dictionary will be created for it.
+            params (dict, opt): dictionary containing the query string
+                                parameters of a GET request
             body (dict, opt): dictionary containing the request body, optional
                               if making a GET request
+            stream (bool, opt): if True, the body of a GET response is not read
+                                until asked for. Streamed responses are not
+                                cached.
+            redirects (bool, opt): if False, a GET redirect is returned as it
+                                   is instead of being followed. Such
+                                   responses are not cached.
 
     Returns:
         requests.Response: HTML response object
@@ -80,14 +389,129 @@ def sendRequest(req:dict) -> requests.Response:
     # Prepare empty header dictionary, if missing.
     if not "hdr" in req:
         req["hdr"] = {}
+    if not "params" in req:
+        req["params"] = {}
+
+    cache = getattr(req["sess"], "pageCache", None)
+    changesState = "body" in req or urlparse(req["url"]).path in INVALIDATING_PATHS
+    cacheable = not changesState and not req.get("stream") and req.get("redirects", True)
+    method = "POST" if "body" in req else "GET"
+    start = time.perf_counter()
+
+    # Serve fresh pages from the cache.
+    if cache is not None and cacheable:
+        r = cache.get(req["url"], req["params"])
+        if r is not None:
+            logger.debug("Page cache hit for %s.", req["url"])
+            logRequest(method, req["url"], r, start, True)
+            return r
+    generation = cache.generation if cache is not None else 0
+
+    # Revalidate pages seen before instead of downloading them again.
+    validators = getattr(req["sess"], "validators", None) if cacheable else None
+    stored = validators.get(req["url"], req["params"]) if validators is not None else None
+    hdrs = req["hdr"]
+    if stored is not None:
+        hdrs = dict(hdrs, **ValidatorStore.headersFor(stored))
 
     # Detect appropriate request function and make call. Propogate any errors to caller.
+    r = None
     try:
         if not "body" in req:
-            r = sendGetRequest(req["url"], req["hdr"], req["sess"])
+            r = sendGetRequest(req["url"], req["params"], hdrs, req["sess"],
+                               req.get("stream", False), req.get("redirects", True))
         else:
             r = sendPostRequest(req["url"], req["body"], req["hdr"], req["sess"])
-    except:
+    except requests.exceptions.HTTPError as e:
+        r = e.response      # so that 4xx/5xx failures are logged with their status
         raise
+    finally:
+        logRequest(method, req["url"], r, start, False, bool(req.get("stream")))
+        # Even a failed state change may have reached the server.
+        if changesState:
+            req["sess"].stateChanges = getattr(req["sess"], "stateChanges", 0) + 1
+            if cache is not None:
+                cache.invalidate()
+
+    if validators is not None:
+        if r.status_code == 304 and stored is not None:
+            logger.debug("Not modified: reusing stored page for %s.", req["url"])
+            r = stored
+        else:
+            validators.put(req["url"], req["params"], r)
 
-    return r
\ No newline at end of file
+    if cache is not None and cacheable:
+        cache.put(req["url"], req["params"], r, generation)
+
+    return r
+
+def logRequest(method:str, url:str, r:requests.Response | None, start:float,
+               cacheHit:bool, streamed:bool = False) -> None:
+    '''
+    Logs one timing record for a request. The record carries its fields in a
+    "fields" attribute, which plogger's JSON formatter writes as separate keys.
+
+    Args:
+        method (str): HTTP method of the request
+        url (str): the URL of the request, without query string parameters
+        r (requests.Response | None): the response, or None if the request
+                                      failed without one
+        start (float): time.perf_counter() value when the request was started
+        cacheHit (bool): whether the response came from the page cache
+        streamed (bool): whether the body is still unread, in which case the
+                         Content-Length header is logged as its size
+    '''
+
+    elapsed = (time.perf_counter() - start) * 1000.0
+    status = r.status_code if r is not None else None
+    if r is None:
+        size = 0
+    elif streamed:  # reading the body here would defeat streaming
+        size = int(r.headers.get("Content-Length", 0))
+    else:
+        size = len(r.content)
+    logger.info("%s %s %s %d bytes in %.1f ms%s.", method, url, status, size, elapsed,
+                " (cached)" if cacheHit else "",
+                extra={"fields": {"url": url, "endpoint": urlparse(url).path or "/",
+                                  "method": method, "status": status, "bytes": size,
+                                  "elapsed_ms": round(elapsed, 3), "cache_hit": cacheHit}})
+
+def fetchConcurrently(s:requests.Session, reqs:dict[Hashable, dict],
+                      parse:Callable[[Any, requests.Response], Any], workers:int,
+                      limiter:RateLimiter | None = None) -> Iterator[tuple[Hashable, Any]]:
+    '''
+    Sends a batch of GET requests through a bounded pool of worker threads
+    that all share one session (and so its cookies, connection pool and page
+    cache). Each response is parsed on the worker that fetched it, and the
+    results are yielded as each one finishes. Requests that fail are logged
+    and skipped. If the caller stops early, queued requests are dropped.
+
+    Args:
+        s (requests.Session): the session to send every request with
+        reqs (dict): request dictionaries, as for sendRequest() but without
+                     "sess", keyed by anything that identifies them
+        parse (Callable): turns a key and its response into the value to
+                          yield
+        workers (int): maximum number of requests in flight at once
+        limiter (RateLimiter, optional): spaces out the requests
+
+    Returns:
+        Iterator: (key, parsed value) tuples in completion order
+    '''
+
+    def fetch(key:Hashable, req:dict) -> Any:
+        if limiter is not None: limiter.wait(req["url"])
+        return parse(key, sendRequest(dict(req, sess=s)))
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fetch")
+    try:
+        futures = {pool.submit(fetch, key, req): key for key, req in reqs.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result()
+            except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+                logger.exception("Error encountered while fetching %s.", key)
+    finally:
+        # Drop queued requests if the caller stops early (e.g. Ctrl+C).
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,86 @@
+import json                             # for the session file format
+import logging                          # built-in Python logging
+import os                               # for file permissions and renames
+import time                             # to drop expired cookies
+import requests                         # for the session and cookie types
+from requests.cookies import create_cookie
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+SESSION_PATH = "session.json"   # default location of the saved session
+FILE_MODE = 0o600               # the saved session is readable by its owner only
+
+def saveSession(s:requests.Session, username:str, path:str = SESSION_PATH) -> None:
+    '''
+    Saves the cookies of a session, and the name of the logged-in player, so
+    that the next start can resume the session without logging in again. The
+    file is created readable and writable by its owner only, and replaced in
+    one step, so a crash never leaves half a session behind.
+
+    :param s:           Logged-in session.
+    :type s:            requests.Session
+    :param username:    Name of the logged-in player, for the prompt.
+    :type username:     str
+    :param path:        File to save the session in.
+    :type path:         str
+    '''
+    cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+                "expires": c.expires, "secure": c.secure,
+                "httpOnly": c.has_nonstandard_attr("HttpOnly")} for c in s.cookies]
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, FILE_MODE)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({"username": username, "saved": time.time(), "cookies": cookies}, f)
+    os.chmod(tmp, FILE_MODE)    # in case the file was left over with other permissions
+    os.replace(tmp, path)
+    logger.info("Saved %d session cookies to '%s'.", len(cookies), path)
+
+def loadSession(s:requests.Session, path:str = SESSION_PATH) -> str | None:
+    '''
+    Restores the cookies saved by saveSession() into a session. Cookies that
+    have expired are left out. Whether the server still accepts the session
+    is not checked here.
+
+    :param s:       Session to restore the cookies into.
+    :type s:        requests.Session
+    :param path:    File the session was saved in.
+    :type path:     str
+    :return:        Name of the player the session belongs to, or None if
+                    there is no saved session or none of its cookies are left.
+    :rtype:         str | None
+    '''
+    try:
+        with open(path, 'r') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Could not read saved session '%s'. Ignoring it.", path)
+        return None
+
+    if os.stat(path).st_mode & 0o077:
+        logger.warning("Saved session '%s' can be read by other users. Restricting it.", path)
+        os.chmod(path, FILE_MODE)
+
+    now = time.time()
+    n = 0
+    for c in saved.get("cookies", []):
+        if c.get("expires") is not None and c["expires"] <= now:
+            continue
+        rest = {"HttpOnly": None} if c.get("httpOnly") else {}
+        s.cookies.set_cookie(create_cookie(c["name"], c["value"], domain=c["domain"],
+                                           path=c["path"], expires=c.get("expires"),
+                                           secure=c.get("secure", False), rest=rest))
+        n += 1
+    logger.info("Restored %d session cookies from '%s'.", n, path)
+    return saved.get("username", "") if n > 0 else None
+
+def removeSession(path:str = SESSION_PATH) -> None:
+    '''
+    Deletes the saved session, e.g. after logging out.
+    '''
+    try:
+        os.remove(path)
+        logger.info("Removed saved session '%s'.", path)
+    except FileNotFoundError:
+        pass
@@ -1,21 +1,35 @@
 #!/usr/bin/env python3
 
 import os                           # for file system and terminal commands
-import requests                     # for REST requests
-from bs4 import BeautifulSoup       # HTML parser
-import re                           # for regular expression processing
-import textwrap                     # to make text in terminal look pretty
-import shutil                       # to get information about terminal
 import logging                      # built-in Python logging
 import json                         # for config file parsing
+import sys                          # for command line arguments and output
+import threading                    # to fetch the welcome page in the background
+from dataclasses import dataclass   # for the state shared between commands
+from typing import Any
 
 import plogger                          # for logging with fallback config
-from restRequests import sendRequest    # for standardized REST functionality
-from cmdLogin import login, logout      # for login and logout commands
-from cmdPlanet import planet            # for accessing planet functions
+
+# Command modules pull in requests and the HTML parsers, which take most of
+# the start-up time. They are imported when a command first needs them.
 
 logger = logging.getLogger(__name__)
 
+WELCOME_URL = "https://playstarfleet.com/login"
+WELCOME_MODE = "background" # default: "background", "sync" or "off"
+WELCOME_CACHE = "welcome.txt"   # default file of the last welcome text seen
+
+SESSION_PATH = "session.json"   # default file of the saved session
+
+# Commands that change the shared state. In script mode they run on their
+# own, in order; the lines between them may run concurrently.
+STATEFUL_COMMANDS = ("login", "exit", "quit", "logout", "dispatch")
+COMMANDS = STATEFUL_COMMANDS + ("help", "planet", "planets", "galaxy")
+
+_session = None                 # shared REST session, created on first use
+_sessionLock = threading.Lock()
+_pageLock = threading.Lock()    # so that concurrent script lines load the home page once
+
 class FCOLOR:
     # https://gist.github.com/fnky/458719343aabd01cfb17a3a4f7296797
     BLACK = "\033[30m"
@@ -35,94 +49,433 @@ class FCOLOR:
     BLINKING = "\033[5m"
     STRIKETHROUGH = "\033[9m"
 
+@dataclass
+class State:
+    username: str = ""      # blank until login
+    path: str = "~"         # userhome until login
+    page: Any = None        # most recent in-game page, parsed once and shared
+    go: bool = True         # set to False by exit, quit and logout
+
 def main():
-    clearConsole()
+    import argparse                 # for command line options
+    ap = argparse.ArgumentParser(description="Starfleet Commander terminal interface.")
+    ap.add_argument("--script", metavar="FILE",
+                    help="run the commands in FILE, one per line, print one JSON result "
+                         "per line and exit. Use '-' to read standard input.")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="in script mode, how many independent lines may run at once")
+    ap.add_argument("--daemon", action="store_true",
+                    help="poll the views set under \"daemon\" in sfc.cfg and print each "
+                         "change as a JSON line, until interrupted. Needs a saved session.")
+    args = ap.parse_args()
+
+    if args.script is None and not args.daemon: clearConsole()
     cfg = loadConfig()  # Get config from file.
 
     # Configure the logger.
     plogger.config_root_logger(cfg["plogger"])
     logger.info("Application started.")
 
-    # Start session and get login page.
-    s = requests.Session()
-    url = "https://playstarfleet.com/login"
-    try:
-        logger.info("Trying to connect to SFC...")
-        r = sendRequest({"url": url, "sess":s})
-    except requests.exceptions.HTTPError:
-        logger.exception("HTTP error encountered while trying to connect to SFC login page.")
-        print("An error occurred while trying to connect to SFC. The application will now exit.")
-        exit()
-    except requests.RequestException:
-        logger.exception("Request exception encountered while trying to connect to SFC login page.")
-        print("An error occurred while trying to connect to SFC. The application will now exit.")
-        exit()
-    except ValueError:
-        logger.exception("ValueError experienced while trying to connect to SFC loging page.")
-        print("An error occurred while trying to connect to SFC. The application will now exit.")
-        exit()
-    logger.info("Successfully connected to SFC server.")
+    state = State()
+    if args.script is not None:
+        resumeSession(state, cfg)
+        try:
+            if args.script == "-":
+                ok = runScript(sys.stdin.read().splitlines(), state, cfg, args.jobs)
+            else:
+                with open(args.script, 'r') as f:
+                    ok = runScript(f.read().splitlines(), state, cfg, args.jobs)
+        except OSError as e:
+            print(f"Error while reading script: {e}", file=sys.stderr)
+            ok = False
+        if state.go:    # End of script: quit, as the interactive loop would.
+            dispatch(buildCommandDict("quit"), state, cfg)
+        logger.info("Exiting application.")
+        exit(0 if ok else 1)
+
+    if args.daemon:
+        exit(runDaemon(state, cfg))
 
     # Start terminal interface.
-    print(getWelcomeMessage(r.content.decode()))
+    startWelcome(cfg)
     print()
     print(f"   {FCOLOR.BOLD}STARFLEET COMMANDER - Terminal Interface{FCOLOR.RESET}")
     print("==============================================")
-    username = "" # blank until login
-    path = "~"    # userhome until login
-    go = True     # to start, but ensure this is set to false to break loop!
-    while go:
-        prompt = getPrompt(username, path)
+    resumeSession(state, cfg)
+    while state.go:
+        prompt = getPrompt(state.username, state.path)
         c = input(prompt)
         if c.upper() == c:  # Catch users who like to yell.
             print("Please turn off your caps lock and try again.")
             logger.debug("User has caps lock turned on.")
         cmdDict = buildCommandDict(c)
         logger.debug("User entered command '%s' that was parsed to '%s'.", c, cmdDict)
-        match cmdDict["cmd"]:
-            case "login":
-                rtnStr = login(cmdDict, s)
-                if len(rtnStr) > 0:
-                    username = getUsername(rtnStr)
-                    path = getPath(rtnStr)
-            case "exit" | "quit" | "logout":
-                logout(s)
-                go = False
-            case "help":
-                cmdHelp()
-            case "planet" | "planets":
-                planet(cmdDict["cmd"], s)
-            case _:
-                print(f"Command '{cmdDict['cmd']}' not found. See 'help' for a list of available commands.")
+        dispatch(cmdDict, state, cfg)
 
     print("Thank you for playing. Goodbye!")
     logger.info("Exiting application.")
     exit()
 
-def clearConsole():
-    if os.name == "nt":     # for Windows
-        os.system("cls")
-    else:                   # for Linux/Mac
-        os.system("clear")
+def runDaemon(state:State, cfg:dict) -> int:
+    '''
+    Polls the views configured under the "daemon" key until interrupted
+    (Ctrl+C or SIGTERM), printing each change as a JSON line. The saved
+    session is resumed first; without one there is nothing to poll.
+
+    Args:
+        state (State): the state shared between commands.
+        cfg (dict): the full application config.
+    Returns:
+        int: the exit status.
+    '''
 
-def getWelcomeMessage(htm:str) -> str:
+    import signal                       # to stop cleanly on SIGTERM
+    from poller import Poller           # for scheduled polling
+    resumeSession(state, cfg)
+    if not state.username:
+        print("Daemon mode needs a saved session. Enable \"persist\" under \"session\" "
+              "in sfc.cfg, then log in once interactively.", file=sys.stderr)
+        return 1
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    logger.info("Starting daemon mode.")
+    try:
+        Poller(getSession(cfg), cfg["daemon"].get("views", [])).run(stop)
+    except KeyboardInterrupt:
+        pass
+    dispatch(buildCommandDict("quit"), state, cfg)
+    logger.info("Exiting application.")
+    return 0
+
+def resumeSession(state:State, cfg:dict):
     '''
-    Uses BeautifulSoup to extract the welcome message from the login page and
-    returns a formatted string.
+    Resumes the session saved by the last run, if enabled in the config.
 
     Args:
-        htm (bytes): the requests.response object content containing html
+        state (State): the state shared between commands.
+        cfg (dict): the full application config.
+    '''
 
+    if cfg["session"].get("persist", False):
+        from cmdLogin import resume
+        resumed = resume(getSession(cfg), cfg["session"].get("path", SESSION_PATH))
+        if resumed is not None:
+            state.username, state.path = resumed
+            print(f"Welcome back, {state.username}. Your saved session was resumed.")
+
+def dispatch(cmdDict:dict, state:State, cfg:dict) -> Any:
+    '''
+    Runs one command. Shared by the interactive loop and script mode.
+
+    Args:
+        cmdDict (dict): the command, as built by buildCommandDict().
+        state (State): the state shared between commands. Updated by login,
+                       logout and the other commands that change it.
+        cfg (dict): the full application config.
     Returns:
-        str: string containing a formatted version of the welcome message
+        Any: what the command returned, e.g. the planets of "planets", or
+             whether "login" succeeded. True for commands that only print.
+             None or False if the command failed.
     '''
-    soup = BeautifulSoup(htm, "html.parser")
-    lc = soup.find(id="leftColumn")
-    s = lc.find("h1").get_text().strip() + "\n"                    #type: ignore
-    s = s + lc.find("p").get_text().strip() + "\n"                 #type: ignore
-    for item in lc.find_all("li"):                                 #type: ignore
-        s = s + "• " + re.sub(r"\s{2,}", "", item.get_text().strip()) + "\n"
-    return s
+
+    persist = cfg["session"].get("persist", False)
+    sessionPath = cfg["session"].get("path", SESSION_PATH)
+    match cmdDict["cmd"]:
+        case "login":
+            from cmdLogin import login
+            loginPage = login(cmdDict, getSession(cfg))
+            if loginPage is not None:
+                state.page = loginPage
+                state.username = loginPage.username
+                state.path = loginPage.path
+                if persist: saveSession(state.username, sessionPath)
+            return loginPage is not None
+        case "exit" | "quit" | "logout":
+            if _session is None:    # nothing to log out of
+                pass
+            elif persist and state.username and cmdDict["cmd"] != "logout":
+                # Stay logged in, so the next start can resume the session.
+                saveSession(state.username, sessionPath)
+            else:
+                from cmdLogin import logout
+                logout(_session)
+                if persist:
+                    from sessionStore import removeSession
+                    removeSession(sessionPath)
+            state.go = False
+            return True
+        case "help":
+            cmdHelp()
+            return True
+        case "planet" | "planets":
+            from cmdPlanet import planet
+            return planet(cmdDict, getSession(cfg), currentPage(state, cfg), cfg["planets"])
+        case "galaxy":
+            from cmdGalaxy import galaxy
+            return galaxy(cmdDict, getSession(cfg), cfg["galaxy"])
+        case "dispatch":
+            from cmdDispatch import dispatch
+            return dispatch(cmdDict, getSession(cfg), currentPage(state, cfg), cfg["dispatch"])
+        case _:
+            print(f"Command '{cmdDict['cmd']}' not found. See 'help' for a list of available commands.")
+    return None
+
+def currentPage(state:State, cfg:dict) -> Any:
+    '''
+    Returns the most recent in-game page, loading the home page first after a
+    resumed session. Safe to call from several threads: the page is only
+    loaded once.
+
+    Args:
+        state (State): the state shared between commands.
+        cfg (dict): the full application config.
+    Returns:
+        ParsedPage | None: the page, or None before login.
+    '''
+
+    with _pageLock:
+        if state.page is None and state.username:     # resumed session
+            from cmdLogin import loadHome
+            state.page = loadHome(getSession(cfg))
+        return state.page
+
+def runScript(lines:list[str], state:State, cfg:dict, jobs:int = 1) -> bool:
+    '''
+    Runs a script of commands, one per line, with one session and page cache
+    for the whole script. Blank lines and lines starting with "#" are skipped.
+    Lines with commands that change state (login, logout, quit) run on their
+    own, in order. With jobs > 1, the lines between them run concurrently.
+
+    For each line, one JSON object is printed, in script order, with the line
+    number, command, "ok", the command's result, everything it printed and
+    how long it took. A line is not ok if it raised an error, if its command
+    is unknown, or if the command failed (returned None or False, e.g. a
+    failed login or a page that could not be loaded).
+
+    Args:
+        lines (list[str]): the lines of the script.
+        state (State): the state shared between commands.
+        cfg (dict): the full application config.
+        jobs (int): how many independent lines may run at once.
+    Returns:
+        bool: True if every line ran without an error.
+    '''
+
+    import json                         # for machine-readable output
+    import time                         # for per-line timings
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Batches of lines that may run together: each stateful line on its own,
+    # and the runs of other lines between them.
+    batches: list[list[tuple[int, str]]] = []
+    lastStateful = True
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        stateful = buildCommandDict(line)["cmd"] in STATEFUL_COMMANDS
+        if stateful or lastStateful:
+            batches.append([])
+        batches[-1].append((n, line))
+        lastStateful = stateful
+
+    def run(n:int, line:str) -> dict:
+        out = ThreadOutput.capture()
+        start = time.perf_counter()
+        result = {"line": n, "command": line, "ok": True}
+        try:
+            cmdDict = buildCommandDict(line)
+            result["result"] = dispatch(cmdDict, state, cfg)
+            if cmdDict["cmd"] not in COMMANDS:
+                result["ok"] = False
+                result["error"] = f"Unknown command '{cmdDict['cmd']}'."
+            elif result["result"] is None or result["result"] is False:
+                result["ok"] = False
+                result["error"] = f"Command '{cmdDict['cmd']}' failed."
+        except Exception as e:
+            logger.exception("Error encountered while running script line %d: %s", n, line)
+            result["ok"] = False
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            result["output"] = ThreadOutput.release(out)
+            result["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+        return result
+
+    ok = True
+    stdout = sys.stdout
+    sys.stdout = ThreadOutput(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="script") as pool:
+            for batch in batches:
+                if not state.go:
+                    break
+                for result in pool.map(lambda x: run(*x), batch):
+                    ok = ok and result["ok"]
+                    print(json.dumps(result, default=toJson), file=stdout, flush=True)
+    finally:
+        sys.stdout = stdout
+    return ok
+
+class ThreadOutput:
+    '''
+    Stands in for sys.stdout in script mode, so that what each command prints
+    can be collected per thread, even while several commands run at once.
+    Output from threads that are not collecting goes to the real stream.
+    '''
+
+    local = threading.local()
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    @classmethod
+    def capture(cls):
+        import io                       # for in-memory text buffers
+        cls.local.buffer = io.StringIO()
+        return cls.local.buffer
+
+    @classmethod
+    def release(cls, buffer) -> str:
+        cls.local.buffer = None
+        return buffer.getvalue()
+
+    def write(self, s:str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.stream).write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name:str):
+        return getattr(self.stream, name)
+
+def toJson(obj:Any) -> Any:
+    '''
+    Converts command results that json cannot handle on its own: dataclasses
+    and plain objects (like planet.Planet) become dictionaries of their fields.
+    '''
+
+    from dataclasses import is_dataclass, asdict
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return str(obj)
+
+def getSession(cfg:dict):
+    '''
+    Returns the shared REST session, creating it (and importing requests and
+    the HTML parsers) on first use. Safe to call from several threads.
+
+    Args:
+        cfg (dict): the full application config.
+    Returns:
+        requests.Session: the shared session.
+    '''
+
+    global _session
+    with _sessionLock:
+        if _session is None:
+            import parsers                      # for HTML parser backend selection
+            from restRequests import newSession # for standardized REST functionality
+            parsers.setBackend(cfg["parser"].get("backend"))
+            _session = newSession(cfg["rest"])
+        return _session
+
+def saveSession(username:str, path:str):
+    '''
+    Saves the cookies of the shared session for the next start. Failures are
+    only logged, since the session itself is unaffected.
+
+    Args:
+        username (str): name of the logged-in player.
+        path (str): file to save the session in.
+    '''
+
+    from sessionStore import saveSession as save    # pulls in requests
+    try:
+        save(_session, username, path)  #type: ignore
+    except OSError:
+        logger.exception("Could not save the session to '%s'.", path)
+        print("Your session could not be saved. You will need to log in again next time.")
+
+def startWelcome(cfg:dict):
+    '''
+    Shows the welcome message of the login page. By default, the copy saved
+    by the last run is printed at once, and the login page is fetched in the
+    background to refresh that copy (and warm up the connection) for next
+    time. With "mode" set to "sync" under the "welcome" config key, the page
+    is fetched before the prompt appears, and the application exits if SFC
+    cannot be reached. With "off", nothing is fetched.
+
+    Args:
+        cfg (dict): the full application config.
+    '''
+
+    mode = cfg["welcome"].get("mode", WELCOME_MODE)
+    cachePath = cfg["welcome"].get("cachePath", WELCOME_CACHE)
+    match mode:
+        case "sync":
+            import requests                 # for REST request errors
+            try:
+                print(fetchWelcome(cfg, cachePath))
+            except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+                logger.exception("Error encountered while trying to connect to SFC login page.")
+                print("An error occurred while trying to connect to SFC. The application will now exit.")
+                exit()
+        case "background":
+            try:
+                with open(cachePath, 'r') as f:
+                    print(f.read())
+            except OSError:
+                logger.info("No saved welcome message at '%s'.", cachePath)
+            threading.Thread(target=fetchWelcome, args=(cfg, cachePath, True),
+                             name="welcome", daemon=True).start()
+        case "off":
+            pass
+        case _:
+            print(f"Unknown welcome mode '{mode}' in config. Skipping the welcome message.")
+            logger.warning("Unknown welcome mode '%s' in config.", mode)
+
+def fetchWelcome(cfg:dict, cachePath:str, quiet:bool = False) -> str:
+    '''
+    Fetches the login page, extracts its welcome message and saves a copy of
+    it for the next start.
+
+    Args:
+        cfg (dict): the full application config.
+        cachePath (str): file to save the welcome message in.
+        quiet (bool): if True, errors are logged instead of raised, as is
+                      needed on a background thread.
+    Returns:
+        str: the welcome message, or an empty string if quiet and it failed.
+    '''
+
+    import requests                         # for REST request errors
+    from restRequests import sendRequest    # for standardized REST functionality
+    from page import ParsedPage             # for parsing server responses
+    try:
+        logger.info("Trying to connect to SFC...")
+        r = sendRequest({"url": WELCOME_URL, "sess": getSession(cfg)})
+        logger.info("Successfully connected to SFC server.")
+        welcome = ParsedPage(r.content.decode()).welcome
+    except (requests.exceptions.HTTPError, requests.RequestException, ValueError):
+        if not quiet: raise
+        logger.exception("Error encountered while fetching the welcome message.")
+        return ""
+    try:
+        with open(cachePath, 'w') as f:
+            f.write(welcome)
+    except OSError:
+        logger.warning("Could not save the welcome message to '%s'.", cachePath)
+    return welcome
+
+def clearConsole():
+    if os.name == "nt":     # for Windows
+        os.system("cls")
+    else:                   # for Linux/Mac; escape codes save starting a shell
+        print("\033[H\033[2J\033[3J", end="", flush=True)
 
 def getMainMenu() -> str:
     s = "=========================\n"
@@ -136,6 +489,8 @@ def getMainMenu() -> str:
     return s
 
 def cmdHelp():
+    import textwrap                 # to make text in terminal look pretty
+    import shutil                   # to get information about terminal
     s = []
     w = shutil.get_terminal_size().columns
     t = "Starfleet Commander Terminal Mode functions in much the same way " \
@@ -158,7 +513,7 @@ def cmdHelp():
      "the command followed by \"--help\" or \"-h\"."
     s.append(textwrap.fill(t, w))
 
-    t = "Currently supported commands are: login, planet, help, quit"
+    t = "Currently supported commands are: login, planet, galaxy, dispatch, help, quit"
     s.append(textwrap.fill(t, w))
     
     for l in s:
@@ -220,80 +575,6 @@ def getPrompt(username:str, path:str) -> str:
     # "{FCOLOR.BOLD}{FCOLOR.GREEN}sfc{FCOLOR.DEFAULT}:{FCOLOR.BLUE}~{FCOLOR.DEFAULT}${FCOLOR.RESET} "
     return prompt
 
-def getUsername(htm:str) -> str:
-    '''
-    Finds and returns the username from the passed HTML string. This function
-    expects the HTML string to be the REST response containing the "home" page
-    of a planet. Function uses BeautifulSoup to make the HTML parsing easier.
-
-    Args:
-        htm (str): HTML string containing a planet's "home" page. Passing a
-                   different page will cause an error or undefined behaviour.
-    
-    Returns:
-        str: The username string. If the username isn't found, an empty string
-             is returned.
-    '''
-    uname = ""
-    soup = BeautifulSoup(htm, "html.parser")
-    # Find the div elements with class "right_column". There should be only one.
-    div = soup.find_all('div', class_='right_column')
-    if not div is None: # Check that the div was found.
-        a = div[0].find_all('a') # We want the first (and only) div.
-        if not a is None: # Again, check that an anchor was found.
-            uname = a[0].get_text() # We're looking for the first anchor.
-    return uname
-
-def getPath(htm:str) -> str:
-    '''
-    Finds and returns the path from the passed HTML string. Function uses
-    BeautifulSoup to make the HTML parsing easier.
-
-    Args:
-        htm (str): HTML string. This can be any HTML page from SFC, except the
-                   site homepage.
-
-    Returns:
-        str: The path string. If the path isn't found, an empty string is
-             returned.
-    '''
-    path = ""
-    soup = BeautifulSoup(htm, "html.parser")
-    titleElem = soup.title
-    if titleElem:       # Check that the title element exists.
-        titleStr = titleElem.string
-        if titleStr:    # Check that the title actually contains text.
-            logger.debug("Title received from server: \"%s\"", titleStr.replace("\n", "\\n"))
-            titles = titleStr.strip().split(" - ")
-            match titles[0]:
-                case ("Home" | "Fleets" | "Missions" | "Leaderboards"
-                      | "Tech Tree" | "Messages" | "Buildings" | "Shipyard"
-                      | "Defense" | "Research Lab" | "Factory" | "Workers"):
-                    if len(titles) > 1:
-                        path = f"[{titles[1]}]/{titles[0]}"
-                    else:
-                        logger.warning("Received good area \"%s,\" but no planet string! "
-                                       "Something is wrong with the server response.", titles[0])
-                case s if "Solar System" in s:
-                    _, sep, system = titles[0].rpartition(" ")
-                    if sep and len(titles) > 1: # Check that the separating space was found.
-                        path = f"{titles[1]}/Galaxy/[{system}]"
-                    else:
-                        logger.warning("Received Galaxy screen title, but no system "
-                                       "locator or planet name! Something is wrong "
-                                       "with the server response.")
-                case "Starfleet Commander":
-                    pass
-                case _:
-                    pass
-            logger.debug("Path constructed from HTML title: \"%s\"", path)
-        else:
-            logger.warning("Title received from server contains no text.")
-    else:
-        logger.warning("No title in the HTML receeived from server.")
-
-    return path
-
 def loadConfig() -> dict:
     '''
     Attempts to load the application config from a file. If the file cannot be
@@ -315,6 +596,22 @@ def loadConfig() -> dict:
 
     if not "plogger" in config:
         config["plogger"] = {}
+    if not "galaxy" in config:
+        config["galaxy"] = {}
+    if not "rest" in config:
+        config["rest"] = {}
+    if not "parser" in config:
+        config["parser"] = {}
+    if not "planets" in config:
+        config["planets"] = {}
+    if not "welcome" in config:
+        config["welcome"] = {}
+    if not "session" in config:
+        config["session"] = {}
+    if not "daemon" in config:
+        config["daemon"] = {}
+    if not "dispatch" in config:
+        config["dispatch"] = {}
 
     return config
 
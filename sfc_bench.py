@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+import argparse                         # for command line options
+import json                             # for machine-readable output
+import logging                          # built-in Python logging
+import os                               # for the start-up benchmark's working directory
+import platform                         # to record the benchmark environment
+import statistics                       # for median timings
+import subprocess                       # to time start-up in a fresh interpreter
+import sys                              # for exit codes and output
+import tempfile                         # for the start-up benchmark's welcome cache
+import time                             # for stage timings
+import tracemalloc                      # for memory peaks
+
+import parsers                          # for HTML parser backend selection
+from restRequests import newSession, sendRequest
+from page import ParsedPage             # for parsing server responses
+from streamParser import extractFields  # for streamed extraction
+from galaxy import parseGalaxyPage      # for galaxy extraction
+from cmdGalaxy import formatSystem      # for galaxy rendering
+from cmdLogin import buildRequestBody, buildRequestHeaders
+from sfc import getPrompt               # for prompt rendering
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("network", "decode", "parse", "extract", "format")
+HAR_FILES = ["example_requests/*.har"]
+ITERATIONS = 20             # default timed runs per command
+THRESHOLD = 0.10            # default allowed slowdown before a regression
+STARTUP_ITERATIONS = 10     # default fresh interpreters started for start-up timings
+TOP_IMPORTS = 10            # slowest imports listed in the start-up results
+
+# Run in a fresh interpreter: imports sfc and does everything main() does
+# before the first prompt, against HAR replay. Prints the timings as JSON on
+# the last line of its output.
+STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import sfc
+t1 = time.perf_counter()
+cfg = sfc.loadConfig()
+cfg["plogger"] = {"output": "console", "level": "CRITICAL"}
+cfg["rest"]["replay"] = {"enabled": True, "files": %r, "latency": True}
+cfg["welcome"] = {"mode": "background", "cachePath": sys.argv[1]}
+sfc.plogger.config_root_logger(cfg["plogger"])
+sfc.startWelcome(cfg)
+sfc.getPrompt("", "~")
+t2 = time.perf_counter()
+print()
+print(json.dumps({"import_ms": (t1 - t0) * 1000.0, "prompt_ms": (t2 - t0) * 1000.0}))
+"""
+
+# Each benchmarked command: the request it sends, what it extracts from the
+# page, and how it renders the result.
+COMMANDS = {
+    "login": {
+        "req": {"url": "https://playstarfleet.com/login/authenticate",
+                "body": buildRequestBody("Hanamura Yuki", "secret"),
+                "hdr": buildRequestHeaders()},
+        "extract": lambda page: (page.username, page.path),
+        "format": lambda x: getPrompt(*x),
+    },
+    "home": {
+        "req": {"url": "https://playstarfleet.com/",
+                "params": {"activate_planet": "1000003188270", "current_planet": "1000003188270"}},
+        "extract": lambda page: (page.username, page.path, page.planets, page.resources),
+        "format": lambda x: getPrompt(x[0], x[1]),
+    },
+    "fleet": {
+        "req": {"url": "https://playstarfleet.com/fleet",
+                "params": {"activate_planet": "1000003411713"}},
+        "extract": lambda page: (page.path, page.planets),
+        "format": lambda x: getPrompt("", x[0]),
+    },
+    "galaxy": {
+        "req": {"url": "https://playstarfleet.com/galaxy/show",
+                "params": {"activate_planet": "1000003786979", "galaxy": "8", "solar_system": "41"}},
+        "extract": lambda page: parseGalaxyPage(page, 8, 41),
+        "format": lambda x: formatSystem(8, 41, x),
+    },
+}
+
+def runOnce(cmd:dict, s) -> dict[str, float]:
+    '''
+    Runs one command through the whole pipeline and times each stage.
+
+    :param cmd: Entry of COMMANDS.
+    :type cmd:  dict
+    :param s:   Session to send the request with.
+    :type s:    requests.Session
+    :return:    Seconds spent in each stage, keyed by stage name.
+    :rtype:     dict[str, float]
+    '''
+    t = {}
+    t0 = time.perf_counter()
+    r = sendRequest(dict(cmd["req"], sess=s))
+    t1 = time.perf_counter()
+    htm = r.content.decode(r.encoding or "utf-8")
+    t2 = time.perf_counter()
+    page = ParsedPage(htm)
+    page.tree
+    t3 = time.perf_counter()
+    fields = cmd["extract"](page)
+    t4 = time.perf_counter()
+    cmd["format"](fields)
+    t5 = time.perf_counter()
+    for name, start, end in zip(STAGES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)):
+        t[name] = end - start
+    return t
+
+def benchCommand(cmd:dict, s, iterations:int) -> dict:
+    '''
+    Benchmarks one command: median and best time per stage over a number of
+    runs, plus the peak memory allocated by one extra traced run.
+
+    :param cmd:         Entry of COMMANDS.
+    :type cmd:          dict
+    :param s:           Session to send the requests with.
+    :type s:            requests.Session
+    :param iterations:  Number of timed runs.
+    :type iterations:   int
+    :return:            Result with "stages", "total_ms" and "peak_kib".
+    :rtype:             dict
+    '''
+    runOnce(cmd, s)     # Warm up imports and caches.
+    runs = [runOnce(cmd, s) for _ in range(iterations)]
+    stages = {}
+    for name in STAGES:
+        values = [run[name] * 1000.0 for run in runs]
+        stages[name] = {"median_ms": round(statistics.median(values), 3),
+                        "min_ms": round(min(values), 3)}
+
+    # Memory is measured separately, since tracing slows every allocation.
+    tracemalloc.start()
+    runOnce(cmd, s)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"stages": stages,
+            "total_ms": round(sum(st["median_ms"] for st in stages.values()), 3),
+            "peak_kib": round(peak / 1024.0, 1)}
+
+def runBenchmarks(names:list[str], iterations:int, latency:bool = False) -> dict:
+    '''
+    Benchmarks the given commands against the recorded HAR sessions.
+
+    :param names:       Names of entries in COMMANDS.
+    :type names:        list[str]
+    :param iterations:  Number of timed runs per command.
+    :type iterations:   int
+    :param latency:     Whether to replay the recorded server latency.
+    :type latency:      bool
+    :return:            Machine-readable results.
+    :rtype:             dict
+    '''
+    s = newSession({"replay": {"enabled": True, "files": HAR_FILES, "latency": latency}})
+    results = {"meta": {"python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "backend": parsers.getBackend(),
+                        "iterations": iterations,
+                        "latency": latency},
+               "commands": {}}
+    for name in names:
+        logger.info("Benchmarking %s...", name)
+        results["commands"][name] = benchCommand(COMMANDS[name], s, iterations)
+    return results
+
+def benchTitle(s, iterations:int) -> dict:
+    '''
+    Benchmarks the time to the title of the home page: reading and parsing
+    the whole page, against streamed extraction that stops at the title.
+
+    :param s:           Session to send the requests with.
+    :type s:            requests.Session
+    :param iterations:  Number of timed runs of each.
+    :type iterations:   int
+    :return:            Result with "stages" ("full" and "streamed") and
+                        "total_ms" (the streamed median).
+    :rtype:             dict
+    '''
+    req = dict(COMMANDS["home"]["req"], sess=s)
+    ways = {"full": lambda: ParsedPage(sendRequest(req).text).title,
+            "streamed": lambda: extractFields(sendRequest(dict(req, stream=True)),
+                                              {"title": "title"})["title"]}
+    stages = {}
+    for name, run in ways.items():
+        run()           # Warm up imports and caches.
+        values = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run()
+            values.append((time.perf_counter() - start) * 1000.0)
+        stages[name] = {"median_ms": round(statistics.median(values), 3),
+                        "min_ms": round(min(values), 3)}
+    return {"stages": stages, "total_ms": stages["streamed"]["median_ms"]}
+
+def benchStartup(iterations:int) -> dict:
+    '''
+    Benchmarks start-up: the time to import sfc and the time until the first
+    prompt can be shown, each in a fresh interpreter, plus the slowest
+    imports reported by python -X importtime.
+
+    :param iterations:  Number of fresh interpreters to time.
+    :type iterations:   int
+    :return:            Result with "stages", "total_ms", "process_ms" and
+                        "top_imports".
+    :rtype:             dict
+    '''
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = STARTUP_SCRIPT % (HAR_FILES,)
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "welcome.txt")
+        for _ in range(iterations):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", script, cache], cwd=here,
+                                 capture_output=True, text=True, check=True).stdout
+            run = json.loads(out.strip().splitlines()[-1])
+            run["process_ms"] = (time.perf_counter() - start) * 1000.0
+            runs.append(run)
+
+    stages = {}
+    for name in ("import_ms", "prompt_ms", "process_ms"):
+        values = [run[name] for run in runs]
+        stages[name[:-3]] = {"median_ms": round(statistics.median(values), 3),
+                             "min_ms": round(min(values), 3)}
+
+    # Each line of -X importtime is "import time: self | cumulative | name".
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sfc"], cwd=here,
+                         capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((parts[2].strip(), int(parts[1]) / 1000.0))
+    imports.sort(key=lambda i: -i[1])
+
+    return {"stages": {"import": stages["import"], "prompt": stages["prompt"]},
+            "total_ms": stages["prompt"]["median_ms"],
+            "process_ms": stages["process"]["median_ms"],
+            "top_imports": [[name, round(ms, 3)] for name, ms in imports[:TOP_IMPORTS]]}
+
+def compareToBaseline(results:dict, baseline:dict, threshold:float) -> list[str]:
+    '''
+    Compares results with a stored baseline, stage by stage.
+
+    :param results:     Output of runBenchmarks().
+    :type results:      dict
+    :param baseline:    Earlier output of runBenchmarks().
+    :type baseline:     dict
+    :param threshold:   Allowed slowdown as a fraction, e.g. 0.1 for 10%.
+    :type threshold:    float
+    :return:            One message per regressed stage. Empty if none.
+    :rtype:             list[str]
+    '''
+    regressions = []
+    for name, res in results["commands"].items():
+        base = baseline.get("commands", {}).get(name)
+        if base is None:
+            continue
+        pairs = [(stage, res["stages"][stage]["median_ms"], base["stages"][stage]["median_ms"])
+                 for stage in res["stages"] if stage in base["stages"]]
+        pairs.append(("total", res["total_ms"], base["total_ms"]))
+        for stage, now, before in pairs:
+            if before > 0:
+                change = (now - before) / before
+                res.setdefault("change", {})[stage] = round(change, 3)
+                if change > threshold:
+                    regressions.append(f"{name}/{stage}: {before:.3f} ms -> {now:.3f} ms "
+                                       f"(+{change:.0%})")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the request -> parse -> render "
+                                 "pipeline against the recorded HAR sessions.")
+    ap.add_argument("commands", nargs="*",
+                    help=f"commands to benchmark: {', '.join(COMMANDS)} (default: all)")
+    ap.add_argument("-n", "--iterations", type=int, default=ITERATIONS)
+    ap.add_argument("-b", "--backend", choices=parsers.BACKENDS, default=parsers.DEFAULT_BACKEND,
+                    help="HTML parser backend")
+    ap.add_argument("--latency", action="store_true", help="replay recorded server latency")
+    ap.add_argument("--startup", action="store_true",
+                    help="also benchmark import time and time to the first prompt")
+    ap.add_argument("--title", action="store_true",
+                    help="also benchmark the time to the home page title, full against streamed")
+    ap.add_argument("--baseline", help="JSON file of an earlier run to compare against")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD,
+                    help="allowed slowdown against the baseline (default: 0.10)")
+    ap.add_argument("-o", "--output", help="write the JSON results to this file")
+    args = ap.parse_args()
+
+    for name in args.commands:
+        if name not in COMMANDS:
+            ap.error(f"unknown command '{name}'")
+
+    parsers.setBackend(args.backend)
+    results = runBenchmarks(args.commands or list(COMMANDS), args.iterations, args.latency)
+    if args.startup:
+        results["commands"]["startup"] = benchStartup(STARTUP_ITERATIONS)
+    if args.title:
+        s = newSession({"replay": {"enabled": True, "files": HAR_FILES, "latency": args.latency}})
+        results["commands"]["title"] = benchTitle(s, args.iterations)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compareToBaseline(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+
+    out = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + "\n")
+    print(out)
+    for msg in regressions:
+        print(f"REGRESSION {msg}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,37 @@
 import unittest
+import json
+import requests
 from sfc import buildCommandDict
 from sfc import loadConfig
-from planet import parseLocation
+from planet import parseLocation, Location
+from galaxy import parseGalaxyPage, GalaxySlot
+from page import ParsedPage, pageOf
+import cmdGalaxy
+import cmdPlanet
+import restRequests
+import parsers
+import cmdLogin
+from galaxyStore import GalaxyStore
+from galaxyIndex import GalaxyIndex
+import units
+import planet
+import streamParser
+import dispatchQueue
+import production
+import combat
+import numpy as np
+import cmdDispatch
+import plogger
+import logging
+import os
+import tempfile
+import time
+from planet import Fleet, Defences, Resources, Planet
+from unittest import mock
+
+def harBody(name:str) -> str:
+    with open(f"example_requests/{name}.har") as f:
+        return json.load(f)["log"]["entries"][0]["response"]["content"]["text"]
 
 class Tests(unittest.TestCase):
     def test_buildCommandDict_blank(self):
@@ -25,13 +55,969 @@ class Tests(unittest.TestCase):
         self.assertEqual(buildCommandDict(passed), expected)
 
     def test_loadConfig(self):
-        expected = {"plogger": {"output": "file", "filePath": "sfc.log", "level": "DEBUG"}}
+        expected = {"plogger": {"output": "file", "filePath": "sfc.log", "level": "DEBUG",
+                                "async": True, "format": "text", "maxBytes": 10485760,
+                                "maxAge": 86400, "backupCount": 5, "compress": True},
+                    "rest": {"poolSize": 10, "connectTimeout": 5, "readTimeout": 30,
+                             "retries": 3, "backoff": 0.5,
+                             "replay": {"enabled": False, "files": ["example_requests/*.har"],
+                                        "latency": False},
+                             "cache": {"enabled": True, "maxEntries": 64,
+                                       "ttl": {"home": 30, "fleet": 15, "galaxy": 600}},
+                             "conditional": {"enabled": True, "maxEntries": 256}},
+                    "parser": {"backend": "lxml"},
+                    "galaxy": {"maxWorkers": 4, "requestsPerSecond": 5,
+                               "storePath": "galaxy.db", "maxAge": 3600},
+                    "planets": {"maxWorkers": 4, "requestsPerSecond": 5, "projectFor": 0},
+                    "welcome": {"mode": "background", "cachePath": "welcome.txt"},
+                    "session": {"persist": False, "path": "session.json"},
+                    "daemon": {"views": [{"view": "home", "interval": 60, "jitter": 0.1},
+                                         {"view": "fleet", "interval": 120, "jitter": 0.1}]},
+                    "dispatch": {"storePath": "dispatch.db", "maxWorkers": 4,
+                                 "requestsPerSecond": 2, "retries": 3, "backoff": 1.0}}
         self.assertEqual(loadConfig(), expected)
     
     def test_parseLocation(self):
         passed = "8:41:3m"
-        expected = {"galaxy": 8, "system": 41, "slot": 3, "moon": True}
+        expected = Location(galaxy=8, system=41, slot=3, moon=True)
         self.assertEqual(parseLocation(passed), expected)
+        self.assertEqual(str(parseLocation(passed)), passed)
+
+    def test_location_interned(self):
+        loc = parseLocation("8:41:3m")
+        self.assertIs(loc, Location(8, 41, 3, True))
+        self.assertIs(Location.fromKey(loc.key), loc)
+        self.assertFalse(hasattr(loc, "__dict__"))
+        with self.assertRaises(AttributeError):
+            loc.slot = 4    #type: ignore
+        self.assertEqual({loc: 1}[Location(8, 41, 3, True)], 1)
+
+    def test_location_order_and_ranges(self):
+        locs = [Location(9, 1, 1), Location(8, 41, 3, True), Location(8, 41, 3), Location(8, 42, 1)]
+        self.assertEqual([str(l) for l in sorted(locs)], ["8:41:3", "8:41:3m", "8:42:1", "9:1:1"])
+        self.assertEqual(sorted(locs, key=lambda l: l.key), sorted(locs))
+        inRange = [str(l) for l in locs if l.key in Location.keyRange(8, 40, 41)]
+        self.assertEqual(inRange, ["8:41:3m", "8:41:3"])
+        with self.assertRaises(ValueError):
+            Location(8, -1, 3)
+
+    def test_parseLocations(self):
+        passed = ["8:41:3m", " 8:41:5", "12:1:15"]
+        packed = planet.parseLocations(passed)
+        self.assertEqual(packed.tolist(), [[8, 41, 3, 1], [8, 41, 5, 0], [12, 1, 15, 0]])
+        self.assertEqual(packed.tolist(), planet.locationArray(map(parseLocation, passed)).tolist())
+        self.assertEqual(planet.parseLocations(iter([])).shape, (0, 4))
+        with self.assertRaisesRegex(ValueError, "8:41m:3"):
+            planet.parseLocations(["8:41:3", "8:41m:3"])
+
+    def test_distances_and_flightTimes(self):
+        targets = planet.parseLocations(["8:41:3m", "8:41:5", "8:45:1", "10:1:1"])
+        origin = Location(8, 41, 3)
+        self.assertEqual(planet.distances(origin, targets).tolist(), [5, 1010, 3080, 40000])
+        times = planet.flightTimes(origin, targets, 10000)
+        self.assertAlmostEqual(times[1], 10 + 350 * (10 * 1010 / 10000) ** 0.5)
+        self.assertAlmostEqual(planet.flightTimes(Location(9, 1, 1), targets[3:], 5000)[0], 2223.6, 1)
+        self.assertTrue((planet.flightTimes(origin, targets, 10000, 5) > times).all())
+
+    def test_galaxy_parseArgs_single(self):
+        expected = {"-g": [8, 8], "-s": [35, 35]}
+        self.assertEqual(cmdGalaxy.parseArgs(["-g8", "-s35"]), expected)
+
+    def test_galaxy_parseArgs_range(self):
+        expected = {"-g": [8, 8], "-s": [35, 40]}
+        self.assertEqual(cmdGalaxy.parseArgs(["-g", "8", "-s", "35..40"]), expected)
+
+    def test_galaxy_parseArgs_bad_range(self):
+        self.assertIn("-x", cmdGalaxy.parseArgs(["-g8", "-s40..35"]))
+
+    def test_parseGalaxyPage(self):
+        slots = parseGalaxyPage(ParsedPage(harBody("galaxy")), 8, 41)
+        self.assertEqual(len(slots), 6)
+        self.assertEqual(slots[2].location, Location(8, 41, 4, False))
+        self.assertEqual(slots[2].player, "Lord Admiral Krogus")
+        self.assertEqual(slots[2].playerId, 734461)
+        self.assertEqual(slots[2].alliance, "CRN")
+        self.assertTrue(slots[1].location.moon)
+
+    def test_newSession_transport(self):
+        s = restRequests.newSession({"poolSize": 3, "retries": 2, "readTimeout": 7})
+        adapter = s.get_adapter("https://playstarfleet.com/")
+        self.assertIsInstance(adapter, restRequests.TransportAdapter)
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.timeout, (restRequests.CONNECT_TIMEOUT, 7.0))
+        self.assertNotIn("POST", adapter.max_retries.allowed_methods)
+        self.assertIn("gzip", s.headers["Accept-Encoding"])
+
+    def test_ParsedPage_home(self):
+        page = ParsedPage(harBody("planet-home"))
+        self.assertEqual(page.username, "Hanamura Yuki")
+        self.assertEqual(page.path, "[Mestor]/Home")
+        self.assertEqual(page.resources.ore, 4792889709)
+        self.assertEqual(page.planets[1].name, "Mestor")
+        self.assertEqual(page.planets[1].id, "1000003188270")
+        self.assertEqual(page.planets[1].location, Location(5, 4, 15, False))
+
+    def test_ParsedPage_fleet_and_tasks(self):
+        fleet = ParsedPage(harBody("fleet")).fleet
+        self.assertEqual(fleet.hermes, 999820)
+        self.assertEqual(fleet.dionysus, 50000)
+        self.assertEqual(fleet.shadow, 0)
+        tasks = ParsedPage(harBody("planet-home")).tasks
+        self.assertEqual([(t.kind, t.name, t.stance) for t in tasks],
+                         [("Researching", "Energy Tech (Level 21)", "friendly")])
+
+    def test_ParsedPage_parses_once(self):
+        page = ParsedPage(harBody("galaxy"))
+        soup = page.tree
+        self.assertEqual(page.path, "Yuki's Party Planet/Galaxy/[8:41]")
+        self.assertEqual(page.username, "")
+        self.assertEqual(len(page.planets), 19)
+        self.assertIs(page.tree, soup)
+
+REPLAY_CFG = {"replay": {"enabled": True, "files": ["example_requests/*.har"]}}
+
+class ReplayTests(unittest.TestCase):
+    def test_replay_galaxy(self):
+        s = restRequests.newSession(REPLAY_CFG)
+        r = restRequests.sendRequest({"url": "https://playstarfleet.com/galaxy/show", "sess": s,
+            "params": {"galaxy": "8", "solar_system": "41", "activate_planet": "1000003786979"}})
+        self.assertEqual(len(parseGalaxyPage(ParsedPage(r.text), 8, 41)), 6)
+
+    def test_replay_login(self):
+        s = restRequests.newSession(REPLAY_CFG)
+        with mock.patch("cmdLogin.getPassword", return_value="secret"):
+            page = cmdLogin.login({"cmd": "login", "args": ["-u", "Hanamura", "Yuki"]}, s)
+        self.assertIsNotNone(page)
+        self.assertEqual(page.username, "Hanamura Yuki")  #type: ignore
+
+    def test_replay_planets(self):
+        s = restRequests.newSession(REPLAY_CFG)
+        page = ParsedPage(harBody("planet-home"))
+        with mock.patch("builtins.print"):
+            planets = cmdPlanet.planet({"cmd": "planets", "args": []}, s, page,
+                                       {"maxWorkers": 4, "requestsPerSecond": 0})
+        self.assertEqual(sorted(p.id for p in planets), sorted(p.id for p in page.planets))
+        self.assertEqual(planets[0].resources, page.resources)
+        self.assertEqual(list(planets[0].tasks), [t.id for t in page.tasks])
+
+    def test_refreshed_planets_keep_their_own_data(self):
+        page = ParsedPage(harBody("planet-home"))
+        def send(req):
+            # A different amount of ore on each planet's page.
+            pid = req["params"]["activate_planet"]
+            r = requests.Response()
+            body = harBody("planet-home").replace(">4,792,889,709<", f">{int(pid) % 1000000}<")
+            r.status_code, r._content, r.encoding = 200, body.encode(), "utf-8"
+            return r
+        with mock.patch("builtins.print"), mock.patch("restRequests.sendRequest", side_effect=send):
+            planets = cmdPlanet.planet({"cmd": "planets", "args": []}, None, page,   #type: ignore
+                                       {"maxWorkers": 4, "requestsPerSecond": 0})
+        self.assertEqual(len(planets), len(page.planets))
+        for p in planets:
+            self.assertEqual(p.resources.ore, int(p.id) % 1000000)
+
+    def test_replay_planets_projected(self):
+        s = restRequests.newSession(REPLAY_CFG)
+        page = ParsedPage(harBody("planet-home"))
+        cfg = {"maxWorkers": 4, "requestsPerSecond": 0, "projectFor": 300}
+        with mock.patch("builtins.print"):
+            cmdPlanet.planet({"cmd": "planets", "args": []}, s, page, cfg)
+            with mock.patch("cmdPlanet.fetchConcurrently", return_value=iter([])) as fetch:
+                planets = cmdPlanet.planet({"cmd": "planets", "args": []}, s, page, cfg)
+                estimated = cmdPlanet.planet({"cmd": "planets", "args": ["-e"]}, s, page, cfg)
+                ready = cmdPlanet.planet({"cmd": "planets", "args": ["-a", "ore=1"]}, s, page, cfg)
+        self.assertEqual(fetch.call_args[0][1], {})
+        self.assertEqual(len(planets), len(page.planets))
+        self.assertEqual(planets[0].resources, page.resources)   # storage is full
+        self.assertEqual(len(estimated), len(page.planets))
+        self.assertEqual(len(ready), len(page.planets))
+
+        # A state change (even a failed one) may have moved resources.
+        with self.assertRaises(requests.exceptions.HTTPError):
+            restRequests.sendRequest({"url": "https://playstarfleet.com/fleet/send_task",
+                                      "sess": s, "body": {"mission": "transport"}})
+        with mock.patch("builtins.print"):
+            self.assertIsNone(cmdPlanet.planet({"cmd": "planets", "args": ["-e"]}, s, page, cfg))
+
+    def test_planets_before_login(self):
+        with mock.patch("builtins.print"):
+            self.assertIsNone(cmdPlanet.planet({"cmd": "planets", "args": []}, None, None, {})) #type: ignore
+
+    def test_replay_unmatched(self):
+        s = restRequests.newSession(REPLAY_CFG)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            restRequests.sendRequest({"url": "https://playstarfleet.com/nowhere", "sess": s})
+
+class PageCacheTests(unittest.TestCase):
+    GALAXY = {"url": "https://playstarfleet.com/galaxy/show",
+              "params": {"galaxy": "8", "solar_system": "41", "activate_planet": "1000003786979"}}
+
+    def setUp(self):
+        self.s = restRequests.newSession(dict(REPLAY_CFG, cache={"enabled": True}))
+
+    def test_cache_hit(self):
+        r1 = restRequests.sendRequest(dict(self.GALAXY, sess=self.s))
+        r2 = restRequests.sendRequest(dict(self.GALAXY, sess=self.s))
+        self.assertIs(r1, r2)
+
+    def test_cache_keyed_by_planet(self):
+        r1 = restRequests.sendRequest(dict(self.GALAXY, sess=self.s))
+        other = dict(self.GALAXY["params"], activate_planet="1000003188270")
+        r2 = restRequests.sendRequest(dict(self.GALAXY, params=other, sess=self.s))
+        self.assertIsNot(r1, r2)
+
+    def test_cache_post_invalidates(self):
+        r1 = restRequests.sendRequest(dict(self.GALAXY, sess=self.s))
+        restRequests.sendRequest({"url": "https://playstarfleet.com/login/authenticate",
+                                  "body": {}, "sess": self.s})
+        r2 = restRequests.sendRequest(dict(self.GALAXY, sess=self.s))
+        self.assertIsNot(r1, r2)
+
+    def test_cache_lru_bound(self):
+        cache = restRequests.PageCache(maxEntries=2, ttl={"galaxy": 60})
+        for i in range(3):
+            cache.put(self.GALAXY["url"], {"solar_system": i}, requests.Response(), 0)
+        self.assertIsNone(cache.get(self.GALAXY["url"], {"solar_system": 0}))
+        self.assertIsNotNone(cache.get(self.GALAXY["url"], {"solar_system": 2}))
+
+    def test_cache_uncached_view(self):
+        cache = restRequests.PageCache(ttl={"galaxy": 60})
+        cache.put("https://playstarfleet.com/fleet", {}, requests.Response(), 0)
+        self.assertIsNone(cache.get("https://playstarfleet.com/fleet", {}))
+
+    def test_conditional_not_modified(self):
+        s = restRequests.newSession({"conditional": {"enabled": True}})
+        first = requests.Response()
+        first.status_code, first._content = 200, harBody("galaxy").encode()
+        first.headers["ETag"] = '"v1"'
+        notModified = requests.Response()
+        notModified.status_code, notModified._content = 304, b""
+        sent = []
+        def fake(url, params, hdrs, sess, stream=False, redirects=True):
+            sent.append(hdrs)
+            return first if len(sent) == 1 else notModified
+        with mock.patch("restRequests.sendGetRequest", side_effect=fake):
+            r1 = restRequests.sendRequest(dict(self.GALAXY, sess=s))
+            r2 = restRequests.sendRequest(dict(self.GALAXY, sess=s))
+        self.assertNotIn("If-None-Match", sent[0])
+        self.assertEqual(sent[1]["If-None-Match"], '"v1"')
+        self.assertIs(r1, r2)
+        self.assertIs(pageOf(r1), pageOf(r2))
+
+class GalaxyStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = GalaxyStore(":memory:")
+        self.slots = parseGalaxyPage(ParsedPage(harBody("galaxy")), 8, 41)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_round_trip(self):
+        self.store.saveSystem(8, 41, self.slots)
+        self.assertEqual(self.store.slotsIn(8, 41, 41), self.slots)
+
+    def test_staleSystems(self):
+        self.store.saveSystem(8, 41, self.slots)
+        self.store.saveSystem(8, 42, [], seen=0.0)
+        self.assertEqual(self.store.staleSystems(8, range(40, 44)), [40, 42, 43])
+
+    def test_inactiveNear(self):
+        self.slots[2].status = "i"
+        self.store.saveSystem(8, 41, self.slots)
+        found = self.store.inactiveNear(Location(8, 30), 11)
+        self.assertEqual([s.player for s in found], ["Lord Admiral Krogus"])
+        self.assertEqual(self.store.inactiveNear(Location(8, 30), 10), [])
+
+class ProductionTests(unittest.TestCase):
+    def planet(self, stock, rates=(0.0, 0.0, 0.0), storage=(0, 0, 0)):
+        p = Planet()
+        p.resources = Resources(*stock)
+        p.production, p.storage = planet.Production(*rates), Resources(*storage)
+        p.seen = 1000.0
+        return p
+
+    def test_page_production(self):
+        page = ParsedPage(harBody("planet-home"))
+        self.assertAlmostEqual(page.production.ore, 1 / 720)
+        self.assertEqual(page.storage, page.resources)   # storage is full
+
+    def test_projection(self):
+        planets = [self.planet((100, 0, 0), rates=(1.0, 0.5, 0.0), storage=(400, 0, 0)),
+                   self.planet((0, 0, 0), rates=(0.0, 0.01, 0.0))]
+        p = production.Projection(planets)
+        self.assertEqual(p.at(1100.0)[0].tolist(), [200, 50, 0])
+        self.assertEqual(p.at(2000.0)[0].tolist(), [400, 500, 0])   # ore storage is full
+        self.assertEqual(p.resourcesAt(1000.0)[1], Resources())
+        ready = p.affordableAt(Resources(0, 50, 0))
+        self.assertEqual(ready[0], 1100.0)
+        self.assertAlmostEqual(ready[1], 1000.0 + 5000)
+        self.assertEqual(p.affordableAt(Resources(1))[1], float("inf"))        # no ore
+        self.assertEqual(p.affordableAt(Resources(0, 0, 1))[1], float("inf"))   # no hydrogen
+        self.assertEqual(p.affordableAt(Resources(500))[0], float("inf"))   # over storage
+        self.assertEqual(p.affordableAt(Resources(50))[0], 1000.0)
+
+    def test_unknown_rates(self):
+        unknown = self.planet((100, 0, 0))
+        unknown.name = "Molos"
+        with self.assertRaisesRegex(ValueError, "Molos"):
+            production.Projection([self.planet((0, 0, 0), rates=(1.0, 0, 0)), unknown])
+        unknown.id = "1000003412288"
+        page = mock.Mock(planets=[unknown])
+        with mock.patch("builtins.print") as out, mock.patch.object(cmdPlanet, "_knownState", 0), \
+             mock.patch.dict(cmdPlanet._known, {unknown.id: unknown}, clear=True):
+            self.assertIsNone(cmdPlanet.planet({"cmd": "planets", "args": ["-e"]}, None, page, {}))
+        self.assertIn("Molos", out.call_args_list[0].args[0])
+
+class GalaxyIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.slots = [GalaxySlot(Location(g, s, p), status="i" if (g + s + p) % 3 == 0 else "")
+                      for g in (7, 8, 10) for s in range(1, 60, 3) for p in (2, 5, 9)]
+        self.index = GalaxyIndex(self.slots)
+
+    def test_inSystems(self):
+        found = self.index.inSystems(8, 10, 16)
+        self.assertEqual([str(x.location) for x in found][:4], ["8:10:2", "8:10:5", "8:10:9", "8:13:2"])
+        self.assertEqual(found, [x for x in self.slots
+                                 if x.location.galaxy == 8 and 10 <= x.location.system <= 16])
+        self.assertEqual(self.index.within(Location(8, 13), 3, GalaxyStore.isInactive),
+                         [x for x in found if x.status == "i"])
+
+    def test_nearest_matches_brute_force(self):
+        origin = Location(8, 30, 4)
+        for where in (None, GalaxyStore.isInactive):
+            pool = [x for x in self.slots if where is None or where(x)]
+            expected = sorted(pool, key=lambda x: (planet.distance(origin, x.location), x.location))
+            for k in (1, 7, 100):
+                self.assertEqual(self.index.nearest(origin, k, where), expected[:k])
+        self.assertTrue(all(x.location.galaxy == 8 for x in self.index.nearest(origin, 200, radius=50)))
+
+    def test_nearest_other_galaxies(self):
+        found = self.index.nearest(Location(9, 1, 1), 70)
+        self.assertEqual([x.location.galaxy for x in found], [8] * 60 + [10] * 10)
+        self.assertEqual(self.index.nearest(Location(9, 1, 1), 70, radius=5), [])
+
+    def test_update(self):
+        fresh = [GalaxySlot(Location(8, 10, 7), player="new")]
+        self.index.update(8, 10, fresh)
+        self.assertEqual(self.index.inSystems(8, 10, 10), fresh)
+        self.assertEqual(len(self.index), len(self.slots) - 2)
+        self.assertEqual(self.index.nearest(Location(8, 10, 7), 1), fresh)
+
+class GalaxyNearestTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cfg = {"storePath": os.path.join(self.dir.name, "galaxy.db")}
+        self.slots = parseGalaxyPage(ParsedPage(harBody("galaxy")), 8, 41)
+
+    def tearDown(self):
+        cmdGalaxy._indexes.clear()
+        self.dir.cleanup()
+
+    def nearest(self, cfg, *args):
+        with mock.patch("builtins.print"):
+            return cmdGalaxy.galaxy({"cmd": "galaxy", "args": ["-g8", "-s41", "-n3", *args]},
+                                    None, cfg)      #type: ignore
+
+    def test_nearest(self):
+        with GalaxyStore(self.cfg["storePath"]) as store:
+            store.saveSystem(8, 41, self.slots)
+        self.assertEqual(self.nearest(self.cfg), self.slots[:3])
+        self.assertEqual(self.nearest(self.cfg, "-i"), [])
+
+    def test_index_follows_the_store(self):
+        with GalaxyStore(self.cfg["storePath"]) as store:
+            store.saveSystem(8, 41, self.slots)
+            self.assertEqual(len(self.nearest(self.cfg)), 3)
+            # Another connection (e.g. another process) changes the store.
+            with GalaxyStore(self.cfg["storePath"]) as other:
+                other.saveSystem(8, 41, self.slots[:1])
+            self.assertEqual(self.nearest(self.cfg), self.slots[:1])
+        # A different, empty store at a path that was indexed before.
+        self.assertEqual(self.nearest({"storePath": ":memory:"}), [])
+        self.nearest(self.cfg)
+        os.remove(self.cfg["storePath"])
+        self.assertEqual(self.nearest(self.cfg), [])
+
+    def test_sweep_updates_index(self):
+        with GalaxyStore(self.cfg["storePath"]) as store:
+            store.saveSystem(8, 41, self.slots)
+        self.nearest(self.cfg)
+        index = cmdGalaxy._indexes[self.cfg["storePath"]][1]
+        with mock.patch("builtins.print"), \
+             mock.patch("cmdGalaxy.sweepGalaxy", return_value=iter([(41, self.slots[1:2])])):
+            cmdGalaxy.galaxy({"cmd": "galaxy", "args": ["-g8", "-s41", "-f"]}, None, self.cfg)  #type: ignore
+        self.assertEqual(self.nearest(self.cfg), self.slots[1:2])
+        self.assertIs(cmdGalaxy._indexes[self.cfg["storePath"]][1], index)
+
+class PloggerTests(unittest.TestCase):
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.saved = (self.root.handlers[:], self.root.level)
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "sfc.log")
+
+    def tearDown(self):
+        plogger.stop_listener()
+        for h in self.root.handlers:
+            if h not in self.saved[0]: h.close()
+        self.root.handlers[:] = self.saved[0]
+        self.root.setLevel(self.saved[1])
+        self.dir.cleanup()
+
+    def test_async_file(self):
+        plogger.config_root_logger({"output": "file", "filePath": self.path,
+                                    "level": "DEBUG", "async": True})
+        self.assertTrue(any(isinstance(h, logging.handlers.QueueHandler)
+                            for h in self.root.handlers))
+        logging.getLogger("sfc_test").debug("queued %d", 42)
+        plogger.stop_listener()
+        with open(self.path) as f:
+            self.assertIn("queued 42", f.read())
+
+    def test_async_fallback(self):
+        console = mock.Mock(spec=logging.Handler)
+        handler = plogger.LoggingFileHandler(self.path, fallback_handler=console)
+        plogger.start_listener(self.root, [handler])
+        with mock.patch.object(handler, "stream", mock.Mock(**{"write.side_effect": OSError("disk full")})):
+            logging.getLogger("sfc_test").warning("after failure")
+            plogger.stop_listener()
+        self.assertTrue(handler.is_fallback_active)
+        self.assertEqual(console.emit.call_args[0][0].getMessage(), "after failure")
+
+    def test_listener_stops_once_at_exit(self):
+        with mock.patch("atexit.register") as register, mock.patch.object(plogger, "_stop_at_exit", False):
+            for _ in range(3):
+                plogger.start_listener(self.root, [logging.NullHandler()])
+        register.assert_called_once_with(plogger.stop_listener)
+
+    def test_json_request_records(self):
+        import logSummary
+        plogger.config_root_logger({"output": "file", "filePath": self.path,
+                                    "level": "INFO", "format": "json"})
+        s = restRequests.newSession(REPLAY_CFG)
+        for _ in range(3):
+            restRequests.sendRequest({"url": "https://playstarfleet.com/galaxy/show", "sess": s,
+                "params": {"galaxy": "8", "solar_system": "41"}})
+        records = logSummary.readRecords(self.path)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["status"], 200)
+        self.assertEqual(records[0]["method"], "GET")
+        self.assertFalse(records[0]["cache_hit"])
+        self.assertGreater(records[0]["bytes"], 0)
+        summary = logSummary.summarize(records)["endpoints"]["GET /galaxy/show"]
+        self.assertEqual(summary["count"], 3)
+        self.assertLessEqual(summary["p50_ms"], summary["p99_ms"])
+
+    def test_json_request_records_failure(self):
+        import logSummary
+        plogger.config_root_logger({"output": "file", "filePath": self.path,
+                                    "level": "INFO", "format": "json"})
+        s = restRequests.newSession(REPLAY_CFG)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            restRequests.sendRequest({"url": "https://playstarfleet.com/nowhere", "sess": s})
+        [record] = logSummary.readRecords(self.path)
+        self.assertEqual(record["status"], 404)
+
+    def test_rotation_by_size(self):
+        import gzip
+        handler = plogger.LoggingFileHandler(self.path, max_bytes=200, backup_count=2)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for i in range(20):
+            handler.handle(logging.makeLogRecord({"msg": f"line {i:02d} " + "x" * 40}))
+        handler.close()
+        segments = handler.segments()
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(all(s.endswith(".gz") for s in segments))
+        with gzip.open(segments[-1], 'rt') as f:
+            rotated = f.read()
+        with open(self.path) as f:
+            current = f.read()
+        self.assertLess(os.path.getsize(self.path), 200)
+        self.assertIn("line 19", current)
+        self.assertLess(rotated.splitlines()[-1], current.splitlines()[0])
+
+    def test_rotation_formats_once(self):
+        handler = plogger.LoggingFileHandler(self.path, max_bytes=200)
+        with mock.patch.object(handler, "format", return_value="line") as fmt:
+            handler.handle(logging.makeLogRecord({"msg": "line"}))
+            handler.handle(logging.makeLogRecord({"msg": "line"}))
+        handler.close()
+        self.assertEqual(fmt.call_count, 2)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "line\nline\n")
+
+    def test_rotation_by_age(self):
+        handler = plogger.LoggingFileHandler(self.path, max_age=60, compress=False)
+        handler.handle(logging.makeLogRecord({"msg": "old"}))
+        handler.handle(logging.makeLogRecord({"msg": "new", "created": time.time() + 61}))
+        handler.close()
+        self.assertEqual(len(handler.segments()), 1)
+        with open(handler.segments()[0]) as f:
+            self.assertEqual(f.read(), "old\n")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "new\n")
+
+    def test_keeps_history(self):
+        with open(self.path, 'w') as f:
+            f.write("earlier session\n")
+        plogger.config_root_logger({"output": "file", "filePath": self.path, "level": "INFO"})
+        for h in self.root.handlers: h.flush()
+        with open(self.path) as f:
+            self.assertTrue(f.read().startswith("earlier session"))
+
+    def test_percentile(self):
+        import logSummary
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual([logSummary.percentile(values, p) for p in (50, 95, 99)],
+                         [50.0, 95.0, 99.0])
+        self.assertEqual(logSummary.percentile([], 50), 0.0)
+
+class SessionStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "session.json")
+        self.s = restRequests.newSession(REPLAY_CFG)
+        self.s.cookies.set("_sfc_session2", "abc123", domain="playstarfleet.com")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        import sessionStore
+        self.s.cookies.set("old", "x", domain="playstarfleet.com", expires=1)
+        sessionStore.saveSession(self.s, "Hanamura Yuki", self.path)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        s = requests.Session()
+        self.assertEqual(sessionStore.loadSession(s, self.path), "Hanamura Yuki")
+        self.assertEqual(s.cookies.get("_sfc_session2"), "abc123")
+        self.assertIsNone(s.cookies.get("old"))
+
+    def test_resume(self):
+        import sessionStore
+        sessionStore.saveSession(self.s, "Hanamura Yuki", self.path)
+        self.assertEqual(cmdLogin.resume(restRequests.newSession(REPLAY_CFG), self.path),
+                         ("Hanamura Yuki", "[Mestor]/Home"))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_resume_expired(self):
+        import sessionStore
+        sessionStore.saveSession(self.s, "Hanamura Yuki", self.path)
+        s = requests.Session()
+        expired = mock.Mock(status_code=302, headers={"Location": "https://playstarfleet.com/login"})
+        with mock.patch("cmdLogin.sendRequest", return_value=expired):
+            self.assertIsNone(cmdLogin.resume(s, self.path))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(len(s.cookies), 0)
+
+    def test_resume_nothing_saved(self):
+        with mock.patch("cmdLogin.sendRequest") as send:
+            self.assertIsNone(cmdLogin.resume(requests.Session(), self.path))
+        send.assert_not_called()
+
+class DispatchTests(unittest.TestCase):
+    ORIGIN = "1000003411713"
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.queue = dispatchQueue.DispatchQueue(os.path.join(self.dir.name, "dispatch.db"))
+        self.job = dispatchQueue.Mission(origin=self.ORIGIN, target=parseLocation("8:41:3"),
+                                         ships=Fleet(atlas=20), cargo=Resources(ore=500))
+        self.queue.add(self.job)
+        self.limiter = restRequests.RateLimiter(0)
+        self.before = ParsedPage(harBody("fleet"))
+        # Same page, with the atlases gone.
+        self.after = ParsedPage(harBody("fleet").replace(
+            "ship_quantity_676893046_max'>9223372036854775807", "ship_quantity_676893046_max'>5"))
+
+    def tearDown(self):
+        self.queue.close()
+        self.dir.cleanup()
+
+    def send(self, posts):
+        with mock.patch("dispatchQueue.sendRequest", side_effect=posts) as post, \
+             mock.patch("dispatchQueue.loadFleet", side_effect=[self.after, self.before]):
+            dispatchQueue.sendMission(None, self.queue, self.job, self.before,    #type: ignore
+                                      self.limiter, 2, 0.0)
+        return post
+
+    def test_queue_round_trip(self):
+        self.job.state = dispatchQueue.SENDING
+        self.queue.update(self.job)
+        self.assertEqual(self.queue.recover(), 1)
+        [job] = self.queue.jobs()
+        self.assertEqual((job.state, job.ships, job.cargo, job.target),
+                         (dispatchQueue.UNKNOWN, Fleet(atlas=20), Resources(ore=500),
+                          parseLocation("8:41:3")))
+        self.assertTrue(self.queue.retry(job.id))
+        self.assertEqual(self.queue.jobs((dispatchQueue.QUEUED,))[0].id, job.id)
+
+    def test_send(self):
+        r = requests.Response()
+        r.status_code, r._content, r.encoding = 200, harBody("fleet").encode(), "utf-8"
+        post = self.send([r])
+        body = post.call_args.args[0]["body"]
+        self.assertEqual(body["ship_quantities[676893046]"], "20")
+        self.assertEqual((body["planet"], body["send_ore"], body["mission_option"]),
+                         ("3", "500", "Transport"))
+        [job] = self.queue.jobs()
+        self.assertEqual((job.state, job.attempts), (dispatchQueue.SENT, 1))
+        self.assertIsNotNone(job.latencyMs)
+
+    def test_lost_answer_not_sent_twice(self):
+        post = self.send([requests.ConnectionError(), requests.ConnectionError()])
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(self.queue.jobs()[0].state, dispatchQueue.SENT)
+
+    def test_lost_answer_retried(self):
+        with mock.patch("dispatchQueue.loadFleet", return_value=self.before), \
+             mock.patch("dispatchQueue.sendRequest",
+                        side_effect=[requests.ConnectionError(), mock.Mock()]) as post:
+            dispatchQueue.sendMission(None, self.queue, self.job, self.before,    #type: ignore
+                                      self.limiter, 2, 0.0)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(self.queue.jobs()[0].attempts, 2)
+
+    def test_not_enough_ships(self):
+        self.job.ships.zagreus = 1
+        post = self.send([])
+        post.assert_not_called()
+        self.assertIn("zagreus", self.queue.jobs()[0].error)
+
+    def test_command_add(self):
+        with mock.patch("sys.stdout"):
+            [m] = cmdDispatch.dispatch(buildCommandDict("dispatch add -o 1 -t 8:41:3m -m attack "
+                                                        "hercules=5 -p 5"),
+                                       None, None, {"storePath": self.queue.path})   #type: ignore
+        self.assertEqual((m.mission, m.speed, m.target.moon, m.ships.hercules),
+                         ("Attack", 5, True, 5))
+        self.assertEqual(len(self.queue.jobs()), 2)
+
+    def test_command_add_rejects_negative_counts(self):
+        for args in ("atlas=-5", "atlas=0", "atlas=5 ore=-100"):
+            with self.subTest(args=args), mock.patch("builtins.print") as out:
+                self.assertIsNone(cmdDispatch.parseMission(f"-o 1 -t 8:41:3 {args}".split(), None))
+                self.assertIn("Malformed value", out.call_args.args[0])
+        self.assertEqual(cmdDispatch.parseMission("-o 1 -t 8:41:3 atlas=5 ore=0".split(), None).ships,
+                         Fleet(atlas=5))
+
+    def test_not_logged_in(self):
+        r = requests.Response()
+        r.status_code, r._content, r.encoding = 200, WELCOME_PAGE.encode(), "utf-8"
+        with mock.patch("dispatchQueue.sendRequest", return_value=r):
+            with self.assertRaisesRegex(ValueError, "no fleet form"):
+                dispatchQueue.loadFleet(None, self.ORIGIN, self.limiter)    #type: ignore
+        with mock.patch("sys.stdout"), mock.patch("cmdDispatch.dispatchAll") as run:
+            self.assertIsNone(cmdDispatch.dispatch(buildCommandDict("dispatch run"), None, None,   #type: ignore
+                                                   {"storePath": self.queue.path}))
+        run.assert_not_called()
+        self.assertEqual(self.queue.jobs()[0].state, dispatchQueue.QUEUED)
+
+class PollerTests(unittest.TestCase):
+    def setUp(self):
+        import poller
+        self.changes = []
+        self.poller = poller.Poller(restRequests.newSession(REPLAY_CFG),
+                                    [{"view": "home", "planet": "1000003188270"}],
+                                    self.changes.append)
+        self.job = self.poller.jobs[0]
+
+    def test_unchanged_page_not_parsed(self):
+        self.assertEqual(self.poller.poll(self.job), [])
+        with mock.patch("poller.pageOf") as parse:
+            self.assertEqual(self.poller.poll(self.job), [])
+        parse.assert_not_called()
+
+    def test_changes(self):
+        self.poller.poll(self.job)
+        body = harBody("planet-home").replace("1007373782493", "42")
+        r = requests.Response()
+        r.status_code, r._content, r.encoding = 200, body.encode(), "utf-8"
+        with mock.patch("poller.sendRequest", return_value=r), \
+             mock.patch("page.getResources", return_value=Resources(1, 2, 3)):
+            changes = self.poller.poll(self.job)
+        fields = {c["field"]: c for c in changes}
+        self.assertEqual(fields["resources.ore"]["new"], 1)
+        self.assertIsNone(fields["tasks.1007373782493"]["new"])
+        self.assertEqual(fields["tasks.42"]["new"]["name"], "Energy Tech (Level 21)")
+        self.assertEqual(self.changes, changes)
+
+    def test_run_schedule(self):
+        with mock.patch.object(self.poller, "poll") as poll:
+            self.poller.jobs.append(dict(self.job, view="fleet", interval=0.0))
+            self.poller.run(polls=5)
+        self.assertEqual(poll.call_count, 5)
+
+class StreamParserTests(unittest.TestCase):
+    def streamed(self, chunks):
+        r = requests.Response()
+        r.status_code, r.encoding, r.raw = 200, "utf-8", mock.Mock()
+        r.iter_content = lambda size: iter(chunks)
+        return r
+
+    def test_matches_full_parse(self):
+        body = harBody("planet-home").encode()
+        r = self.streamed(body[i:i + 1000] for i in range(0, len(body), 1000))
+        fields = streamParser.extractFields(r, streamParser.HEADER_FIELDS)
+        page = ParsedPage(body.decode())
+        self.assertEqual(fields, {"title": page.title, "username": page.username})
+
+    def test_stops_early(self):
+        def chunks():
+            yield b"<html><head><title>Home - Mestor</title>"
+            raise AssertionError("read past the title")
+        fields = streamParser.extractFields(self.streamed(chunks()), {"title": "title"})
+        self.assertEqual(fields, {"title": "Home - Mestor"})
+
+    def test_byte_ceiling(self):
+        chunks = (b"<p>" + b"x" * 1000 + b"</p>" for _ in range(1000))
+        with self.assertLogs("streamParser", "WARNING"):
+            fields = streamParser.extractFields(self.streamed(chunks), {"title": "title"},
+                                                maxBytes=10000)
+        self.assertEqual(fields, {})
+
+    def test_unclosed_and_void_elements(self):
+        body = [b'<div class="right_column x"><p>a<br>b<img src=""><a href="#">Na', b"me</a></div>"]
+        fields = streamParser.extractFields(self.streamed(body), {"user": "div.right_column a",
+                                                                  "p": "p", "missing": "#nope"})
+        self.assertEqual(fields, {"user": "Name", "p": "abName"})
+
+class UnitVectorTests(unittest.TestCase):
+    def test_named_access_and_round_trip(self):
+        fleet = Fleet(atlas=3, hercules=2)
+        v = units.FleetVector.of(fleet)
+        self.assertEqual(v.atlas, 3)
+        v.zeus = 1
+        self.assertEqual(v.counts[units.SHIPS.index("zeus")], 1)
+        self.assertEqual(units.FleetVector.of(fleet).toDataclass(), fleet)
+        self.assertFalse(hasattr(v, "__dict__"))
+
+    def test_arithmetic(self):
+        a = units.FleetVector.of(Fleet(atlas=3, hercules=2))
+        b = units.FleetVector.of(Fleet(atlas=1))
+        self.assertEqual(a - b, units.FleetVector.of(Fleet(atlas=2, hercules=2)))
+        self.assertEqual(2 * b + a, units.FleetVector.of(Fleet(atlas=5, hercules=2)))
+
+    def test_empire_totals(self):
+        fleets = [units.FleetVector.of(Fleet(atlas=n)) for n in range(1, 4)]
+        matrix = units.stack(fleets)
+        table = units.shipTable(ParsedPage(harBody("fleet")).shipStats)
+        self.assertEqual(list(units.statPerRow(matrix, table, "cargo")), [5000, 10000, 15000])
+        self.assertEqual(fleets[2].stat(table, "speed"), 3 * 46000)
+        self.assertEqual(units.FleetVector(matrix.sum(axis=0)).atlas, 6)
+
+    def test_ship_stats(self):
+        stats = ParsedPage(harBody("fleet")).shipStats
+        self.assertEqual(stats["atlas"], {"cargo": 5000, "speed": 46000, "fuel": 20})
+        self.assertEqual(stats["zeus"], {"cargo": 1000000, "speed": 610, "fuel": 1})
+        table = units.shipTable(stats)
+        self.assertEqual(table[units.SHIPS.index("hermes")].tolist(), [5, 320000000, 1])
+        self.assertEqual(table[units.SHIPS.index("hades")].tolist(), [0, 0, 0])
+
+    def test_empty_stack(self):
+        table = units.shipTable({})
+        self.assertEqual(units.statPerRow(units.stack([]), table, "cargo").shape, (0,))
+        self.assertEqual(units.stack([], units.DefenceVector).shape, (0, len(units.DEFENCES)))
+
+class CombatTests(unittest.TestCase):
+    # Made-up hull, shield and attack for the units the tests use.
+    SHIPS = {"atlas": (4000, 10, 5), "artemis": (4000, 10, 50), "hades": (110000, 500, 2000),
+             "zeus": (9000000, 50000, 200000)}
+    DEFENCES = {"missile": (2000, 20, 80), "laser": (2000, 25, 100), "pulse": (8000, 100, 250)}
+
+    def setUp(self):
+        self.stats = (np.zeros((len(units.SHIPS), 3)), np.zeros((len(units.DEFENCES), 3)))
+        for table, names, known in zip(self.stats, (units.SHIPS, units.DEFENCES),
+                                       (self.SHIPS, self.DEFENCES)):
+            for name, row in known.items():
+                table[names.index(name)] = row
+
+    def fleet(self, **ships):
+        return units.FleetVector.of(Fleet(**ships))
+
+    def simulate(self, attackers, ships, defences, **kwargs):
+        return combat.simulate(attackers, ships, defences, *self.stats, **kwargs)
+
+    def test_undefended(self):
+        r = self.simulate([self.fleet(atlas=5)], units.FleetVector(), units.DefenceVector(), runs=10)
+        self.assertEqual((r.winProbability, r.meanRounds), (1.0, 0.0))
+
+    def test_unknown_stats(self):
+        with self.assertRaisesRegex(ValueError, "apollo, plasma"):
+            self.simulate([self.fleet(apollo=1)], units.FleetVector(),
+                          units.DefenceVector.of(Defences(plasma=1)), runs=1)
+        with self.assertRaises(ValueError):
+            combat.simulate([self.fleet(atlas=1)], units.FleetVector(), units.DefenceVector(),
+                            self.stats[0][:, :2], self.stats[1], runs=1)
+
+    def test_outcomes_and_losses(self):
+        r = self.simulate([self.fleet(hades=30)], self.fleet(atlas=40),
+                          units.DefenceVector.of(Defences(pulse=5)), runs=200, seed=1)
+        self.assertEqual(r.winProbability, 1.0)
+        self.assertEqual(r.defenderShipLosses[units.SHIPS.index("atlas")], 40)
+        self.assertEqual(r.defenceLosses[units.DEFENCES.index("pulse")], 5)
+        r = self.simulate([self.fleet(atlas=3)], self.fleet(hades=3), units.DefenceVector(), runs=200)
+        self.assertEqual(r.lossProbability, 1.0)
+        self.assertEqual(r.attackerLosses.sum(), 3)
+
+    def test_silo_missiles_do_not_fight(self):
+        missiles = units.DefenceVector.of(Defences(abm=50, ibm=100))
+        r = self.simulate([self.fleet(zeus=1)], units.FleetVector(), missiles, runs=20)
+        self.assertEqual((r.winProbability, r.meanRounds), (1.0, 0.0))
+        self.assertEqual(r.defenceLosses.sum(), 0)
+        r = self.simulate([self.fleet(atlas=3)], units.FleetVector(),
+                          missiles + units.DefenceVector.of(Defences(laser=1)), runs=20)
+        self.assertEqual(r.attackerLosses.sum(), 0)
+
+    def test_fleets_and_seeds(self):
+        a, b = self.fleet(atlas=10, artemis=30), self.fleet(artemis=10)
+        defender = (self.fleet(artemis=20), units.DefenceVector.of(Defences(missile=10)))
+        r = self.simulate([a, b], *defender, runs=300, seed=7)
+        same = self.simulate([a + b], *defender, runs=300, seed=7)
+        self.assertEqual((r.draws, r.attackerLost.tolist(), r.defenderLost.tolist()),
+                         (same.draws, same.attackerLost.tolist(), same.defenderLost.tolist()))
+        artemis = units.SHIPS.index("artemis")
+        self.assertAlmostEqual(r.fleetLosses(a)[artemis], 3 * r.fleetLosses(b)[artemis])
+        self.assertAlmostEqual(r.winProbability + r.drawProbability + r.lossProbability, 1.0)
+        merged = r + self.simulate([a, b], *defender, runs=100, seed=8)
+        self.assertEqual(merged.runs, 400)
+
+    def test_process_pool(self):
+        r = self.simulate([self.fleet(artemis=30)], self.fleet(artemis=20), units.DefenceVector(),
+                          runs=101, seed=3, workers=2)
+        self.assertEqual(r.runs, 101)
+        self.assertEqual(r.attacker[units.SHIPS.index("artemis")], 30)
+
+class StartupTests(unittest.TestCase):
+    def test_lazy_imports(self):
+        import subprocess, sys
+        out = subprocess.run([sys.executable, "-c", "import sfc, sys; "
+                              "print(sorted({'requests', 'bs4', 'numpy'} & set(sys.modules)))"],
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), "[]")
+
+    def test_welcome_cache(self):
+        import sfc
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "welcome.txt")
+            with open(path, 'w') as f:
+                f.write("Welcome back")
+            cfg = {"welcome": {"mode": "background", "cachePath": path}}
+            with mock.patch("sfc.fetchWelcome") as fetch, mock.patch("builtins.print") as out:
+                sfc.startWelcome(cfg)
+            out.assert_called_once_with("Welcome back")
+            fetch.assert_called_once_with(cfg, path, True)
+
+    def test_fetchWelcome_saves_copy(self):
+        import sfc
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "welcome.txt")
+            r = mock.Mock(content=WELCOME_PAGE.encode())
+            with mock.patch("restRequests.sendRequest", return_value=r), \
+                 mock.patch("sfc.getSession"):
+                welcome = sfc.fetchWelcome({}, path)
+            with open(path) as f:
+                self.assertEqual(f.read(), welcome)
+            self.assertIn("Welcome, Commander", welcome)
+
+    def test_runScript(self):
+        import sfc, io, contextlib
+        cfg = sfc.loadConfig()
+        cfg["rest"] = REPLAY_CFG
+        cfg["galaxy"] = {"storePath": ":memory:", "requestsPerSecond": 0}
+        script = ["# comment", "galaxy -g8 -s41", "", "galaxy -g8 -s40..42", "help", "bogus",
+                  "planets"]
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), mock.patch("sfc._session", None):
+            ok = sfc.runScript(script, sfc.State(), cfg, jobs=4)
+        results = [json.loads(l) for l in out.getvalue().splitlines()]
+        self.assertFalse(ok)
+        self.assertEqual([r["line"] for r in results], [2, 4, 5, 6, 7])
+        self.assertEqual(len(results[0]["result"]), 6)
+        self.assertEqual(len(results[1]["result"]), 18)
+        self.assertIn("Solar System 8:41", results[0]["output"])
+        self.assertNotIn("Solar System 8:41", results[2]["output"])
+        self.assertEqual([r["ok"] for r in results], [True, True, True, False, False])
+        self.assertIn("log in first", results[4]["output"])
+
+        # A sweep whose systems cannot be loaded fails the script too.
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), mock.patch("sfc._session", None), \
+             mock.patch("cmdGalaxy.sweepGalaxy", return_value=iter([])):
+            self.assertFalse(sfc.runScript(["galaxy -g8 -s1..2", "help"], sfc.State(), cfg))
+        results = [json.loads(l) for l in out.getvalue().splitlines()]
+        self.assertEqual([r["ok"] for r in results], [False, True])
+        self.assertIn("could not be loaded", results[0]["output"])
+
+class BenchmarkTests(unittest.TestCase):
+    def test_compareToBaseline(self):
+        import sfc_bench
+        results = sfc_bench.runBenchmarks(["galaxy"], 1)
+        stages = results["commands"]["galaxy"]["stages"]
+        self.assertEqual(set(stages), set(sfc_bench.STAGES))
+        self.assertGreater(results["commands"]["galaxy"]["peak_kib"], 0)
+        baseline = json.loads(json.dumps(results))
+        self.assertEqual(sfc_bench.compareToBaseline(results, baseline, 0.1), [])
+        for stage in baseline["commands"]["galaxy"]["stages"].values():
+            stage["median_ms"] /= 2.0
+        baseline["commands"]["galaxy"]["total_ms"] /= 2.0
+        self.assertIn("galaxy/total", " ".join(sfc_bench.compareToBaseline(results, baseline, 0.1)))
+
+    def test_benchStartup(self):
+        import sfc_bench
+        result = sfc_bench.benchStartup(1)
+        self.assertEqual(set(result["stages"]), {"import", "prompt"})
+        self.assertLessEqual(result["stages"]["import"]["median_ms"], result["total_ms"])
+        self.assertIn("sfc", [name for name, _ in result["top_imports"]])
+
+    def test_benchTitle(self):
+        import sfc_bench
+        result = sfc_bench.benchTitle(restRequests.newSession(REPLAY_CFG), 1)
+        self.assertEqual(set(result["stages"]), {"full", "streamed"})
+
+WELCOME_PAGE = """<html><head><title>Starfleet Commander</title></head><body>
+<div id="leftColumn"><h1> Welcome, Commander </h1><p>Build an empire.</p>
+<ul><li>Explore   the galaxy</li><li>Trade &amp; fight</li></ul></div></body></html>"""
+
+class ParserEquivalenceTests(unittest.TestCase):
+    '''
+    Runs every extractor against the saved HAR responses with each installed
+    parser backend and checks the results match the html.parser reference.
+    '''
+
+    def assertSameForAllBackends(self, extract):
+        expected = extract(parsers.DEFAULT_BACKEND)
+        for backend in parsers.BACKENDS:
+            with self.subTest(backend=backend):
+                if not parsers.isAvailable(backend):
+                    self.skipTest(f"{backend} is not installed")
+                self.assertEqual(extract(backend), expected)
+
+    def test_page_fields(self):
+        for name in ("planet-home", "fleet", "galaxy"):
+            htm = harBody(name)
+            def extract(backend):
+                page = ParsedPage(htm, backend)
+                planets = [(p.id, p.name, p.location) for p in page.planets]
+                return page.title, page.path, page.username, planets, page.resources
+            with self.subTest(page=name):
+                self.assertSameForAllBackends(extract)
+
+    def test_galaxy_slots(self):
+        htm = harBody("galaxy")
+        self.assertSameForAllBackends(lambda b: parseGalaxyPage(ParsedPage(htm, b), 8, 41))
+
+    def test_welcome(self):
+        self.assertSameForAllBackends(lambda b: ParsedPage(WELCOME_PAGE, b).welcome)
+
+    def test_incomplete_backend(self):
+        class PartialNode(parsers.Node):
+            def select(self, css): return []
+        with self.assertRaises(TypeError):
+            PartialNode()
+
+    def test_setBackend_fallback(self):
+        self.assertEqual(parsers.setBackend("no-such-parser"), parsers.DEFAULT_BACKEND)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
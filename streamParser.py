@@ -0,0 +1,157 @@
+import codecs                           # to decode the body chunk by chunk
+import logging                          # built-in Python logging
+import re                               # to split simple selectors
+from html.parser import HTMLParser      # push parser, fed as the body arrives
+import requests                         # for the response type
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+CHUNK_SIZE = 8192               # default bytes read from the connection at a time
+MAX_BYTES = 1024 * 1024         # default most bytes read before giving up
+
+# Fields shown in the prompt, with the selectors getTitle() and getUsername()
+# look them up by.
+HEADER_FIELDS = {"title": "title", "username": "div.right_column a"}
+
+# Elements that never have content or an end tag.
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input",
+                       "link", "meta", "param", "source", "track", "wbr"))
+
+SIMPLE_SELECTOR = re.compile(r"([\w-]*)((?:[.#][\w-]+)*)")
+
+def parseSelector(css:str) -> list[tuple[str, str, frozenset[str]]]:
+    '''
+    Parses a CSS selector made of simple selectors ("tag", ".class", "#id",
+    or combinations like "div.right_column") joined by descendant combinators
+    (spaces). Other selectors are not supported.
+
+    :param css: The selector, e.g. "div.right_column a".
+    :type css:  str
+    :return:    One (tag, id, classes) entry per simple selector, outermost
+                first. Empty tag and id match any element.
+    :rtype:     list[tuple[str, str, frozenset[str]]]
+    '''
+    parts = []
+    for simple in css.split():
+        m = SIMPLE_SELECTOR.fullmatch(simple)
+        if not m:
+            raise ValueError(f"Unsupported selector '{css}'.")
+        ids = re.findall(r"#([\w-]+)", m.group(2))
+        classes = frozenset(re.findall(r"\.([\w-]+)", m.group(2)))
+        parts.append((m.group(1).lower(), ids[0] if ids else "", classes))
+    return parts
+
+class FieldExtractor(HTMLParser):
+    '''
+    Push parser that looks for the first element matching each of a set of
+    selectors, and collects its text. Nothing else of the page is kept: only
+    the stack of open elements, so memory does not grow with the page.
+    '''
+
+    def __init__(self, selectors:dict[str, str]) -> None:
+        super().__init__()
+        # Selectors still looked for, by field name.
+        self.pending = {name: parseSelector(css) for name, css in selectors.items()}
+        # Open elements, outermost first, as (tag, id, classes).
+        self.stack: list[tuple[str, str, frozenset[str]]] = []
+        # Fields being collected: name -> [stack depth of the element, text parts].
+        self.capturing: dict[str, list] = {}
+        # Text of the fields found so far.
+        self.fields: dict[str, str] = {}
+
+    @property
+    def done(self) -> bool:
+        '''Whether every field has been found.'''
+        return not self.pending and not self.capturing
+
+    @staticmethod
+    def matches(simple:tuple[str, str, frozenset[str]],
+                elem:tuple[str, str, frozenset[str]]) -> bool:
+        tag, id, classes = simple
+        return ((not tag or tag == elem[0]) and (not id or id == elem[1])
+                and classes <= elem[2])
+
+    def matchesStack(self, selector:list) -> bool:
+        '''
+        Checks whether the innermost open element matches a selector, with its
+        outer parts matching enclosing elements in order.
+        '''
+        if not self.matches(selector[-1], self.stack[-1]):
+            return False
+        i = len(self.stack) - 2
+        for simple in reversed(selector[:-1]):
+            while i >= 0 and not self.matches(simple, self.stack[i]):
+                i -= 1
+            if i < 0:
+                return False
+            i -= 1
+        return True
+
+    def handle_starttag(self, tag:str, attrs:list) -> None:
+        a = dict(attrs)
+        elem = (tag, a.get("id") or "", frozenset((a.get("class") or "").split()))
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(elem)
+        for name in [n for n, sel in self.pending.items() if self.matchesStack(sel)]:
+            del self.pending[name]
+            self.capturing[name] = [len(self.stack), []]
+
+    def handle_endtag(self, tag:str) -> None:
+        # Close the element, and any left open inside it (e.g. an unclosed <p>).
+        if tag not in (t for t, _, _ in self.stack):
+            return
+        while self.stack:
+            depth = len(self.stack)
+            if self.stack.pop()[0] == tag:
+                break
+        for name in [n for n, (d, _) in self.capturing.items() if d >= depth]:
+            self.fields[name] = "".join(self.capturing.pop(name)[1])
+
+    def handle_data(self, data:str) -> None:
+        for _, parts in self.capturing.values():
+            parts.append(data)
+
+def extractFields(r:requests.Response, selectors:dict[str, str],
+                  chunkSize:int = CHUNK_SIZE, maxBytes:int = MAX_BYTES) -> dict[str, str]:
+    '''
+    Reads a streamed response (sent with stream=True) only as far as needed to
+    find the text of the first element matching each selector, then closes
+    the connection. Small fields near the top of a page, like the title, are
+    found without downloading or parsing the rest of it. Reading also stops
+    after maxBytes, so a huge or endless body cannot exhaust memory.
+
+    :param r:           Streamed response of an HTML page.
+    :type r:            requests.Response
+    :param selectors:   CSS selectors to look for, by field name. See
+                        parseSelector() for what is supported.
+    :type selectors:    dict[str, str]
+    :param chunkSize:   Bytes to read at a time.
+    :type chunkSize:    int
+    :param maxBytes:    Most bytes to read.
+    :type maxBytes:     int
+    :return:            Text of each field found. Fields not found before the
+                        end of the page (or maxBytes) are left out.
+    :rtype:             dict[str, str]
+    '''
+    parser = FieldExtractor(selectors)
+    decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    read = 0
+    try:
+        for chunk in r.iter_content(chunkSize):
+            read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+            if read >= maxBytes:
+                logger.warning("Gave up looking for %s after %d bytes.",
+                               ", ".join(parser.pending) or ", ".join(parser.capturing), read)
+                break
+        else:
+            parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+    finally:
+        r.close()
+    logger.debug("Found %d of %d fields after reading %d bytes.",
+                 len(parser.fields), len(selectors), read)
+    return parser.fields
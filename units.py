@@ -0,0 +1,152 @@
+import logging                          # built-in Python logging
+from collections.abc import Iterable
+from dataclasses import fields, astuple
+import numpy as np                      # for vectorized unit arithmetic
+
+from planet import Fleet, Defences      # named unit dataclasses
+
+logger = logging.getLogger(__name__)    # set module-level logger object
+
+SHIPS = tuple(f.name for f in fields(Fleet))        # fixed ship index
+DEFENCES = tuple(f.name for f in fields(Defences))  # fixed defence index
+
+# Columns of the stat tables, as shown in the hidden fields of each ship row
+# of the fleet page (see page.getShipStats()).
+STATS = ("cargo", "speed", "fuel")
+
+class UnitVector:
+    '''
+    Unit counts stored as one int64 vector in a fixed index order, with named
+    access (e.g. v.atlas) to each unit. Vectors add, subtract and scale as a
+    whole, and are dotted with a column of a stat table to total a stat.
+    Subclasses set the index.
+    '''
+
+    __slots__ = ("counts",)
+    NAMES: tuple[str, ...] = ()
+    DATACLASS: type = object
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # Give each unit a named property that reads its slot of the vector.
+        for i, name in enumerate(cls.NAMES):
+            setattr(cls, name, property(
+                lambda self, i=i: int(self.counts[i]),
+                lambda self, value, i=i: self.counts.__setitem__(i, value)))
+
+    def __init__(self, counts:Iterable[int] | np.ndarray | None = None) -> None:
+        if counts is None:
+            self.counts = np.zeros(len(self.NAMES), dtype=np.int64)
+        else:
+            self.counts = np.asarray(counts, dtype=np.int64).copy()
+            if self.counts.shape != (len(self.NAMES),):
+                raise ValueError(f"Expected {len(self.NAMES)} unit counts, got {self.counts.shape}.")
+
+    @classmethod
+    def of(cls, units) -> "UnitVector":
+        '''
+        Builds a vector from the matching dataclass, e.g. a Fleet.
+        '''
+        return cls(astuple(units))
+
+    def toDataclass(self):
+        '''
+        Converts the vector back into the matching dataclass.
+        '''
+        return self.DATACLASS(*(int(c) for c in self.counts))
+
+    def stat(self, table:np.ndarray, name:str) -> float:
+        '''
+        Totals one stat over all units, e.g. stat(table, "cargo").
+
+        :param table:   Stats of every unit, e.g. from shipTable().
+        :type table:    np.ndarray
+        :param name:    One of STATS.
+        :type name:     str
+        :return:        Sum of the stat multiplied by the unit counts.
+        :rtype:         float
+        '''
+        return float(self.counts @ table[:, STATS.index(name)])
+
+    def __add__(self, other:"UnitVector") -> "UnitVector":
+        return type(self)(self.counts + other.counts)
+
+    def __sub__(self, other:"UnitVector") -> "UnitVector":
+        return type(self)(self.counts - other.counts)
+
+    def __mul__(self, factor:int) -> "UnitVector":
+        return type(self)(self.counts * factor)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other:object) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return bool(np.array_equal(self.counts, other.counts))
+
+    def __repr__(self) -> str:
+        units = ", ".join(f"{n}={int(c)}" for n, c in zip(self.NAMES, self.counts) if c)
+        return f"{type(self).__name__}({units})"
+
+class FleetVector(UnitVector):
+    '''Ship counts in SHIPS order.'''
+    __slots__ = ()
+    NAMES = SHIPS
+    DATACLASS = Fleet
+
+class DefenceVector(UnitVector):
+    '''Defence counts in DEFENCES order.'''
+    __slots__ = ()
+    NAMES = DEFENCES
+    DATACLASS = Defences
+
+def stack(vectors:Iterable[UnitVector], kind:type[UnitVector] = FleetVector) -> np.ndarray:
+    '''
+    Stacks unit vectors (e.g. one per planet) into a matrix with one row per
+    vector, so that empire-wide arithmetic is a single array operation.
+
+    :param vectors: Vectors of the same kind.
+    :type vectors:  Iterable[UnitVector]
+    :param kind:    Class of the vectors, which sets the width of the matrix
+                    even when there are no vectors.
+    :type kind:     type[UnitVector]
+    :return:        Matrix of shape (vectors, units).
+    :rtype:         np.ndarray
+    '''
+    rows = [v.counts for v in vectors]
+    return np.vstack(rows) if rows else np.zeros((0, len(kind.NAMES)), dtype=np.int64)
+
+def statPerRow(matrix:np.ndarray, table:np.ndarray, name:str) -> np.ndarray:
+    '''
+    Totals one stat for every row of a stacked matrix, e.g. the cargo
+    capacity of every planet's fleet.
+
+    :param matrix:  Output of stack().
+    :type matrix:   np.ndarray
+    :param table:   Stats of every unit, e.g. from shipTable().
+    :type table:    np.ndarray
+    :param name:    One of STATS.
+    :type name:     str
+    :return:        One total per row.
+    :rtype:         np.ndarray
+    '''
+    return matrix @ table[:, STATS.index(name)]
+
+def shipTable(stats:dict[str, dict[str, float]]) -> np.ndarray:
+    '''
+    Builds the stat table of the ships from the stats shown on a fleet page,
+    which include the player's research bonuses.
+
+    :param stats:   Stats of each ship class, as returned by
+                    page.getShipStats().
+    :type stats:    dict[str, dict[str, float]]
+    :return:        One row per ship in SHIPS order and one column per STATS.
+                    Ships the page does not list (none at the planet) are
+                    left at zero.
+    :rtype:         np.ndarray
+    '''
+    table = np.zeros((len(SHIPS), len(STATS)))
+    for name, row in stats.items():
+        if name in SHIPS:
+            table[SHIPS.index(name)] = [row.get(s, 0.0) for s in STATS]
+    return table